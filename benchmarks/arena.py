@@ -0,0 +1,61 @@
+"""Walker passes against their `wabbit.arena` versions on a million nodes.
+
+Run with `python -m benchmarks.arena`, needs the `arena` extra.
+"""
+
+import time
+
+from benchmarks.utils import generate_source
+from wabbit.add_types import add_types
+from wabbit.arena import (
+    fold_arena_constants,
+    from_arena,
+    resolve_arena_scopes,
+    to_arena,
+    validate_arena,
+)
+from wabbit.check_types import check_types
+from wabbit.deinit import deinit_variables
+from wabbit.fold_constants import fold_constants
+from wabbit.predictive import PredictiveParser
+from wabbit.resolve import resolve_scopes
+from wabbit.tokenizer import tokenize_table
+from wabbit.utils import gc_paused
+from wabbit.validator import validate_ast
+
+# About 52 nodes per function.
+N_FUNCS = 20_000
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    res = func(*args)
+    return res, time.perf_counter() - start
+
+
+def main() -> None:
+    source = generate_source(N_FUNCS)
+    program = PredictiveParser(tokenize_table(source), source).parse()
+    typed = check_types(add_types(program))
+    deinit = deinit_variables(fold_constants(typed))
+
+    arena, elapsed = timed(to_arena, program)
+    print(f"{len(arena)} rows, to_arena {elapsed:.2f} s")
+    print(f"{'':>9} {'walker':>8} {'arena':>8} {'speedup':>8}  (s)")
+    for name, walker_pass, arena_pass, tree in (
+        ("validate", validate_ast, validate_arena, program),
+        ("fold", fold_constants, fold_arena_constants, typed),
+        ("resolve", resolve_scopes, resolve_arena_scopes, deinit),
+    ):
+        _, walker = timed(walker_pass, tree)
+        arena = to_arena(tree)
+        _, vectorized = timed(arena_pass, arena)
+        print(f"{name:>9} {walker:8.2f} {vectorized:8.3f} {walker / vectorized:7.0f}x")
+
+    with gc_paused():
+        _, elapsed = timed(from_arena, arena)
+    print(f"from_arena {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Re-lexing and re-parsing after small edits. Run with `python -m benchmarks.incremental`."""
+
+from benchmarks.utils import best_of, generate_source
+from wabbit.incremental import reparse, retokenize
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+
+def main() -> None:
+    for n_funcs in (1_000, 10_000):
+        source = generate_source(n_funcs)
+        table = tokenize_table(source)
+        # Rename a variable halfway through the file.
+        offset = source.index("var a", len(source) // 2) + len("var a")
+        edited = source[:offset] + "b" + source[offset:]
+        print(f"{len(source) / 1e6:.1f} MB, {len(table)} tokens")
+        elapsed = best_of(lambda: tokenize_table(edited))
+        print(f"  {'full':>11}: {elapsed * 1e3:>8.2f} ms")
+        elapsed = best_of(lambda: retokenize(table, offset, 0, "b"))
+        print(f"  {'incremental':>11}: {elapsed * 1e3:>8.2f} ms")
+
+        program = PredictiveParser(table, source).parse()
+        elapsed = best_of(lambda: PredictiveParser(table, source).parse(), repeat=1)
+        print(f"  {'full parse':>11}: {elapsed * 1e3:>8.2f} ms")
+        # The first reparse lexes the old source to find its statements.
+        program = reparse(program, source, table)
+        for edit, inserted in (("rename", "b"), ("new line", "\n")):
+            edited = source[:offset] + inserted + source[offset:]
+            tokens = retokenize(table, offset, 0, inserted)
+            reparsed = reparse(program, edited, tokens)
+            elapsed = best_of(lambda: reparse(program, edited, tokens))
+            kept = sum(
+                new is old for new, old in zip(reparsed.statements, program.statements)
+            )
+            print(
+                f"  {edit:>11}: {elapsed * 1e3:>8.2f} ms reparse, "
+                f"{len(program.statements) - kept} of {len(program.statements)} "
+                "statements not kept as they were"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Memory held by the tree, per node (shared nodes count once per use). Run with `python -m benchmarks.memory`."""
+
+import tracemalloc
+
+from benchmarks.utils import generate_source
+from wabbit.main import _simplify_tree
+from wabbit.model import Interner
+from wabbit.predictive import PredictiveParser
+from wabbit.timings import count_nodes
+from wabbit.tokenizer import tokenize_table
+
+
+def main() -> None:
+    source = generate_source(2_000)
+    tokens = tokenize_table(source)
+    for stage in ("parsed", "simplified", "shared", "shared simplified"):
+        tracemalloc.start()
+        program = PredictiveParser(tokens, source).parse()
+        if stage.startswith("shared"):
+            program = Interner().tree(program)
+        if stage.endswith("simplified"):
+            program = _simplify_tree(program)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        nodes = count_nodes(program)
+        print(
+            f"{stage:>17}: {nodes} nodes, {size / 1e6:6.1f} MB, "
+            f"{size / nodes:6.1f} bytes/node"
+        )
+        del program
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Deeply nested programs through the whole pipeline.
+
+Run with `python -m benchmarks.nesting [depth ...]`. Nothing here raises the
+recursion limit, every stage has to get by with explicit stacks.
+"""
+
+import sys
+import time
+
+from wabbit.bracecheck import validate_braces
+from wabbit.llvm import generate_llvm
+from wabbit.main import _simplify_tree
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+INPUTS = {
+    "parens": lambda n: f"print {'(' * n}1{')' * n};",
+    "minus": lambda n: f"print {'- ' * n}1;",
+    "not": lambda n: f"print {'not ' * n}true;",
+    "chain": lambda n: f"print 1{' + 1' * n};",
+    "calls": lambda n: (
+        f"func f(a int) int {{ return a; }}\nprint {'f(' * n}1{')' * n};"
+    ),
+    "blocks": lambda n: "var x = 1;\n" + "if x < 2 {\n" * n + "print x;\n" + "}\n" * n,
+}
+
+# The emitted code of a block is indented once per level it is nested in, so
+# its size grows with the square of the depth.
+MAX_EMITTED_BLOCKS = 10_000
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print(f"{'':>8} {'depth':>9} {'parse':>8} {'passes':>8} {'llvm':>8}  (s)")
+    for name, make_source in INPUTS.items():
+        for n in sizes:
+            source = make_source(n)
+
+            start = time.perf_counter()
+            tokens = tokenize_table(source)
+            validate_braces(tokens, source, "nesting.wb")
+            program = PredictiveParser(tokens, source).parse()
+            parsed = time.perf_counter()
+            program = _simplify_tree(program)
+            simplified = time.perf_counter()
+            timings = [parsed - start, simplified - parsed]
+            if name != "blocks" or n <= MAX_EMITTED_BLOCKS:
+                generate_llvm(program)
+                timings.append(time.perf_counter() - simplified)
+            del tokens, program
+
+            cells = "".join(f" {timing:8.2f}" for timing in timings)
+            print(f"{name:>8} {n:>9}{cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Serial against parallel parsing. Run with `python -m benchmarks.parallel`."""
+
+import os
+
+from benchmarks.utils import best_of, generate_source
+from wabbit.parallel import parse_parallel
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+
+def main() -> None:
+    source = generate_source(5_000)
+    tokens = tokenize_table(source)
+    print(f"{len(source) / 1e6:.1f} MB, {len(tokens)} tokens, {os.cpu_count()} cpus")
+    elapsed = best_of(lambda: PredictiveParser(tokens, source).parse())
+    print(f"  {'serial':>7}: {elapsed:6.2f} s")
+    for jobs in (2, 4, 8):
+        elapsed = best_of(lambda: parse_parallel(tokens, source, jobs=jobs))
+        print(f"  {f'{jobs} jobs':>7}: {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
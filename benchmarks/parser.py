@@ -0,0 +1,36 @@
+"""Parse time against input size. Run with `python -m benchmarks.parser`."""
+
+import sys
+
+from benchmarks.utils import best_of, generate_source
+from wabbit.parser import Parser
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+INPUTS = {
+    "parens": lambda n: f"print {'(' * n}1{')' * n};",
+    "minus": lambda n: f"print {'- ' * n}1;",
+    "not": lambda n: f"print {'not ' * n}true;",
+    "chain": lambda n: f"print 1{' + 1' * n};",
+    "statements": lambda n: "print 1;\n" * n,
+    "functions": lambda n: generate_source(n // 20),
+}
+
+
+def main() -> None:
+    # `Parser` still recurses once per level of nesting.
+    sys.setrecursionlimit(100_000)
+    for name, make_source in INPUTS.items():
+        print(name)
+        for n in (200, 400, 800, 1600):
+            source = make_source(n)
+            table = tokenize_table(source)
+            timings = []
+            for parser_cls in (Parser, PredictiveParser):
+                elapsed = best_of(lambda: parser_cls(table, source).parse())
+                timings.append(f"{elapsed / n * 1e6:8.1f}")
+            print(f"  n={n:<5} us/n: {'  '.join(timings)}  (backtracking, predictive)")
+
+
+if __name__ == "__main__":
+    main()
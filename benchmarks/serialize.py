@@ -0,0 +1,40 @@
+"""Loading each cached stage against getting to it from source.
+
+Run with `python -m benchmarks.serialize`.
+"""
+
+import time
+
+from benchmarks.utils import generate_source
+from wabbit.main import STAGES
+from wabbit.pipeline import schedule
+from wabbit.predictive import PredictiveParser
+from wabbit.serialize import dump_program, load_program
+from wabbit.tokenizer import tokenize_table
+from wabbit.walker import run_passes
+
+N_FUNCS = 2_000
+
+
+def main() -> None:
+    source = generate_source(N_FUNCS)
+    start = time.perf_counter()
+    program = PredictiveParser(tokenize_table(source), source).parse()
+    elapsed = time.perf_counter() - start
+    print(f"{'':>10} {'bytes':>8} {'run':>6} {'load':>6}  (s)")
+    done: list = []
+    for stage, wanted in STAGES.items():
+        start = time.perf_counter()
+        passes = schedule(wanted)
+        program = run_passes(program, [cls for cls in passes if cls not in done])
+        done = passes
+        elapsed += time.perf_counter() - start
+        data = dump_program(program)
+        start = time.perf_counter()
+        load_program(data, source)
+        loaded = time.perf_counter() - start
+        print(f"{stage:>10} {len(data):8} {elapsed:6.2f} {loaded:6.3f}")
+
+
+if __name__ == "__main__":
+    main()
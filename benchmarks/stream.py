@@ -0,0 +1,32 @@
+"""Peak memory of the front-end, in memory vs streamed from a mapped file.
+
+Run with `python -m benchmarks.stream`.
+"""
+
+import tracemalloc
+from tempfile import NamedTemporaryFile
+
+from benchmarks.utils import generate_source
+from wabbit.main import _to_ast
+
+
+def peak_mb(path: str, stream: bool) -> float:
+    tracemalloc.start()
+    _to_ast(path, stream)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main() -> None:
+    for n_funcs in (1_000, 5_000):
+        with NamedTemporaryFile("w", suffix=".wb") as f:
+            f.write(generate_source(n_funcs))
+            f.flush()
+            print(f"{n_funcs} functions")
+            for stream in (False, True):
+                print(f"  stream={stream!s:>5}: {peak_mb(f.name, stream):7.1f} MB peak")
+
+
+if __name__ == "__main__":
+    main()
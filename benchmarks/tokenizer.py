@@ -0,0 +1,20 @@
+"""Tokenizer throughput. Run with `python -m benchmarks.tokenizer`."""
+
+from benchmarks.utils import best_of, generate_source
+from wabbit.tokenizer import tokenize, tokenize_table
+
+
+def main() -> None:
+    for n_funcs in (1_000, 10_000):
+        source = generate_source(n_funcs)
+        n_tokens = len(tokenize(source))
+        print(f"{len(source) / 1e6:.1f} MB, {n_tokens} tokens")
+        for engine in ("scan", "regex"):
+            elapsed = best_of(lambda: tokenize(source, engine=engine))
+            print(f"  {engine:>6}: {n_tokens / elapsed:>12,.0f} tokens/sec")
+        elapsed = best_of(lambda: tokenize_table(source))
+        print(f"  {'table':>6}: {n_tokens / elapsed:>12,.0f} tokens/sec")
+
+
+if __name__ == "__main__":
+    main()
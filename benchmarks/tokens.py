@@ -0,0 +1,32 @@
+"""Token storage cost and parse throughput. Run with `python -m benchmarks.tokens`."""
+
+import tracemalloc
+
+from benchmarks.utils import best_of, generate_source
+from wabbit.parser import Parser
+from wabbit.tokenizer import tokenize, tokenize_table
+
+
+def allocated(func):
+    tracemalloc.start()
+    result = func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main() -> None:
+    source = generate_source(2_000)
+    tokens, list_size = allocated(lambda: tokenize(source))
+    table, table_size = allocated(lambda: tokenize_table(source))
+    n_tokens = len(table)
+    print(f"{n_tokens} tokens")
+    print(f"  list[Token]: {list_size / n_tokens:6.1f} bytes/token")
+    print(f"  TokenTable:  {table_size / n_tokens:6.1f} bytes/token")
+
+    elapsed = best_of(lambda: Parser(table, source).parse())
+    print(f"  parse: {n_tokens / elapsed:,.0f} tokens/sec")
+
+
+if __name__ == "__main__":
+    main()
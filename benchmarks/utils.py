@@ -0,0 +1,41 @@
+import time
+from typing import Callable
+
+FUNC_TEMPLATE = """
+func f{n}(x int, y float) int {{
+    var a{n} = x * {n} + 3;
+    var b{n} = y / 2.5;
+    if a{n} < {n} and not a{n} == 7 {{
+        print 'c';
+    }} else {{
+        print b{n};
+    }}
+    while a{n} > 0 {{
+        a{n} = a{n} - (1 + 1);
+    }}
+    return a{n};
+}}
+"""
+
+MAIN_TEMPLATE = """
+var g{n} int;
+g{n} = f{n}({n}, 1.5);
+print g{n};
+"""
+
+
+def generate_source(n_funcs: int) -> str:
+    """Generate a valid Wabbit program with `n_funcs` top-level functions."""
+    funcs = "".join(FUNC_TEMPLATE.format(n=n) for n in range(n_funcs))
+    calls = "".join(MAIN_TEMPLATE.format(n=n) for n in range(n_funcs))
+    return funcs + calls
+
+
+def best_of(func: Callable[[], object], repeat: int = 3) -> float:
+    """Return the fastest wall time out of `repeat` calls to `func`."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
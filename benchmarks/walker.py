@@ -0,0 +1,72 @@
+"""Each pass in every `Walker` mode, all of them fused into as few walks as
+possible against one walk each, and how many nodes a bare walk visits a second
+with compiled walk functions and with the explicit stack alone.
+
+Run with `python -m benchmarks.walker`.
+"""
+
+import gc
+import time
+
+from benchmarks.utils import generate_source
+from wabbit.pipeline import PASSES
+from wabbit.predictive import PredictiveParser
+from wabbit.timings import count_nodes
+from wabbit.tokenizer import tokenize_table
+from wabbit.walker import Visitor, Walker, run_passes
+
+# About 52 nodes per function.
+N_FUNCS = 2_000
+MODES = ("copy", "cow", "in_place")
+
+
+def main() -> None:
+    source = generate_source(N_FUNCS)
+    tokens = tokenize_table(source)
+    timings: dict[str, list[float]] = {}
+    for mode in MODES:
+        program = PredictiveParser(tokens, source).parse()
+        for cls in PASSES:
+            gc.collect()
+            start = time.perf_counter()
+            program = run_passes(program, [cls], mode)
+            elapsed = time.perf_counter() - start
+            timings.setdefault(cls.__name__, []).append(elapsed)
+
+    print(f"{'':>18}" + "".join(f"{mode:>10}" for mode in MODES) + "  (s)")
+    for name, elapsed in timings.items():
+        print(f"{name:>18}" + "".join(f"{t:10.2f}" for t in elapsed))
+    totals = [sum(column) for column in zip(*timings.values())]
+    print(f"{'total':>18}" + "".join(f"{t:10.2f}" for t in totals))
+
+    fused = []
+    for mode in MODES:
+        program = PredictiveParser(tokens, source).parse()
+        gc.collect()
+        start = time.perf_counter()
+        run_passes(program, PASSES, mode)
+        fused.append(time.perf_counter() - start)
+    print(f"{'fused':>18}" + "".join(f"{t:10.2f}" for t in fused))
+
+    program = PredictiveParser(tokens, source).parse()
+    nodes = count_nodes(program)
+    print(f"\nnodes/s of a walk without visitors, {nodes} nodes")
+    print(f"{'':>18}" + "".join(f"{mode:>10}" for mode in MODES))
+    for name in ("stack", "compiled"):
+        rates = []
+        for mode in MODES:
+            walker = Walker(Visitor([], [], source, "file.wb"), mode)
+            # Without visitors it would skip the whole tree.
+            walker._relevant = None
+            gc.collect()
+            start = time.perf_counter()
+            if name == "stack":
+                walker._traverse(program, None, {})
+            else:
+                walker.traverse(program)
+            rates.append(nodes / (time.perf_counter() - start))
+        print(f"{name:>18}" + "".join(f"{rate / 1e6:9.2f}M" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import pytest
+
+from wabbit.add_types import add_types
+from wabbit.check_types import check_types
+from wabbit.deinit import deinit_variables
+from wabbit.fold_constants import fold_constants
+from wabbit.predictive import PredictiveParser
+from wabbit.resolve import resolve_scopes
+from wabbit.tokenizer import tokenize_table
+from wabbit.validator import validate_ast
+
+pytest.importorskip("numpy")
+
+from wabbit.arena import (  # noqa: E402
+    fold_arena_constants,
+    from_arena,
+    resolve_arena_scopes,
+    to_arena,
+    validate_arena,
+)
+
+SOURCE = """
+var g = 1;
+var c = 'c';
+func f(x int, y float) int {
+    var a = x * (2 + 3) - -4;
+    if a < 10 and not g == 7 {
+        print y / 2.5;
+    } else {
+        print (7 / 2) * (1 + 99999999999999999999) - 99999999999999999999;
+    }
+    while a > 0 {
+        a = a - (1 + 1);
+        g = g + 9223372036854775807 * 2 - 9223372036854775807;
+    }
+    return a;
+}
+print f(g, 1.5) + ((1 + 2) * 3);
+"""
+
+
+def parse(source: str):
+    return PredictiveParser(tokenize_table(source), source).parse()
+
+
+def test_round_trip():
+    program = parse(SOURCE)
+    assert from_arena(to_arena(program)) == program
+    typed = check_types(add_types(program))
+    assert from_arena(to_arena(typed)) == typed
+
+
+def test_passes_match_walker():
+    typed = check_types(add_types(parse(SOURCE)))
+    folded = fold_constants(typed)
+    assert from_arena(fold_arena_constants(to_arena(typed))) == folded
+    deinit = deinit_variables(folded)
+    resolved = resolve_scopes(deinit)
+    assert from_arena(resolve_arena_scopes(to_arena(deinit))) == resolved
+
+
+def test_validate(capsys):
+    program = parse("print 'ab';\nprint 2;\nprint 'cd' + 'e';\n")
+    with pytest.raises(SystemExit):
+        validate_ast(program)
+    expected = capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        validate_arena(to_arena(program))
+    assert capsys.readouterr().out == expected
@@ -0,0 +1,83 @@
+from utils import compile_and_exec
+
+from wabbit.main import _to_ast, compile_to_llvm
+from wabbit.model import Branch, LocalVar, Print, Return, While
+
+SOURCE = """
+func dead() int { return 9; }
+func only_dead() int { return dead(); }
+func rec(n int) int {
+    if n < 1 { return 0; }
+    return n + rec(n - 1);
+}
+func loop(n int) int {
+    while true {
+        if n > 10 { return n; }
+        n = n + 3;
+    }
+    print only_dead();
+}
+func both(n int) int {
+    if n > 0 { return 1; print 1; } else { return 2; }
+    var x = 3;
+    print x;
+}
+var k = 2;
+if false {
+    var z = 5;
+    print only_dead();
+} else {
+    print k;
+}
+print rec(4);
+// Reading `k` first keeps the calls from being inlined.
+print k - k + loop(1);
+print k - k + both(k);
+while k > 1 {
+    k = k - 1;
+    break;
+    print only_dead();
+}
+print 99;
+"""
+
+
+def prune(tmp_path, source=SOURCE):
+    path = tmp_path / "source.wb"
+    path.write_text(source)
+    return _to_ast(str(path), stage="pruned")
+
+
+def test_drops_uncalled_functions(tmp_path):
+    program = prune(tmp_path)
+    names = [stmt.name for stmt in program.statements if hasattr(stmt, "body")]
+    assert names == ["rec", "loop", "both", "main"]
+
+
+def test_drops_unreachable_statements(tmp_path):
+    functions = {
+        stmt.name: stmt for stmt in prune(tmp_path).statements if hasattr(stmt, "body")
+    }
+    loop, both, main = functions["loop"], functions["both"], functions["main"]
+    # Nothing comes out of a `while true` without a `break`.
+    assert isinstance(loop.body[-1], While)
+    branch, decl = both.body[-2:]
+    assert isinstance(branch, Branch) and isinstance(decl, LocalVar)
+    assert [type(stmt) for stmt in branch.body] == [Return]
+    # The declaration in the side never taken stays.
+    assert isinstance(main.body[1], LocalVar) and isinstance(main.body[2], Print)
+    assert len(main.body[-3].body) == 2
+
+
+def test_no_dead_terminators(tmp_path):
+    path = tmp_path / "source.wb"
+    path.write_text(SOURCE)
+    llvm = compile_to_llvm(str(path))
+    lines = [line.strip() for line in llvm.splitlines()]
+    for line, after in zip(lines, lines[1:]):
+        if line.startswith(("ret ", "br ")):
+            assert after == "}" or after.endswith(":")
+
+
+def test_runs_the_same():
+    assert compile_and_exec(SOURCE) == ["2", "10", "13", "1", "99"]
@@ -0,0 +1,81 @@
+from utils import compile_and_exec
+
+from wabbit.add_types import add_types
+from wabbit.fold_constants import fold_constants
+from wabbit.model import Boolean, Branch, Float, Integer, Name, Print
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+
+def fold(source):
+    program = PredictiveParser(tokenize_table(source), source).parse()
+    return fold_constants(add_types(program)).statements
+
+
+def test_i32_semantics():
+    prints = fold(
+        "print 2147483647 + 1;\nprint 7 / -2;\nprint -7 / 2;\nprint 1 / 0;\n"
+        "print 100000 * 100000;\n"
+    )
+    assert [p.expr.value for p in prints[:3]] == [-2147483648, -3, -3]
+    assert not isinstance(prints[3].expr, Integer)
+    assert prints[4].expr.value == 1410065408
+
+
+def test_floats_and_bools():
+    prints = fold(
+        "print 1.0 / 3.0;\nprint 1.0 / 0.0;\nprint true < false;\n"
+        "print not (1 < 2 and false);\n"
+    )
+    assert isinstance(prints[0].expr, Float)
+    assert not isinstance(prints[1].expr, Float)
+    # `i1` compares signed, true is -1.
+    assert [p.expr.value for p in prints[2:]] == ["true", "true"]
+
+
+def test_propagates_declared_once():
+    statements = fold(
+        """
+        var a = 3;
+        var b = 4;
+        b = 5;
+        if b > 0 {
+            var c = 6;
+        }
+        print a * 2;
+        print b;
+        func f() int {
+            return a;
+        }
+        """
+    )
+    assert statements[4].expr.value == 6
+    assert isinstance(statements[5].expr, Name)
+    # Another function might run before `a` is set.
+    assert isinstance(statements[6].body[0].expr, Name)
+
+
+def test_known_conditions():
+    statements = fold(
+        """
+        if 1 < 2 { print 1; } else { print 2; }
+        while 1 > 2 { print 3; }
+        if false { var x = 1; } else { print 4; }
+        """
+    )
+    assert isinstance(statements[0], Print) and statements[0].expr.value == 1
+    assert isinstance(statements[1], Branch)
+    assert isinstance(statements[1].condition, Boolean)
+    assert len(statements) == 2
+
+
+def test_runs_the_same():
+    source = """
+        var n = 2147483647;
+        print n + 1;
+        print -7 / 2;
+        print 0.0 - 0.0;
+        print true < false;
+        if n > 0 { print 1; } else { print 0; }
+    """
+    assert compile_and_exec(source) == ["-2147483648", "-3", "0.000000", "true", "1"]
@@ -0,0 +1,96 @@
+from utils import compile_and_exec
+
+from wabbit.add_types import add_types
+from wabbit.check_types import check_types
+from wabbit.inline import _recursive, inline_functions
+from wabbit.model import Assignment, Call, Function, Integer, VariableDecl, While
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+SOURCE = """
+var g = 10;
+func square(n int) int { return n * n; }
+func bump() int { g = g + 1; return g; }
+func find(limit int) int {
+    var i = 0;
+    while i < limit {
+        if i * i > 50 { return i; }
+        i = i + 1;
+    }
+    return -1;
+}
+func fact(n int) int {
+    if n < 2 { return 1; }
+    return n * fact(n - 1);
+}
+func twice(x int) int { var t = x * 2; return t; }
+var u = 5;
+print square(square(3));
+print g + bump();
+print bump() + g;
+print find(100) + find(3);
+print fact(5);
+print twice(u) + u;
+func user(a int) int {
+    var t = 3;
+    var s = 0;
+    while a > 0 {
+        s = s + twice(t) + find(a);
+        a = a - 1;
+    }
+    return s + t;
+}
+print user(2);
+"""
+
+
+def inline(source=SOURCE, threshold=40):
+    program = PredictiveParser(tokenize_table(source), source).parse()
+    return inline_functions(check_types(add_types(program)), threshold=threshold)
+
+
+def calls(node):
+    found = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif hasattr(item, "__dataclass_fields__"):
+            if isinstance(item, Call):
+                found.append(item.name)
+            stack.extend(getattr(item, name) for name in item.__dataclass_fields__)
+    return sorted(found)
+
+
+def test_inlines_small_functions():
+    program = inline()
+    # Reading `g` before `bump` is called could see it change.
+    assert calls(program.statements[8:]) == ["bump", "fact", "user"]
+    assert "square" in calls(inline(threshold=0).statements)
+
+
+def test_substitutes_arguments():
+    source = "func square(n int) int { return n * n; }\nprint square(5);\n"
+    expr = inline(source).statements[1].expr
+    assert isinstance(expr.expr.lhs, Integer) and expr.expr.lhs.value == 5
+
+
+def test_declares_out_of_loops():
+    user = inline().statements[-2]
+    assert isinstance(user, Function)
+    loop = next(stmt for stmt in user.body if isinstance(stmt, While))
+    stack = list(loop.body)
+    while stack:
+        stmt = stack.pop()
+        assert not isinstance(stmt, VariableDecl)
+        stack.extend(getattr(stmt, "body", []))
+    assert isinstance(loop.body[0], Assignment)
+
+
+def test_recursive():
+    assert _recursive({1: {2}, 2: {1}, 3: {3}, 4: {1}, 5: set()}) == {1, 2, 3}
+
+
+def test_runs_the_same():
+    assert compile_and_exec(SOURCE) == ["81", "21", "24", "7", "120", "15", "13"]
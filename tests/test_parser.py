@@ -0,0 +1,136 @@
+import pickle
+import sys
+
+import pytest
+from typer.testing import CliRunner
+
+from wabbit.incremental import reparse
+from wabbit.main import app, compile_to_llvm
+from wabbit.model import SourceLoc
+from wabbit.parallel import parse_parallel
+from wabbit.parser import Parser
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+SOURCES = [
+    "print 1 + 2 * 3 - 4 / 5 < 6 and 7 == 8 or 9 != 10;",
+    "print -1 + ((2 * 3) - 4 * 2 - 3 + 1);",
+    "print not x and y == not z or w;",
+    "print - - 1.5 * 2.0;",
+    "var x int;\nvar y = 'a';\nx = 1;\nf(x, (y), g());",
+    """
+    func fib(n int, unused bool,) int {
+        if n < 2 {
+            return 1;
+        } else {
+            while true { break; }
+        }
+        return fib(n - 1) + fib(n - 2);
+    }
+    print fib(10);
+    """,
+    # Parser only ever gets part of the way through these.
+    "print 1 +;",
+    "x = 1 print 2;",
+    "var x = 1 + ;",
+    "func f(a) int { return a; }",
+    "if x { print 1; } else print 2;",
+    "print f(1, 2;",
+    # An empty character is a token of no length.
+    "print '';",
+]
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_engines_agree(source: str):
+    def parse(parser_cls):
+        try:
+            return parser_cls(tokenize_table(source), source).parse()
+        except ValueError as e:
+            return str(e)
+
+    assert parse(PredictiveParser) == parse(Parser)
+
+
+DEPTH = 3 * sys.getrecursionlimit()
+NESTED = [
+    f"print {'(' * DEPTH}1{')' * DEPTH};",
+    f"print {'- ' * DEPTH}1;",
+    f"print {'not ' * DEPTH}true;",
+    f"print 1{' + 1' * DEPTH};",
+    f"func f(a int) int {{ return a; }}\nprint {'f(' * DEPTH}1{')' * DEPTH};",
+    "var x = 1;\n" + "while x < 2 {\n" * DEPTH + "x = 2;\n" + "}\n" * DEPTH,
+]
+
+
+@pytest.mark.parametrize("source", NESTED, ids=lambda source: source[:12])
+def test_deep_nesting(source: str, tmp_path):
+    path = tmp_path / "nested.wb"
+    path.write_text(source)
+    assert compile_to_llvm(str(path))
+
+
+@pytest.mark.parametrize("source", SOURCES[4:])
+def test_parallel_matches_serial(source: str):
+    def parse(jobs):
+        tokens = tokenize_table(source)
+        try:
+            if jobs == 1:
+                return PredictiveParser(tokens, source).parse()
+            return parse_parallel(tokens, source, jobs=jobs)
+        except ValueError as e:
+            return str(e)
+
+    assert parse(2) == parse(1)
+
+
+REPARSE_SOURCE = "var x = 1;\nfunc f(a int) int {\n    return a;\n}\nprint f(x);\n"
+REPARSE_EDITS = [
+    ("return a;", "return a + 1;"),  # change the function
+    ("var x = 1;\n", "var x = 1;\nvar y = 2;\n"),  # push everything down a line
+    ("print f(x);", "print f(x) print 2;"),  # stop short
+    ("}\n", "} else {\n"),  # fail
+]
+
+
+@pytest.mark.parametrize("old, new", REPARSE_EDITS)
+def test_reparse_matches_parse(old: str, new: str):
+    def parse(source, symbols):
+        try:
+            return PredictiveParser(
+                tokenize_table(source, symbols=symbols), source
+            ).parse()
+        except ValueError as e:
+            return str(e)
+
+    previous = PredictiveParser(tokenize_table(REPARSE_SOURCE), REPARSE_SOURCE).parse()
+    edited = REPARSE_SOURCE.replace(old, new)
+    try:
+        reparsed = reparse(previous, edited)
+    except ValueError as e:
+        reparsed = str(e)
+    assert reparsed == parse(edited, previous.symbols)
+
+
+def test_reparse_reuses_statements():
+    previous = PredictiveParser(tokenize_table(REPARSE_SOURCE), REPARSE_SOURCE).parse()
+    previous = reparse(previous, REPARSE_SOURCE)
+    reparsed = reparse(previous, REPARSE_SOURCE.replace("return a;", "return 2;"))
+    kept = [new is old for new, old in zip(reparsed.statements, previous.statements)]
+    assert kept == [True, False, True]
+
+
+def test_nodes_are_slotted():
+    program = PredictiveParser(tokenize_table(REPARSE_SOURCE), REPARSE_SOURCE).parse()
+    statement = program.statements[0]
+    assert not hasattr(statement, "__dict__")
+    assert statement.loc == SourceLoc(lineno=1, start=0, end=9)
+    assert (statement.loc.lineno, statement.loc.start, statement.loc.end) == (1, 0, 9)
+    assert pickle.loads(pickle.dumps(program)) == program
+
+
+def test_unknown_parser(tmp_path):
+    path = tmp_path / "source.wb"
+    path.write_text("print 1;")
+    result = CliRunner().invoke(app, ["llvm", str(path), "--parser", "bogus"])
+    assert result.exit_code == 2 and "'bogus' is not one of" in result.output
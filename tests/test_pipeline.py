@@ -0,0 +1,70 @@
+import pytest
+
+from wabbit.add_types import AddTypes
+from wabbit.check_types import TypeCheck
+from wabbit.fold_constants import FoldConstants
+from wabbit.inline import InlineFunctions
+from wabbit.pipeline import PASSES, PassManager, schedule
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+from wabbit.validator import Validator
+from wabbit.walker import run_passes
+
+SOURCE = """
+var g = 1;
+func f(x int) int {
+    var a = x * (2 + 3);
+    return a;
+}
+print f(g) + 1;
+"""
+
+
+def parse():
+    return PredictiveParser(tokenize_table(SOURCE), SOURCE).parse()
+
+
+def test_schedule():
+    assert schedule([]) == []
+    assert schedule(["typed"]) == [Validator, AddTypes]
+    assert schedule(["folded"]) == [
+        Validator,
+        AddTypes,
+        TypeCheck,
+        InlineFunctions,
+        FoldConstants,
+    ]
+    assert schedule(["pruned", "checked"]) == list(PASSES)
+    with pytest.raises(ValueError):
+        schedule(["optimized"])
+
+
+def test_stages_are_kept():
+    parses = []
+
+    def counting_parse():
+        parses.append(1)
+        return parse()
+
+    manager = PassManager(counting_parse)
+    parsed = manager.get()
+    folded = manager.get("folded")
+    assert manager.get("folded") is folded
+    assert manager.get() is parsed
+    assert manager.get("checked", "pruned") == run_passes(parse(), PASSES)
+    assert folded == run_passes(parse(), PASSES[:5])
+    assert len(parses) == 1
+
+
+def test_starts_from_the_furthest_stage(monkeypatch):
+    manager = PassManager(parse)
+    manager.get("typed")
+    ran = []
+
+    def recording(program, passes, mode="cow"):
+        ran.extend(passes)
+        return run_passes(program, passes, mode)
+
+    monkeypatch.setattr("wabbit.pipeline.run_passes", recording)
+    manager.get("folded")
+    assert ran == [TypeCheck, InlineFunctions, FoldConstants]
@@ -0,0 +1,87 @@
+import re
+
+import pytest
+
+from wabbit import main
+from wabbit.main import STAGES, _to_ast, compile_to_llvm
+from wabbit.predictive import PredictiveParser
+from wabbit.serialize import dump_program, load_program
+from wabbit.tokenizer import tokenize_table
+
+SOURCE = """
+var g = 1;
+var c = 'c';
+func f(x int, y float) int {
+    var a = x * (2 + 3) - -4;
+    if a < 10 and not g == 7 {
+        print y / 2.5;
+    } else {
+        print 99999999999999999999 - 99999999999999999998;
+    }
+    while a > 0 {
+        a = a - 1;
+        break;
+    }
+    return a;
+}
+print f(g, 1.5) + ((1 + 2) * 3);
+f(g, 2.0);
+"""
+
+
+def test_round_trip_each_stage(tmp_path):
+    path = tmp_path / "source.wb"
+    path.write_text(SOURCE)
+    for stage in STAGES:
+        program = _to_ast(str(path), stage=stage)
+        loaded = load_program(dump_program(program), SOURCE, str(path))
+        assert loaded == program
+        assert loaded.symbols.names == program.symbols.names
+
+
+def test_round_trip_errors():
+    source = "print 'ab';\nprint 2;\n"
+    program = PredictiveParser(tokenize_table(source), source).parse()
+    loaded = load_program(dump_program(program), source)
+    # Errors only compare equal to themselves.
+    assert loaded.statements[1:] == program.statements[1:]
+    err = loaded.statements[0].expr.err
+    assert type(err) is type(program.statements[0].expr.err)
+    assert str(err) == str(program.statements[0].expr.err)
+
+
+def test_rejects_other_data():
+    data = dump_program(_program())
+    with pytest.raises(ValueError):
+        load_program(data[:-1], SOURCE)
+    with pytest.raises(ValueError):
+        load_program(b"\x80\x04" + data, SOURCE)
+
+
+def test_cached_stages(tmp_path, monkeypatch):
+    path = tmp_path / "source.wb"
+    path.write_text(SOURCE)
+    cache_dir = str(tmp_path / "cache")
+    expected = {stage: _to_ast(str(path), stage=stage) for stage in STAGES}
+    llvm = compile_to_llvm(str(path), cache_dir=cache_dir)
+
+    def no_parse(*args):
+        raise AssertionError("parsed again")
+
+    monkeypatch.setattr(main, "_parse", no_parse)
+    for stage, program in expected.items():
+        assert _to_ast(str(path), cache_dir=cache_dir, stage=stage) == program
+    # Register and label numbers keep counting across compilations.
+    assert re.sub(r"\.\d+", ".", compile_to_llvm(str(path), cache_dir=cache_dir)) == (
+        re.sub(r"\.\d+", ".", llvm)
+    )
+
+
+def _program():
+    return PredictiveParser(tokenize_table(SOURCE), SOURCE).parse()
+
+
+def test_deep_trees():
+    source = f"print {'(' * 5000}1{')' * 5000};"
+    data = dump_program(PredictiveParser(tokenize_table(source), source).parse())
+    assert dump_program(load_program(data, source)) == data
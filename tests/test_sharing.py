@@ -0,0 +1,54 @@
+import re
+from tempfile import TemporaryDirectory
+
+from wabbit.add_types import add_types
+from wabbit.deinit import deinit_variables
+from wabbit.fold_constants import fold_constants
+from wabbit.main import compile_to_llvm
+from wabbit.model import Interner
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+SOURCE = """
+var x = 1 + 2;
+var y = 1 + 2;
+var z = x * (1 + 2);
+func f(a int) int {
+    return a + 1 + 2;
+}
+print f(z) + y;
+"""
+
+
+def parse(source: str):
+    return PredictiveParser(tokenize_table(source), source).parse()
+
+
+def test_equal_constants_are_shared():
+    program = Interner().tree(parse(SOURCE))
+    x, y, z = program.statements[:3]
+    assert x.expr is y.expr
+    assert z.expr.rhs.expr is x.expr
+    assert x.expr.lhs is program.statements[3].body[0].expr.lhs.rhs
+
+
+def test_passes_keep_sharing():
+    program = Interner().tree(parse(SOURCE))
+    folded = deinit_variables(fold_constants(add_types(program)))
+    assert folded.interner is program.interner
+    x_decl, x_assign, y_decl, y_assign = folded.statements[:4]
+    assert x_decl.type_ is y_decl.type_
+    assert x_assign.rhs is y_assign.rhs
+    assert x_assign.rhs.value == 3
+
+
+def test_llvm_is_unchanged():
+    with TemporaryDirectory() as tmpdir:
+        with open(f"{tmpdir}/source.wb", "w") as f:
+            f.write(SOURCE)
+        # Register numbers keep counting across compilations.
+        plain, shared = (
+            re.sub(r"%\.\d+", "%", compile_to_llvm(f"{tmpdir}/source.wb", share=share))
+            for share in (False, True)
+        )
+    assert plain == shared
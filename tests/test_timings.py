@@ -0,0 +1,76 @@
+import json
+import tracemalloc
+
+from wabbit.main import _report, compile_to_llvm
+from wabbit.predictive import PredictiveParser
+from wabbit.timings import Timings, count_nodes, stage
+from wabbit.tokenizer import tokenize_table
+
+SOURCE = """
+func f(x int) int {
+    return x * (2 + 3);
+}
+print f(1);
+"""
+
+
+def test_stages(tmp_path):
+    path = tmp_path / "source.wb"
+    path.write_text(SOURCE)
+    with Timings() as timings:
+        compile_to_llvm(str(path))
+    names = [s.name for s in timings.stages]
+    assert names[:3] == ["tokenize", "bracecheck", "parse"]
+    assert names[-1] == "llvm"
+    walks = timings.stages[3:-1]
+    assert [s.nodes_in for s in walks[1:]] == [s.nodes_out for s in walks[:-1]]
+    assert all(s.wall >= 0 and s.cpu >= 0 for s in timings.stages)
+
+
+def test_records_while_entered():
+    with stage("idle") as idle:
+        pass
+    assert idle.wall == 0.0
+    with Timings() as timings, stage("outer"), Timings() as inner:
+        with stage("inner"):
+            pass
+    assert [s.name for s in inner.stages] == ["inner"]
+    assert [s.name for s in timings.stages] == ["outer"]
+
+
+def test_report(tmp_path):
+    path = tmp_path / "source.wb"
+    path.write_text(SOURCE)
+    json_path, stacks_path = tmp_path / "timings.json", tmp_path / "stacks"
+    with _report("llvm", str(path), str(json_path), str(stacks_path)):
+        compile_to_llvm(str(path))
+    report = json.loads(json_path.read_text())
+    assert report["command"] == "llvm"
+    assert report["stages"][2]["stage"] == "parse"
+    assert report["stages"][2]["nodes_out"] > 0
+    for line in stacks_path.read_text().splitlines():
+        stack, micros = line.rsplit(" ", 1)
+        assert stack.split(";")[0] in {s["stage"] for s in report["stages"]}
+        assert int(micros) > 0
+
+
+def test_memory(tmp_path):
+    path = tmp_path / "source.wb"
+    path.write_text(SOURCE)
+    with Timings(memory=True) as timings:
+        compile_to_llvm(str(path))
+    assert not tracemalloc.is_tracing()
+    tokens, _, parse = timings.stages[:3]
+    assert tokens.retained > 0 and tokens.peak >= tokens.retained
+    assert any(name.endswith("predictive.py") for name in parse.retained_by_file)
+    assert parse.node_classes["Integer"] == 3
+    assert sum(parse.node_classes.values()) == parse.nodes_out
+    report = json.loads(timings.to_json())
+    assert report["stages"][2]["retained_bytes"] == parse.retained
+
+
+def test_count_nodes():
+    program = PredictiveParser(tokenize_table(SOURCE), SOURCE).parse()
+    # Program, Function, FunctionArg and its Type, the return Type, Return,
+    # BinOp, Name, Parenthesis, BinOp, two Integers, Print, Call, Integer.
+    assert count_nodes(program) == 15
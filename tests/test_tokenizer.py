@@ -0,0 +1,115 @@
+import pytest
+
+from wabbit.incremental import retokenize
+from wabbit.stream import iter_token_chunks
+from wabbit.symbols import SymbolTable
+from wabbit.tokenizer import Token, statement_spans, tokenize, tokenize_table
+
+SOURCES = [
+    "print 1 + 2 * 3;",
+    "var x = 'a';\nvar y = '\\n';\nprint x;",
+    """
+    // comment
+    func fib(n int) int {
+        if n <= 2 and not n != 0 {
+            return 1;
+        }
+        return fib(n - 1) + fib(n - 2);  // trailing comment
+    }
+    var f float;
+    f = 1.5 / 2.0;
+    """,
+    "x==",
+]
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_engines_agree(source: str):
+    assert tokenize(source, engine="regex") == tokenize(source, engine="scan")
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        tokenize("x", engine="bogus")  # type: ignore[arg-type]
+
+
+def test_positions():
+    tokens = tokenize("var x = 1;\n  print x;")
+    assert tokens[0] == Token("VAR", "var", 1, 0)
+    assert tokens[4] == Token("SEMI", ";", 1, 9)
+    assert tokens[5] == Token("PRINT", "print", 2, 3)
+
+
+def test_two_char_symbol_at_end():
+    assert [t.type_ for t in tokenize("x==")] == ["NAME", "EQ"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 16, 1 << 16])
+@pytest.mark.parametrize("source", SOURCES + ["var c = '\n';\nprint c; // don't"])
+def test_stream_matches_tokenize(source: str, chunk_size: int):
+    chunks = iter_token_chunks(source.encode(), "file.wb", chunk_size=chunk_size)
+    assert [token for chunk in chunks for token in chunk] == tokenize(source)
+
+
+def test_brace_partners():
+    source = SOURCES[2]
+    table = tokenize_table(source)
+    # Partners in earlier chunks are filled in as later ones are lexed.
+    chunks = list(iter_token_chunks(source, "file.wb", chunk_size=16))
+    assert [idx for chunk in chunks for idx in chunk.partners] == list(table.partners)
+    braces = {"LPAREN": "RPAREN", "LBRACE": "RBRACE"}
+    for idx, token in enumerate(table):
+        if token.type_ in braces:
+            assert table[table.partners[idx]].type_ == braces[token.type_]
+            assert table.partners[table.partners[idx]] == idx
+
+
+def test_statement_spans():
+    source = """
+    var x = (1 + 2);
+    func f(a int) int { if a < 1 { return 1; } return a; }
+    if x < 1 { print 1; } else { print f(x); }
+    print f(x);
+    """
+    table = tokenize_table(source)
+    spans = list(statement_spans(table))
+    assert [table.type_(start) for start, _ in spans] == ["VAR", "FUNC", "IF", "PRINT"]
+    assert [table.type_(end - 1) for _, end in spans] == [
+        "SEMI",
+        "RBRACE",
+        "RBRACE",
+        "SEMI",
+    ]
+    assert spans[-1][1] == len(table)
+
+
+def test_names_are_interned():
+    source = SOURCES[2]
+    table = tokenize_table(source, "file.wb")
+    symbols = SymbolTable()
+    chunks = iter_token_chunks(source, "file.wb", chunk_size=16, symbols=symbols)
+    assert [sym for chunk in chunks for sym in chunk.syms] == list(table.syms)
+    assert symbols.names == table.symbols.names == ["fib", "n", "f"]
+
+
+EDITS = [
+    (0, 0, "var z = 2;\n"),  # insert a line in front
+    (4, 1, "abc"),  # rename `x`
+    (5, 0, "y"),  # extend a name
+    (2, 1, ""),  # join two tokens
+    (8, 0, "\n\n"),  # split a line
+    (7, 5, " 1 + 2;"),  # replace across a line break
+    (10, 0, "'b'"),  # add a character literal
+    (9, 0, "// "),  # comment out the rest of a line
+    (23, 0, " == 1"),  # append at the end
+]
+
+
+@pytest.mark.parametrize("offset, deleted, inserted", EDITS)
+def test_retokenize_matches_tokenize(offset: int, deleted: int, inserted: str):
+    source = "var x = 1;\nvar yy = 'a';\nprint x;"
+    edited = source[:offset] + inserted + source[offset + deleted :]
+    table = retokenize(tokenize_table(source), offset, deleted, inserted)
+    assert table.source == edited
+    assert list(table) == tokenize(edited)
+    assert table.partners == tokenize_table(edited).partners
@@ -0,0 +1,28 @@
+from utils import compile_and_exec
+
+from wabbit.add_types import add_types
+from wabbit.model import Ty
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+
+
+def test_tags():
+    source = "var x = 1.5;\nprint x * 2.0;\nprint 'c';\nprint not true;\n"
+    program = add_types(PredictiveParser(tokenize_table(source), source).parse())
+    variable, *prints = program.statements
+    assert variable.expr.ty is Ty.FLOAT
+    assert [stmt.expr.ty for stmt in prints] == [Ty.FLOAT, Ty.CHAR, Ty.BOOL]
+    assert prints[0].expr.lhs.ty is Ty.FLOAT
+
+
+def test_print_each_type():
+    source = """
+        var f = 2.5;
+        var c = 'x';
+        var b = true;
+        print f * 2.0;
+        print c;
+        print b == false;
+        print 7 / 2;
+    """
+    assert compile_and_exec(source) == ["5.000000", "xfalse", "3"]
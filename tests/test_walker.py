@@ -0,0 +1,125 @@
+from copy import deepcopy
+
+import pytest
+
+from wabbit.add_types import add_types
+from wabbit.fold_constants import FoldConstants, fold_constants
+from wabbit.main import _simplify_tree
+from wabbit.model import (
+    BinOp,
+    ErrorExpr,
+    Function,
+    LocalName,
+    Parenthesis,
+    Program,
+    Statement,
+    Type,
+)
+from wabbit.pipeline import PASSES
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import tokenize_table
+from wabbit.walker import Visitor, Walker, reachable, run_passes
+
+SOURCE = """
+var g = 1;
+func f(x int) int {
+    var a = x * (2 + 3);
+    while a > 0 {
+        a = a - 1;
+    }
+    return a;
+}
+print f(g) + 1;
+"""
+
+
+def parse():
+    return PredictiveParser(tokenize_table(SOURCE), SOURCE).parse()
+
+
+def test_modes_agree():
+    results = [_simplify_tree(parse(), mode) for mode in ("copy", "cow", "in_place")]
+    assert results[0] == results[1] == results[2]
+
+
+def test_cow_leaves_input_alone():
+    program = add_types(parse())
+    before = deepcopy(program)
+    folded = fold_constants(program)
+    assert program == before
+    assert folded != program
+    # Nodes without a visitor are only copied on the way up from a change.
+    func = folded.statements[1]
+    assert func is not program.statements[1]
+    assert func.args[0] is program.statements[1].args[0]
+    assert func.ret_type_ is program.statements[1].ret_type_
+
+
+def test_in_place():
+    program = add_types(parse())
+    folded = fold_constants(program, "in_place")
+    assert folded is program
+    assert folded.statements[1].body[0].expr.rhs.value == 5
+
+
+def test_compiled_matches_stack():
+    program = add_types(parse())
+    for mode in ("copy", "cow", "in_place"):
+        visitor = FoldConstants([BinOp, Parenthesis], [], SOURCE, "file.wb")
+        expected = Walker(visitor, mode)._traverse(deepcopy(program), None, {})
+        assert Walker(visitor, mode).traverse(deepcopy(program)) == expected
+
+
+def test_deep_trees():
+    source = f"print {'(' * 5000}1 + 2{')' * 5000};"
+    for mode in ("copy", "cow", "in_place"):
+        program = PredictiveParser(tokenize_table(source), source).parse()
+        folded = fold_constants(add_types(program), mode)
+        assert folded.statements[0].expr.value == 3
+
+
+def test_fused_matches_one_walk_each():
+    program = parse()
+    for cls in PASSES:
+        program = run_passes(program, [cls])
+    assert run_passes(parse(), PASSES) == program
+
+
+@pytest.mark.parametrize(
+    "source, error",
+    [
+        ("print 1 + 2.0;\nprint 'ab';\n", "Found 2 characters"),
+        ("var x = 1; var x = 2; print x;\n", "Redeclaration of existing variable"),
+        ("func f(a int) int { return a; } print f(1.5);\n", 'parameter "a"'),
+    ],
+)
+def test_fused_errors(capsys, source, error):
+    program = PredictiveParser(tokenize_table(source), source).parse()
+    with pytest.raises(SystemExit):
+        run_passes(program, PASSES)
+    fused = capsys.readouterr().out
+    program = PredictiveParser(tokenize_table(source), source).parse()
+    with pytest.raises(SystemExit):
+        for cls in PASSES:
+            program = run_passes(program, [cls])
+    assert error in fused and capsys.readouterr().out == fused
+
+
+def test_reachable():
+    assert reachable(Program) >= {Function, LocalName, ErrorExpr}
+    assert Program not in reachable(Statement)
+    assert reachable(Type) == {Type}
+
+
+def test_skips_subtrees_without_visitors():
+    program = add_types(parse())
+
+    class ProgramOnly(Visitor):
+        to_visit = (Program,)
+
+        def visit_program(self, node):
+            return node
+
+    walker = Walker(ProgramOnly.for_program(program), "cow")
+    assert walker.traverse(program).statements is program.statements
+    assert walker._field_names(Program) == ()
@@ -1,84 +1,87 @@
-from typing import Literal, cast
+from mmap import mmap
 
 from wabbit.exceptions import WabbitTypeError
 from wabbit.model import (
     BinOp,
-    BoolCall,
-    BoolName,
-    BoolParen,
-    BoolPrint,
-    BoolRelOp,
-    BoolTyped,
-    BoolVariable,
     Call,
-    CharCall,
-    CharName,
-    CharPrint,
-    CharTyped,
-    CharVariable,
     ErrorExpr,
     Expression,
-    FloatBinOp,
-    FloatCall,
-    FloatName,
-    FloatParen,
-    FloatPrint,
-    FloatRelOp,
-    FloatTyped,
-    FloatUnaryOp,
-    FloatVariable,
     Function,
     FunctionArg,
-    IntBinOp,
-    IntCall,
-    IntName,
-    IntParen,
-    IntPrint,
-    IntRelOp,
-    IntTyped,
-    IntUnaryOp,
-    IntVariable,
     Name,
     Node,
     Parenthesis,
-    Print,
     Program,
     RelationalOp,
     SourceLoc,
+    Ty,
     UnaryOp,
     Variable,
     VariableDecl,
 )
-from wabbit.walker import Visitor, Walker
+from wabbit.symbols import SymbolTable
+from wabbit.walker import MODE, Visitor, run_passes
 
 
 class AddTypes(Visitor):
+    requires = ("validated",)
+    produces = "typed"
+
     def __init__(
         self,
         to_visit: list[type[Node]],
         pre_visit: list[type[Node]],
-        source: str,
+        source: str | mmap,
         fname: str,
+        symbols: SymbolTable | None = None,
     ) -> None:
-        super().__init__(to_visit, pre_visit, source, fname)
-        self._globals: dict[str, Literal["float", "int", "char", "bool"]] = {}
-        self._funcs: dict[str, dict] = {}
-        self._locals: dict[str, Literal["float", "int", "char", "bool"]] = {}
+        super().__init__(to_visit, pre_visit, source, fname, symbols)
+        # Indexed by symbol id.
+        n_symbols = len(self.symbols)
+        self._globals = [Ty.UNKNOWN] * n_symbols
+        self._funcs: list[dict | None] = [None] * n_symbols
+        self._locals = [Ty.UNKNOWN] * n_symbols
+        # A local is only visible if it was declared in the current scope, which
+        # makes leaving a function O(1) instead of clearing `_locals`.
+        self._local_scopes = [0] * n_symbols
+        self._scope = 1
         self._in_scope = False
 
+    @classmethod
+    def for_program(cls, program: Program) -> "AddTypes":
+        return cls(
+            to_visit=[
+                BinOp,
+                RelationalOp,
+                Name,
+                Call,
+                VariableDecl,
+                Variable,
+                Parenthesis,
+                FunctionArg,
+                Function,
+                UnaryOp,
+            ],
+            pre_visit=[
+                Function,
+            ],
+            source=program.source,
+            fname=program.fname,
+            symbols=program.symbols,
+        )
+
     def visit_binop(self, node: BinOp) -> Expression:
-        match (node.lhs, node.rhs):
-            case (IntTyped(), IntTyped()):
-                return IntBinOp(op=node.op, lhs=node.lhs, rhs=node.rhs, loc=node.loc)
-            case (FloatTyped(), FloatTyped()):
-                return FloatBinOp(op=node.op, lhs=node.lhs, rhs=node.rhs, loc=node.loc)
+        match (node.lhs.ty, node.rhs.ty):
+            case (Ty.INT, Ty.INT) | (Ty.FLOAT, Ty.FLOAT):
+                node.ty = node.lhs.ty
+                return node
             case _:
                 return ErrorExpr(
                     loc=node.loc,
                     err=WabbitTypeError(
                         msg=(
                             f"Operator {node.op} not supported for types "
-                            f'"{_type(node.lhs)}" and "{_type(node.rhs)}"'
+                            f'"{node.lhs.ty.value}" and "{node.rhs.ty.value}"'
                         ),
                         fname=self.fname,
                         source=self.source,
@@ -87,20 +90,17 @@ class AddTypes(Visitor):
                 )
 
     def visit_relationalop(self, node: RelationalOp) -> Expression:
-        match (node.lhs, node.rhs):
-            case (IntTyped(), IntTyped()):
-                return IntRelOp(op=node.op, lhs=node.lhs, rhs=node.rhs, loc=node.loc)
-            case (FloatTyped(), FloatTyped()):
-                return FloatRelOp(op=node.op, lhs=node.lhs, rhs=node.rhs, loc=node.loc)
-            case (BoolTyped(), BoolTyped()):
-                return BoolRelOp(op=node.op, lhs=node.lhs, rhs=node.rhs, loc=node.loc)
+        match (node.lhs.ty, node.rhs.ty):
+            case (Ty.INT, Ty.INT) | (Ty.FLOAT, Ty.FLOAT) | (Ty.BOOL, Ty.BOOL):
+                node.ty = node.lhs.ty
+                return node
             case _:
                 return ErrorExpr(
                     loc=node.loc,
                     err=WabbitTypeError(
                         msg=(
                             f"Operator {node.op} not supported for types "
-                            f'"{_type(node.lhs)}" and "{_type(node.rhs)}"'
+                            f'"{node.lhs.ty.value}" and "{node.rhs.ty.value}"'
                         ),
                         fname=self.fname,
                         source=self.source,
@@ -109,44 +109,29 @@ class AddTypes(Visitor):
                 )
 
     def visit_unaryop(self, node: UnaryOp) -> Expression:
-        if isinstance(node.expr, IntTyped):
-            return IntUnaryOp(op=node.op, expr=node.expr, loc=node.loc)
-        elif isinstance(node.expr, FloatTyped):
-            return FloatUnaryOp(op=node.op, expr=node.expr, loc=node.loc)
+        if node.expr.ty in (Ty.INT, Ty.FLOAT):
+            node.ty = node.expr.ty
+            return node
 
         return ErrorExpr(
             loc=node.loc,
             err=WabbitTypeError(
-                msg=f'Operator {node.op} not supported for type "{_type(node.expr)}".',
+                msg=f'Operator {node.op} not supported for type "{node.expr.ty.value}".',
                 fname=self.fname,
                 source=self.source,
                 loc=node.loc,
             ),
         )
 
-    def visit_print(self, node: Print) -> Print:
-        if isinstance(node.expr, IntTyped):
-            return IntPrint(expr=node.expr, loc=node.loc)
-        elif isinstance(node.expr, FloatTyped):
-            return FloatPrint(expr=node.expr, loc=node.loc)
-        elif isinstance(node.expr, CharTyped):
-            return CharPrint(expr=node.expr, loc=node.loc)
-        elif isinstance(node.expr, BoolTyped):
-            return BoolPrint(expr=node.expr, loc=node.loc)
-        return node
-
     def visit_parenthesis(self, node: Parenthesis) -> Expression:
-        if isinstance(node.expr, IntTyped):
-            return IntParen(expr=node.expr, loc=node.loc)
-        elif isinstance(node.expr, FloatTyped):
-            return FloatParen(expr=node.expr, loc=node.loc)
-        elif isinstance(node.expr, BoolTyped):
-            return BoolParen(expr=node.expr, loc=node.loc)
+        if node.expr.ty in (Ty.INT, Ty.FLOAT, Ty.BOOL):
+            node.ty = node.expr.ty
+            return node
 
         return ErrorExpr(
             loc=node.loc,
             err=WabbitTypeError(
-                msg=f'Parenthesis not supported for type"{_type(node.expr)}".',
+                msg=f'Parenthesis not supported for type"{node.expr.ty.value}".',
                 fname=self.fname,
                 source=self.source,
                 loc=node.loc,
@@ -154,8 +139,8 @@ class AddTypes(Visitor):
         )
 
     def visit_variable(self, node: Variable) -> Variable:
-        name = node.name
-        if name in self._locals or name in self._globals:
+        declared = self._local(node.sym), self._globals[node.sym]
+        if declared != (Ty.UNKNOWN, Ty.UNKNOWN):
             expr = ErrorExpr(
                 loc=node.loc,
                 err=WabbitTypeError(
@@ -168,34 +153,17 @@ class AddTypes(Visitor):
         else:
             expr = node.expr
 
-        to_update = self._locals if self._in_scope else self._globals
-        if isinstance(node.expr, IntTyped):
-            to_update[node.name] = "int"
-            return IntVariable(name=node.name, expr=expr, loc=node.loc)
-
-        elif isinstance(node.expr, FloatTyped):
-            to_update[node.name] = "float"
-            return FloatVariable(name=node.name, expr=expr, loc=node.loc)
-
-        elif isinstance(node.expr, CharTyped):
-            to_update[node.name] = "char"
-            return CharVariable(name=node.name, expr=expr, loc=node.loc)
-
-        elif isinstance(node.expr, BoolTyped):
-            to_update[node.name] = "bool"
-            return BoolVariable(name=node.name, expr=expr, loc=node.loc)
-
+        if node.expr.ty is not Ty.UNKNOWN:
+            self._declare(node.sym, node.expr.ty)
+            node.expr = expr
         return node
 
     def visit_variabledecl(self, node: VariableDecl) -> VariableDecl:
-        if self._in_scope:
-            self._locals[node.name] = node.type_.value
-        else:
-            self._globals[node.name] = node.type_.value
+        self._declare(node.sym, Ty(node.type_.value))
         return node
 
     def visit_call(self, node: Call) -> Expression:
-        func = self._funcs.get(node.name)
+        func = self._funcs[node.sym]
         if not func:
             return ErrorExpr(
                 err=WabbitTypeError(
@@ -208,7 +176,7 @@ class AddTypes(Visitor):
             )
 
         ret_type_ = func["ret"]
-        args = self._funcs[node.name]["args"]
+        args = func["args"]
         if len(args) != len(node.args):
             return ErrorExpr(
                 err=WabbitTypeError(
@@ -233,7 +201,7 @@ class AddTypes(Visitor):
             param_type = args[idx].type_.value
             param_name = args[idx].value
 
-            if not (type_ := _type(arg)) == param_type:
+            if not (type_ := arg.ty.value) == param_type:
                 new_args.append(
                     ErrorExpr(
                         loc=node.loc,
@@ -251,23 +219,18 @@ class AddTypes(Visitor):
                 )
             else:
                 new_args.append(arg)
-        if ret_type_ == "int":
-            return IntCall(name=node.name, args=new_args, loc=node.loc)
-        elif ret_type_ == "float":
-            return FloatCall(name=node.name, args=new_args, loc=node.loc)
-        elif ret_type_ == "bool":
-            return BoolCall(name=node.name, args=new_args, loc=node.loc)
-        else:
-            return CharCall(name=node.name, args=new_args, loc=node.loc)
+        node.args = new_args
+        node.ty = Ty(ret_type_)
+        return node
 
     def visit_name(self, node: Name) -> Expression:
         if self._in_scope:
-            type_ = self._locals.get(node.value)
-            if not type_:
-                type_ = self._globals.get(node.value)
+            type_ = self._local(node.sym)
+            if type_ is Ty.UNKNOWN:
+                type_ = self._globals[node.sym]
         else:
-            type_ = self._globals.get(node.value)
-        if not type_:
+            type_ = self._globals[node.sym]
+        if type_ is Ty.UNKNOWN:
             return ErrorExpr(
                 err=WabbitTypeError(
                     msg=f'"{node.value}" is not defined.',
@@ -277,60 +240,35 @@ class AddTypes(Visitor):
                 ),
                 loc=node.loc,
             )
-        if type_ == "int":
-            return IntName(value=node.value, loc=node.loc)
-        elif type_ == "float":
-            return FloatName(value=node.value, loc=node.loc)
-        elif type_ == "bool":
-            return BoolName(value=node.value, loc=node.loc)
-        else:
-            return CharName(value=node.value, loc=node.loc)
+        node.ty = type_
+        return node
 
     def visit_functionarg(self, node: FunctionArg) -> FunctionArg:
-        self._locals[node.value] = node.type_.value
+        node.ty = Ty(node.type_.value)
+        self._locals[node.sym] = node.ty
+        self._local_scopes[node.sym] = self._scope
         return node
 
     def visit_function(self, node: Function) -> Function:
         arg_types = [arg for arg in node.args]
-        self._funcs[node.name] = {"args": arg_types, "ret": node.ret_type_.value}
+        self._funcs[node.sym] = {"args": arg_types, "ret": node.ret_type_.value}
         if self._in_scope:
-            self._locals = {}
+            self._scope += 1
         self._in_scope = not self._in_scope
         return node
 
+    def _local(self, sym: int) -> Ty:
+        if self._local_scopes[sym] == self._scope:
+            return self._locals[sym]
+        return Ty.UNKNOWN
 
-def add_types(program: Program) -> Program:
-    visitor = AddTypes(
-        to_visit=[
-            BinOp,
-            RelationalOp,
-            Name,
-            Call,
-            VariableDecl,
-            Variable,
-            Parenthesis,
-            FunctionArg,
-            Function,
-            Print,
-            UnaryOp,
-        ],
-        pre_visit=[
-            Function,
-        ],
-        source=program.source,
-        fname=program.fname,
-    )
-    return cast(Program, Walker(visitor).traverse(program))
+    def _declare(self, sym: int, type_: Ty):
+        if self._in_scope:
+            self._locals[sym] = type_
+            self._local_scopes[sym] = self._scope
+        else:
+            self._globals[sym] = type_
 
 
-def _type(node) -> Literal["int", "float", "char", "bool", "unknown"]:
-    if isinstance(node, IntTyped):
-        return "int"
-    elif isinstance(node, FloatTyped):
-        return "float"
-    elif isinstance(node, CharTyped):
-        return "char"
-    elif isinstance(node, BoolTyped):
-        return "bool"
-    else:
-        return "unknown"
+def add_types(program: Program, mode: MODE = "cow") -> Program:
+    return run_passes(program, [AddTypes], mode)
@@ -0,0 +1,441 @@
+"""The tree as parallel NumPy arrays, for passes that are really bulk scans.
+
+Needs the `arena` extra, `pip install wabbit[arena]`.
+"""
+
+from array import array
+from dataclasses import fields
+from typing import get_args, get_origin
+
+import numpy as np
+
+from wabbit import model
+from wabbit.exceptions import WabbitError
+from wabbit.model import (
+    BinOp,
+    Boolean,
+    Branch,
+    ErrorExpr,
+    Float,
+    Function,
+    GlobalName,
+    GlobalVar,
+    Integer,
+    LocalName,
+    LocalVar,
+    Name,
+    Node,
+    Parenthesis,
+    Program,
+    SourceLoc,
+    Ty,
+    UnaryOp,
+    VariableDecl,
+    While,
+)
+from wabbit.utils import gc_paused
+
+# Every node class by kind code, code 0 is a list of nodes.
+KINDS: tuple[type[Node] | None, ...] = (
+    None,
+    *(
+        cls
+        for cls in vars(model).values()
+        if isinstance(cls, type) and issubclass(cls, Node)
+    ),
+)
+KIND_CODES = {cls: code for code, cls in enumerate(KINDS)}
+LIST = 0
+
+TYS = tuple(Ty)
+TY_CODES = {ty: code for code, ty in enumerate(TYS)}
+
+OPS = ("", "+", "-", "*", "/", "==", "!=", "<", ">", "<=", ">=", "and", "or", "not")
+OP_CODES = {op: code for code, op in enumerate(OPS)}
+
+# Fields kept in their own column rather than with the other values of a node.
+_COLUMNS = {"loc", "ty", "sym", "op"}
+
+
+class Arena:
+    """A `Program` stored column-wise, one row per node and per list of nodes.
+
+    Rows are numbered in pre-order, so the descendants of row `i` are the rows
+    `i + 1` up to `ends[i]`. Children are linked through `first_child` and
+    `next_sibling`, in the order of the fields of their parent. The value of an
+    `Integer` is in `values` unless it doesn't fit in 64 bits, those are kept
+    in `wide`. Any other field that isn't a node goes in `extras`.
+    """
+
+    def __init__(self) -> None:
+        self.kinds = np.zeros(0, np.uint8)
+        self.tys = np.zeros(0, np.uint8)
+        self.ops = np.zeros(0, np.uint8)
+        self.parents = np.zeros(0, np.int32)
+        self.first_child = np.zeros(0, np.int32)
+        self.next_sibling = np.zeros(0, np.int32)
+        self.ends = np.zeros(0, np.int32)
+        self.syms = np.zeros(0, np.int32)
+        self.values = np.zeros(0, np.int64)
+        self.linenos = np.zeros(0, np.uint32)
+        self.starts = np.zeros(0, np.uint32)
+        self.stops = np.zeros(0, np.uint32)
+        # Rows cut off from the tree by a pass.
+        self.live = np.zeros(0, np.bool_)
+        self.extras: list[tuple] = []
+        self.wide: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+
+def to_arena(program: Program) -> Arena:
+    with gc_paused():
+        return _to_arena(program)
+
+
+def _to_arena(program: Program) -> Arena:
+    kinds, tys, ops = array("B"), array("B"), array("B")
+    parents, ends, syms, values = array("i"), array("i"), array("i"), array("q")
+    linenos, starts, stops = array("I"), array("I"), array("I")
+    first_child: list[int] = []
+    next_sibling: list[int] = []
+    last_child: list[int] = []
+    extras: list[tuple] = []
+    wide: dict[int, int] = {}
+
+    stack: list[tuple[object, int]] = [(program, -1)]
+    while stack:
+        item, parent = stack.pop()
+        if item is _END:
+            ends[parent] = len(kinds)
+            continue
+        row = len(kinds)
+        parents.append(parent)
+        ends.append(0)
+        first_child.append(-1)
+        next_sibling.append(-1)
+        last_child.append(-1)
+        if parent >= 0:
+            if first_child[parent] < 0:
+                first_child[parent] = row
+            else:
+                next_sibling[last_child[parent]] = row
+            last_child[parent] = row
+
+        stack.append((_END, row))
+        if isinstance(item, list):
+            kinds.append(LIST)
+            tys.append(0)
+            ops.append(0)
+            syms.append(-1)
+            values.append(0)
+            linenos.append(0)
+            starts.append(0)
+            stops.append(0)
+            extras.append(())
+            stack.extend((child, row) for child in reversed(item))
+            continue
+
+        node = item
+        layout = _LAYOUTS[KIND_CODES[type(node)]]
+        kinds.append(KIND_CODES[type(node)])
+        tys.append(TY_CODES[node.ty] if layout.ty else 0)
+        ops.append(OP_CODES[node.op] if layout.op else 0)
+        syms.append(node.sym if layout.sym else -1)
+        value = 0
+        if layout.value:
+            value = node.value
+            if not _INT64_MIN <= value <= _INT64_MAX:
+                wide[row] = value
+                value = 0
+        values.append(value)
+        loc = node.loc
+        linenos.append(loc.lineno)
+        starts.append(loc.start)
+        stops.append(loc.end)
+        extras.append(tuple(getattr(node, name) for name in layout.extras))
+        stack.extend((getattr(node, name), row) for name in reversed(layout.children))
+
+    arena = Arena()
+    arena.kinds = np.frombuffer(kinds, np.uint8).copy()
+    arena.tys = np.frombuffer(tys, np.uint8).copy()
+    arena.ops = np.frombuffer(ops, np.uint8).copy()
+    arena.parents = np.frombuffer(parents, np.int32).copy()
+    arena.first_child = np.array(first_child, np.int32)
+    arena.next_sibling = np.array(next_sibling, np.int32)
+    arena.ends = np.frombuffer(ends, np.int32).copy()
+    arena.syms = np.frombuffer(syms, np.int32).copy()
+    arena.values = np.frombuffer(values, np.int64).copy()
+    arena.linenos = np.frombuffer(linenos, np.uint32).copy()
+    arena.starts = np.frombuffer(starts, np.uint32).copy()
+    arena.stops = np.frombuffer(stops, np.uint32).copy()
+    arena.live = np.ones(len(kinds), np.bool_)
+    arena.extras = extras
+    arena.wide = wide
+    return arena
+
+
+def from_arena(arena: Arena) -> Program:
+    with gc_paused():
+        return _from_arena(arena)
+
+
+def _from_arena(arena: Arena) -> Program:
+    kinds = arena.kinds.tolist()
+    tys = arena.tys.tolist()
+    ops = arena.ops.tolist()
+    syms = arena.syms.tolist()
+    values = arena.values.tolist()
+    linenos = arena.linenos.tolist()
+    starts = arena.starts.tolist()
+    stops = arena.stops.tolist()
+    first_child = arena.first_child.tolist()
+    next_sibling = arena.next_sibling.tolist()
+    extras = arena.extras
+    wide = arena.wide
+
+    # Only rows still reachable from the root, in pre-order.
+    order = []
+    stack = [0]
+    while stack:
+        row = stack.pop()
+        order.append(row)
+        child = first_child[row]
+        children = []
+        while child >= 0:
+            children.append(child)
+            child = next_sibling[child]
+        stack.extend(reversed(children))
+
+    built: dict[int, object] = {}
+    for row in reversed(order):
+        children = []
+        child = first_child[row]
+        while child >= 0:
+            children.append(built.pop(child))
+            child = next_sibling[child]
+        kind = kinds[row]
+        if kind == LIST:
+            built[row] = children
+            continue
+
+        cls = KINDS[kind]
+        layout = _LAYOUTS[kind]
+        node = cls.__new__(cls)
+        node.loc = SourceLoc(linenos[row], starts[row], stops[row])
+        for name, child in zip(layout.children, children):
+            setattr(node, name, child)
+        for name, extra in zip(layout.extras, extras[row]):
+            setattr(node, name, extra)
+        if layout.ty:
+            node.ty = TYS[tys[row]]
+        if layout.op:
+            node.op = OPS[ops[row]]
+        if layout.sym:
+            node.sym = syms[row]
+        if layout.value:
+            node.value = wide.get(row, values[row])
+        built[row] = node
+    return built[0]
+
+
+def validate_arena(arena: Arena) -> Arena:
+    """`wabbit.validator.validate_ast` as a single scan over `kinds`."""
+    rows = np.flatnonzero((arena.kinds == _ERROR_EXPR) & arena.live)
+    errors: list[WabbitError] = [arena.extras[row][0] for row in rows.tolist()]
+    if errors:
+        for err in errors:
+            print(err)
+        exit()
+    return arena
+
+
+def fold_arena_constants(arena: Arena) -> Arena:
+    """The integer folding of `wabbit.fold_constants.fold_constants`, a round
+    per level of nesting.
+
+    Each round folds every candidate whose operands are integer literals, as
+    `i32` would, and literals in parentheses, and makes their parents the next
+    candidates. Floats, booleans, variables and branches are left to the
+    walker pass.
+    """
+    kinds, tys, values, first_child = (
+        arena.kinds,
+        arena.tys,
+        arena.values,
+        arena.first_child,
+    )
+    int_ty = TY_CODES[Ty.INT]
+    candidates = np.flatnonzero(
+        np.isin(kinds, (_BIN_OP, _PARENTHESIS, _UNARY_OP)) & arena.live
+    )
+    while len(candidates):
+        parens = candidates[kinds[candidates] == _PARENTHESIS]
+        exprs = first_child[parens]
+        literal = np.isin(kinds[exprs], (_INTEGER, _FLOAT, _BOOLEAN))
+        parens, exprs = parens[literal], exprs[literal]
+        kinds[parens] = kinds[exprs]
+        tys[parens] = tys[exprs]
+        values[parens] = values[exprs]
+        for paren, expr in zip(parens.tolist(), exprs.tolist()):
+            arena.extras[paren] = arena.extras[expr]
+            if expr in arena.wide:
+                arena.wide[paren] = arena.wide[expr]
+
+        negations = candidates[
+            (kinds[candidates] == _UNARY_OP) & (tys[candidates] == int_ty)
+        ]
+        negations = negations[kinds[first_child[negations]] == _INTEGER]
+        values[negations] = _wrap(-_i32(arena, first_child[negations]))
+
+        binops = candidates[
+            (kinds[candidates] == _BIN_OP) & (tys[candidates] == int_ty)
+        ]
+        lhs = first_child[binops]
+        rhs = arena.next_sibling[lhs]
+        op = arena.ops[binops]
+        lhs_val, rhs_val = _i32(arena, lhs), _i32(arena, rhs)
+        binops_ok = (
+            (kinds[lhs] == _INTEGER)
+            & (kinds[rhs] == _INTEGER)
+            & np.isin(op, (_PLUS, _MINUS, _TIMES, _DIVIDE))
+            # `sdiv` is undefined for these, leave them to it.
+            & ~(
+                (op == _DIVIDE)
+                & ((rhs_val == 0) | ((lhs_val == _I32_MIN) & (rhs_val == -1)))
+            )
+        )
+        # Operands of `i32` can't overflow 64 bits.
+        quotient = np.abs(lhs_val) // np.where(rhs_val == 0, 1, np.abs(rhs_val))
+        res = np.select(
+            [op == _PLUS, op == _MINUS, op == _TIMES],
+            [lhs_val + rhs_val, lhs_val - rhs_val, lhs_val * rhs_val],
+            np.where((lhs_val < 0) == (rhs_val < 0), quotient, -quotient),
+        )
+        binops = binops[binops_ok]
+        values[binops] = _wrap(res[binops_ok])
+
+        folded = np.concatenate([parens, negations, binops])
+        integers = np.concatenate([negations, binops])
+        kinds[integers] = _INTEGER
+        arena.ops[folded] = 0
+        _cut_off(arena, folded)
+        first_child[folded] = -1
+        parents = arena.parents[folded]
+        candidates = np.unique(parents[parents >= 0])
+    return arena
+
+
+def resolve_arena_scopes(arena: Arena) -> Arena:
+    """`wabbit.resolve.resolve_scopes` with masks over the whole tree.
+
+    A name is local if it is within a function, branch or loop and no global
+    of the same symbol was declared before it.
+    """
+    kinds, live, syms = arena.kinds, arena.live, arena.syms
+    scopes = np.flatnonzero(
+        ((kinds == _FUNCTION) | (kinds == _BRANCH) | (kinds == _WHILE)) & live
+    )
+    depth = np.zeros(len(arena) + 1, np.int32)
+    np.add.at(depth, scopes + 1, 1)
+    np.add.at(depth, arena.ends[scopes], -1)
+    in_scope = np.cumsum(depth[:-1]) > 0
+
+    decls = (kinds == _VARIABLE_DECL) & live
+    global_decls = np.flatnonzero(decls & ~in_scope)
+    first_global = np.full(max(int(syms.max(initial=0)) + 1, 1), len(arena), np.int64)
+    np.minimum.at(first_global, syms[global_decls], global_decls)
+
+    names = np.flatnonzero((kinds == _NAME) & live)
+    is_global = first_global[syms[names]] < names
+    local = in_scope[names] & ~is_global
+    kinds[names] = np.where(local, _LOCAL_NAME, _GLOBAL_NAME)
+
+    decls = np.flatnonzero(decls)
+    kinds[decls] = np.where(in_scope[decls], _LOCAL_VAR, _GLOBAL_VAR)
+    return arena
+
+
+def _i32(arena: Arena, rows: np.ndarray) -> np.ndarray:
+    """The values of the integer literals `rows` as `i32` holds them, as 64 bits."""
+    values = arena.values[rows]
+    if arena.wide:
+        for i in np.flatnonzero(np.isin(rows, list(arena.wide))).tolist():
+            values[i] = arena.wide[int(rows[i])] % (1 << 32)
+    return _wrap(values)
+
+
+def _wrap(values: np.ndarray) -> np.ndarray:
+    """`values` cut to 32 bits, as `i32` would."""
+    return values.astype(np.int32).astype(np.int64)
+
+
+def _cut_off(arena: Arena, rows: np.ndarray) -> None:
+    """Mark the descendants of `rows` as no longer part of the tree."""
+    cut = np.zeros(len(arena) + 1, np.int32)
+    np.add.at(cut, rows + 1, 1)
+    np.add.at(cut, arena.ends[rows], -1)
+    arena.live &= np.cumsum(cut[:-1]) == 0
+
+
+class _Layout:
+    """Where each field of a node class goes in an `Arena`."""
+
+    def __init__(self, cls: type[Node]) -> None:
+        names = [f.name for f in fields(cls)]
+        self.children = tuple(
+            f.name
+            for f in fields(cls)
+            if f.name not in _COLUMNS and _holds_nodes(f.type)
+        )
+        self.value = cls is Integer
+        self.extras = tuple(
+            name
+            for name in names
+            if name not in _COLUMNS
+            and name not in self.children
+            and not (self.value and name == "value")
+        )
+        self.ty = "ty" in names
+        self.op = "op" in names
+        self.sym = "sym" in names
+
+
+def _holds_nodes(type_: object) -> bool:
+    if get_origin(type_) is list:
+        (type_,) = get_args(type_)
+    return isinstance(type_, type) and issubclass(type_, Node)
+
+
+_LAYOUTS = [None, *(_Layout(cls) for cls in KINDS[1:])]
+
+# Marks the end of the descendants of a row on the stack of `to_arena`.
+_END = object()
+
+_INT64_MIN = np.iinfo(np.int64).min
+_INT64_MAX = np.iinfo(np.int64).max
+
+_BIN_OP = KIND_CODES[BinOp]
+_BOOLEAN = KIND_CODES[Boolean]
+_BRANCH = KIND_CODES[Branch]
+_ERROR_EXPR = KIND_CODES[ErrorExpr]
+_FLOAT = KIND_CODES[Float]
+_FUNCTION = KIND_CODES[Function]
+_GLOBAL_NAME = KIND_CODES[GlobalName]
+_GLOBAL_VAR = KIND_CODES[GlobalVar]
+_INTEGER = KIND_CODES[Integer]
+_LOCAL_NAME = KIND_CODES[LocalName]
+_LOCAL_VAR = KIND_CODES[LocalVar]
+_NAME = KIND_CODES[Name]
+_PARENTHESIS = KIND_CODES[Parenthesis]
+_UNARY_OP = KIND_CODES[UnaryOp]
+_VARIABLE_DECL = KIND_CODES[VariableDecl]
+_WHILE = KIND_CODES[While]
+
+_PLUS = OP_CODES["+"]
+_MINUS = OP_CODES["-"]
+_TIMES = OP_CODES["*"]
+_DIVIDE = OP_CODES["/"]
+
+_I32_MIN = np.iinfo(np.int32).min
@@ -1,47 +1,43 @@
+from collections.abc import Iterable
+from mmap import mmap
+
 from wabbit.exceptions import WabbitSyntaxError
-from wabbit.tokenizer import Token
+from wabbit.tokenizer import TokenTable
 
 
-def validate_braces(tokens: list[Token], source: str, fname: str = "file.wb"):
-    curly = []
-    paren = []
+def validate_braces(
+    tokens: TokenTable | Iterable[TokenTable],
+    source: str | mmap,
+    fname: str = "file.wb",
+):
+    """Report the braces and parens that were left unpaired while lexing."""
+    table = tokens if isinstance(tokens, TokenTable) else None
+    if table is None:
+        # Lexing the chunks is what pairs them up, the last one has the result.
+        for table in tokens:
+            pass
+        if table is None:
+            return
+    braces = table.braces
     errors: list[WabbitSyntaxError] = []
 
-    for token in tokens:
-        if token.type_ == "LPAREN":
-            paren.append(token)
-        elif token.type_ == "RPAREN":
-            if len(paren) > 0:
-                paren.pop()
-            else:
-                errors.append(
-                    WabbitSyntaxError.from_token(
-                        "Found `)` with no opening `(`", fname, source, token
-                    )
-                )
-        elif token.type_ == "LBRACE":
-            curly.append(token)
-        elif token.type_ == "RBRACE":
-            if len(curly):
-                curly.pop()
-            else:
-                errors.append(
-                    WabbitSyntaxError.from_token(
-                        "Found `}` with no opening `{`", fname, source, token
-                    )
-                )
+    for table, idx in braces.unmatched:
+        found = "Found `)` with no opening `(`"
+        if table.type_(idx) == "RBRACE":
+            found = "Found `}` with no opening `{`"
+        errors.append(WabbitSyntaxError.from_token(found, fname, source, table, idx))
 
-    for token in curly:
+    for table, idx in braces.curlies:
         errors.append(
             WabbitSyntaxError.from_token(
-                "Found `{` with no closing `}", fname, source, token
+                "Found `{` with no closing `}", fname, source, table, idx
             )
         )
 
-    for token in paren:
+    for table, idx in braces.parens:
         errors.append(
             WabbitSyntaxError.from_token(
-                "Found `(` with no closing `)", fname, source, token
+                "Found `(` with no closing `)", fname, source, table, idx
             )
         )
     if errors:
@@ -0,0 +1,52 @@
+"""On-disk cache of the tree after each stage of the pipeline, see `wabbit.main`."""
+
+import os
+from functools import cache
+from hashlib import blake2b
+from mmap import mmap
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+from wabbit.model import Program
+from wabbit.serialize import FORMAT_VERSION, dump_program, load_program
+
+
+@cache
+def compiler_version() -> str:
+    """Hash of the compiler's own modules, changing any of them starts afresh."""
+    digest = blake2b(str(FORMAT_VERSION).encode(), digest_size=8)
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Encoded trees of one source, one file per stage.
+
+    They live in `<directory>/<compiler version>/<source hash>.<stage>`.
+    """
+
+    def __init__(self, directory: str | Path, source: str | mmap, fname: str) -> None:
+        data = source.encode() if isinstance(source, str) else source
+        self._key = blake2b(data, digest_size=16).hexdigest()
+        self._dir = Path(directory) / compiler_version()
+        self._source = source
+        self._fname = fname
+
+    def path(self, stage: str) -> Path:
+        return self._dir / f"{self._key}.{stage}"
+
+    def load(self, stage: str) -> Program | None:
+        """The cached tree after `stage`, or `None` if there is no usable one."""
+        try:
+            data = self.path(stage).read_bytes()
+            return load_program(data, self._source, self._fname)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, stage: str, program: Program) -> None:
+        self._dir.mkdir(parents=True, exist_ok=True)
+        # Write aside and rename, a concurrent load never sees half a file.
+        with NamedTemporaryFile(dir=self._dir, delete=False) as f:
+            f.write(dump_program(program))
+        os.replace(f.name, self.path(stage))
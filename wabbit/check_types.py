@@ -1,36 +1,47 @@
-from typing import Literal, cast
+from mmap import mmap
 
 from wabbit.exceptions import WabbitSyntaxError, WabbitTypeError
 from wabbit.model import (
-    BoolTyped,
     Break,
-    CharTyped,
     ErrorExpr,
-    FloatTyped,
     Function,
-    IntTyped,
     Node,
     Program,
     Return,
+    Ty,
     While,
 )
-from wabbit.walker import Visitor, Walker
+from wabbit.walker import MODE, Visitor, run_passes
 
 
 class TypeCheck(Visitor):
+    requires = ("typed",)
+    produces = "checked"
+    # `AddTypes` puts errors into nodes it has already walked the children of.
+    fuses = False
+
     def __init__(
         self,
         to_visit: list[type[Node]],
         pre_visit: list[type[Node]],
-        source: str,
+        source: str | mmap,
         fname: str,
     ) -> None:
         self._in_func = False
-        self._ret_type = ""
+        self._ret_type = Ty.UNKNOWN
         self._in_loop = False
         self._visited = set()
         super().__init__(to_visit, pre_visit, source, fname)
 
+    @classmethod
+    def for_program(cls, program: Program) -> "TypeCheck":
+        return cls(
+            to_visit=[ErrorExpr, Function, Return, While, Break],
+            pre_visit=[Function, While],
+            source=program.source,
+            fname=program.fname,
+        )
+
     def visit_errorexpr(self, node: ErrorExpr) -> ErrorExpr:
         if id(node) not in self._visited:
             self.errors.append(node.err)
@@ -39,7 +50,7 @@ class TypeCheck(Visitor):
 
     def visit_function(self, node: Function) -> Function:
         self._in_func = not self._in_func
-        self._ret_type = node.ret_type_.value
+        self._ret_type = Ty(node.ret_type_.value)
         return node
 
     def visit_return(self, node: Return) -> Return:
@@ -52,13 +63,13 @@ class TypeCheck(Visitor):
                     loc=node.loc,
                 )
             )
-        elif (type_ := _type(node.expr)) != self._ret_type:
+        elif node.expr.ty is not self._ret_type:
             if id(node) not in self._visited:
                 self.errors.append(
                     WabbitTypeError(
                         msg=(
-                            f'Expression of type "{type_}" cannot be '
-                            f'assigned to return type "{self._ret_type}".'
+                            f'Expression of type "{node.expr.ty.value}" cannot be '
+                            f'assigned to return type "{self._ret_type.value}".'
                         ),
                         fname=self.fname,
                         source=self.source,
@@ -87,29 +98,5 @@ class TypeCheck(Visitor):
         return node
 
 
-def check_types(ast: Program) -> Program:
-    visitor = TypeCheck(
-        to_visit=[ErrorExpr, Function, Return, While, Break],
-        pre_visit=[Function, While],
-        source=ast.source,
-        fname=ast.fname,
-    )
-    ast = cast(Program, Walker(visitor=visitor).traverse(ast))
-    if visitor.errors:
-        for err in visitor.errors:
-            print(err)
-        exit()
-    return ast
-
-
-def _type(node) -> Literal["int", "float", "char", "bool", "unknown"]:
-    if isinstance(node, IntTyped):
-        return "int"
-    elif isinstance(node, FloatTyped):
-        return "float"
-    elif isinstance(node, CharTyped):
-        return "char"
-    elif isinstance(node, BoolTyped):
-        return "bool"
-    else:
-        return "unknown"
+def check_types(ast: Program, mode: MODE = "cow") -> Program:
+    return run_passes(ast, [TypeCheck], mode)
@@ -0,0 +1,181 @@
+from dataclasses import fields
+from mmap import mmap
+
+from wabbit.model import (
+    Boolean,
+    Branch,
+    Break,
+    Call,
+    Function,
+    Node,
+    Program,
+    Return,
+    Statement,
+    VariableDecl,
+    While,
+)
+from wabbit.symbols import SymbolTable
+from wabbit.walker import MODE, Visitor, run_passes
+
+
+class EliminateDeadCode(Visitor):
+    """Drops what never runs: statements after one control doesn't come out
+    of, like a `return` or `break`, the side of a branch or loop its known
+    condition never takes, and the functions `main` never calls, even
+    through other functions.
+
+    Declarations in dropped code are kept, the generated code allocates a
+    variable where it is declared.
+    """
+
+    requires = ("unscripted",)
+    produces = "pruned"
+    # The body of `main` is only made once `unscript_toplevel` has walked the rest.
+    fuses = False
+
+    def __init__(
+        self,
+        to_visit: list[type[Node]],
+        pre_visit: list[type[Node]],
+        source: str | mmap,
+        fname: str,
+        symbols: SymbolTable | None = None,
+    ) -> None:
+        super().__init__(to_visit, pre_visit, source, fname, symbols)
+        # The function being walked and how often it calls each other one.
+        self._function: int | None = None
+        self._calls: dict[int, dict[int, int]] = {}
+        # The loops the walk is in, and those of them a `break` leaves.
+        self._loops: list[While] = []
+        self._left: set[int] = set()
+        # The branches and loops control doesn't come out of, by id.
+        self._ending: dict[int, Statement] = {}
+
+    @classmethod
+    def for_program(cls, program: Program) -> "EliminateDeadCode":
+        return cls(
+            to_visit=[Program, Function, Branch, While, Break, Call],
+            pre_visit=[Function, While],
+            source=program.source,
+            fname=program.fname,
+            symbols=program.symbols,
+        )
+
+    def visit_program(self, node: Program) -> Program:
+        called = {self.symbols.intern("main")}
+        todo = list(called)
+        while todo:
+            for callee, count in self._calls.get(todo.pop(), {}).items():
+                if count and callee not in called:
+                    called.add(callee)
+                    todo.append(callee)
+        node.statements = [
+            stmt
+            for stmt in node.statements
+            if not isinstance(stmt, Function) or stmt.sym in called
+        ]
+        return node
+
+    def visit_function(self, node: Function) -> Function:
+        if self._function is None:
+            self._function = node.sym
+            self._calls.setdefault(node.sym, {})
+            return node
+        node.body = self._live(node.body)
+        self._function = None
+        return node
+
+    def visit_call(self, node: Call) -> Call:
+        if self._function is not None:
+            calls = self._calls[self._function]
+            calls[node.sym] = calls.get(node.sym, 0) + 1
+        return node
+
+    def visit_break(self, node: Break) -> Break:
+        if self._loops:
+            self._left.add(id(self._loops[-1]))
+        return node
+
+    def visit_branch(self, node: Branch) -> Branch | list[Statement]:
+        node.body, node.else_ = self._live(node.body), self._live(node.else_)
+        if isinstance(node.condition, Boolean):
+            taken, dropped = node.body, node.else_
+            if node.condition.value == "false":
+                taken, dropped = dropped, taken
+            self._forget(dropped)
+            return _declarations(dropped) + taken
+        if (
+            node.body
+            and node.else_
+            and self._ends(node.body[-1])
+            and self._ends(node.else_[-1])
+        ):
+            self._ending[id(node)] = node
+        return node
+
+    def visit_while(self, node: While) -> While | list[Statement]:
+        if not self._loops or self._loops[-1] is not node:
+            self._loops.append(node)
+            return node
+        self._loops.pop()
+        left = id(node) in self._left
+        self._left.discard(id(node))
+        node.body = self._live(node.body)
+        if isinstance(node.condition, Boolean):
+            if node.condition.value == "false":
+                self._forget(node.body)
+                return _declarations(node.body)
+            if not left:
+                self._ending[id(node)] = node
+        return node
+
+    def _ends(self, stmt: Statement) -> bool:
+        """Whether control never goes on from `stmt` to the next statement."""
+        return isinstance(stmt, (Return, Break)) or self._ending.get(id(stmt)) is stmt
+
+    def _live(self, body: list[Statement]) -> list[Statement]:
+        """`body` up to the first statement control doesn't come out of, and
+        the declarations after it.
+        """
+        for idx, stmt in enumerate(body[:-1]):
+            if self._ends(stmt):
+                dead = body[idx + 1 :]
+                self._forget(dead)
+                return body[: idx + 1] + _declarations(dead)
+        return body
+
+    def _forget(self, statements: list[Statement]) -> None:
+        """Take back the calls made in `statements`, which are dropped."""
+        if self._function is None:
+            return
+        calls = self._calls[self._function]
+        stack: list = list(statements)
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, Node):
+                if isinstance(item, Call):
+                    calls[item.sym] -= 1
+                stack.extend(getattr(item, f.name) for f in fields(item))
+
+
+def eliminate_dead_code(program: Program, mode: MODE = "cow") -> Program:
+    return run_passes(program, [EliminateDeadCode], mode)
+
+
+def _declarations(statements: list[Statement]) -> list[Statement]:
+    """The declarations in `statements`, in nested bodies too, in order."""
+    found: list[Statement] = []
+    stack = list(reversed(statements))
+    while stack:
+        stmt = stack.pop()
+        match stmt:
+            case VariableDecl():
+                found.append(stmt)
+            case Branch():
+                stack.extend(reversed(stmt.else_))
+                stack.extend(reversed(stmt.body))
+            case While():
+                stack.extend(reversed(stmt.body))
+    return found
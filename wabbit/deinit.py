@@ -1,87 +1,63 @@
-from typing import cast
+from mmap import mmap
 
 from wabbit.model import (
     Assignment,
-    BoolVariable,
-    CharName,
-    CharVariable,
-    FloatName,
-    FloatVariable,
-    IntName,
-    IntVariable,
+    Interner,
+    Name,
     Node,
     Program,
+    Statement,
+    Ty,
     Type,
     Variable,
     VariableDecl,
 )
-from wabbit.walker import Visitor, Walker
+from wabbit.symbols import SymbolTable
+from wabbit.walker import MODE, Visitor, run_passes
 
 
 class DeinitVisitor(Visitor):
+    requires = ("folded",)
+    produces = "deinit"
+
     def __init__(
         self,
         to_visit: list[type[Node]],
         pre_visit: list[type[Node]],
-        source: str,
+        source: str | mmap,
         fname: str,
+        symbols: SymbolTable | None = None,
+        interner: Interner | None = None,
     ) -> None:
-        super().__init__(to_visit, pre_visit, source, fname)
-        self._vars = set()
-
-    def visit_intvariable(self, node: Variable) -> list[VariableDecl | Assignment]:
+        super().__init__(to_visit, pre_visit, source, fname, symbols)
+        self.interner = interner
+
+    @classmethod
+    def for_program(cls, program: Program) -> "DeinitVisitor":
+        return cls(
+            to_visit=[Variable],
+            pre_visit=[],
+            source=program.source,
+            fname=program.fname,
+            symbols=program.symbols,
+            interner=program.interner,
+        )
+
+    def visit_variable(self, node: Variable) -> Variable | list[Statement]:
+        if node.expr.ty is Ty.UNKNOWN:
+            return node
+        type_ = Type(value=node.expr.ty.value, loc=node.loc)
+        if self.interner is not None:
+            type_ = self.interner(type_)
         return [
-            VariableDecl(
-                name=node.name, loc=node.loc, type_=Type(value="int", loc=node.loc)
-            ),
-            Assignment(
-                lhs=IntName(value=node.name, loc=node.loc), rhs=node.expr, loc=node.loc
-            ),
-        ]
-
-    def visit_floatvariable(self, node: Variable) -> list[VariableDecl | Assignment]:
-        return [
-            VariableDecl(
-                name=node.name, loc=node.loc, type_=Type(value="float", loc=node.loc)
-            ),
-            Assignment(
-                lhs=FloatName(value=node.name, loc=node.loc),
-                rhs=node.expr,
-                loc=node.loc,
-            ),
-        ]
-
-    def visit_charvariable(self, node: Variable) -> list[VariableDecl | Assignment]:
-        return [
-            VariableDecl(
-                name=node.name, loc=node.loc, type_=Type(value="char", loc=node.loc)
-            ),
-            Assignment(
-                lhs=CharName(value=node.name, loc=node.loc),
-                rhs=node.expr,
-                loc=node.loc,
-            ),
-        ]
-
-    def visit_boolvariable(self, node: Variable) -> list[VariableDecl | Assignment]:
-        return [
-            VariableDecl(
-                name=node.name, loc=node.loc, type_=Type(value="bool", loc=node.loc)
-            ),
+            VariableDecl(name=node.name, sym=node.sym, loc=node.loc, type_=type_),
             Assignment(
-                lhs=CharName(value=node.name, loc=node.loc),
+                lhs=Name(value=node.name, sym=node.sym, loc=node.loc, ty=node.expr.ty),
                 rhs=node.expr,
                 loc=node.loc,
             ),
         ]
 
 
-def deinit_variables(program: Program) -> Program:
-    visitor = DeinitVisitor(
-        to_visit=[IntVariable, FloatVariable, CharVariable, BoolVariable],
-        pre_visit=[],
-        source=program.source,
-        fname=program.fname,
-    )
-    program = cast(Program, Walker(visitor).traverse(program))
-    return program
+def deinit_variables(program: Program, mode: MODE = "cow") -> Program:
+    return run_passes(program, [DeinitVisitor], mode)
@@ -1,13 +1,21 @@
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
+    from mmap import mmap
+
     from wabbit.model import SourceLoc
-    from wabbit.tokenizer import Token
+    from wabbit.tokenizer import Token, TokenTable
 
 
 class WabbitError:
     def __init__(
-        self, msg: str, fname: str, source: str, lineno: int, start: int, end: int
+        self,
+        msg: str,
+        fname: str,
+        source: "str | mmap",
+        lineno: int,
+        start: int,
+        end: int,
     ) -> None:
         self.lineno = lineno
         self.start = start
@@ -15,8 +23,8 @@ class WabbitError:
         self._msg = msg
         self._err_msg = self._make_err_msg(fname, source)
 
-    def _make_err_msg(self, fname: str, source: str) -> str:
-        line = "  " + source.splitlines()[self.lineno - 1]
+    def _make_err_msg(self, fname: str, source: "str | mmap") -> str:
+        line = "  " + source_line(source, self.lineno)
         point_msg = (
             "  "
             + "".join(" " for _ in range(self.start - 1))
@@ -30,9 +38,18 @@ class WabbitError:
     def __str__(self) -> str:
         return self._err_msg + f"{self.__class__.__name__}: {self._msg}\n"
 
+    def __eq__(self, other: object) -> bool:
+        # Equal when reported the same, so trees holding errors compare.
+        return type(self) is type(other) and str(self) == str(other)
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
 
 class WabbitTypeError(WabbitError):
-    def __init__(self, msg: str, fname: str, source: str, loc: "SourceLoc") -> None:
+    def __init__(
+        self, msg: str, fname: str, source: "str | mmap", loc: "SourceLoc"
+    ) -> None:
         self.lineno = loc.lineno
         self.start = loc.start
         self.end = loc.end
@@ -42,11 +59,37 @@ class WabbitTypeError(WabbitError):
 
 class WabbitSyntaxError(WabbitError):
     @classmethod
-    def from_token(cls, msg: str, fname: str, source: str, token: "Token"):
+    def from_token(
+        cls,
+        msg: str,
+        fname: str,
+        source: "str | mmap",
+        token: "Token | TokenTable",
+        idx: int = 0,
+    ):
+        """Error pointing at `token`, or at entry `idx` if given a `TokenTable`."""
+        from wabbit.tokenizer import TokenTable
+
+        if isinstance(token, TokenTable):
+            lineno = token.linenos[idx]
+            column = token.columns[idx]
+            return WabbitSyntaxError(
+                msg, fname, source, lineno, column, column + token.length(idx)
+            )
         return WabbitSyntaxError(
             msg, fname, source, token.lineno, token.column, token.column + len(token)
         )
 
     @classmethod
-    def from_loc(cls, msg: str, fname: str, source: str, loc: "SourceLoc"):
+    def from_loc(cls, msg: str, fname: str, source: "str | mmap", loc: "SourceLoc"):
         return WabbitSyntaxError(msg, fname, source, loc.lineno, loc.start, loc.end)
+
+
+def source_line(source: "str | mmap", lineno: int) -> str:
+    if isinstance(source, str):
+        return source.splitlines()[lineno - 1]
+    start = 0
+    for _ in range(lineno - 1):
+        start = source.find(b"\n", start) + 1
+    end = source.find(b"\n", start)
+    return source[start : end if end >= 0 else len(source)].decode()
@@ -1,42 +1,310 @@
-from typing import cast
+import math
+import operator
+from collections import Counter
+from dataclasses import replace
+from mmap import mmap
+from typing import Callable, cast
 
-from wabbit.model import BinOp, Integer, Parenthesis, Program, UnaryOp
-from wabbit.walker import Visitor, Walker
+from wabbit.model import (
+    Assignment,
+    BinOp,
+    Boolean,
+    Branch,
+    Char,
+    Expression,
+    Float,
+    Function,
+    Integer,
+    LogicalOp,
+    Name,
+    Negation,
+    Node,
+    Parenthesis,
+    Program,
+    RelationalOp,
+    SourceLoc,
+    Statement,
+    Ty,
+    UnaryOp,
+    Variable,
+    VariableDecl,
+    While,
+)
+from wabbit.symbols import SymbolTable
+from wabbit.walker import MODE, Visitor, run_passes
+
+_I32_MIN = -(1 << 31)
+
+_COMPARE: dict[str, Callable[[object, object], bool]] = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
 
 
 class FoldConstants(Visitor):
-    def visit_binop(self, node: BinOp) -> Integer | BinOp:
-        if node.op not in {"+", "*", "/", "-"}:
-            return node
+    """Computes expressions of literals as the generated code would, with
+    `i32`, `double` and `i1`, and puts in the literal a variable holds where
+    it can't hold anything else. Branches and loops with a known condition
+    are replaced by what runs.
+    """
+
+    requires = ("inlined",)
+    produces = "folded"
+    # `InlineFunctions` puts in new nodes, which a pass sharing its walk doesn't
+    # see into.
+    fuses = False
+
+    def __init__(
+        self,
+        to_visit: list[type[Node]],
+        pre_visit: list[type[Node]],
+        source: str | mmap,
+        fname: str,
+        symbols: SymbolTable | None = None,
+        constants: set[int] | None = None,
+    ) -> None:
+        super().__init__(to_visit, pre_visit, source, fname, symbols)
+        # Symbols of the variables nothing but their one declaration sets.
+        self._constants = constants if constants is not None else set()
+        # The literal each of those holds, by the function declaring it.
+        self._values: dict[int, tuple[Expression, int]] = {}
+        # The function being walked, numbered from 1, or 0 at the top level.
+        self._function = 0
+        self._functions = 0
+        # The branches and loops the walk is in.
+        self._blocks: list[Statement] = []
 
-        lhs_val = None
-        rhs_val = None
-        if isinstance(node.lhs, Integer):
-            lhs_val = node.lhs.value
-        if isinstance(node.lhs, UnaryOp) and isinstance(node.lhs.expr, Integer):
-            lhs_val = -node.lhs.expr.value
+    @classmethod
+    def for_program(cls, program: Program) -> "FoldConstants":
+        return cls(
+            to_visit=[
+                BinOp,
+                RelationalOp,
+                LogicalOp,
+                UnaryOp,
+                Negation,
+                Parenthesis,
+                Name,
+                Variable,
+                Function,
+                Branch,
+                While,
+            ],
+            pre_visit=[Function, Branch, While],
+            source=program.source,
+            fname=program.fname,
+            symbols=program.symbols,
+            constants=_declared_once(program.statements),
+        )
 
-        if isinstance(node.rhs, UnaryOp) and isinstance(node.rhs.expr, Integer):
-            rhs_val = -node.rhs.expr.value
-        if isinstance(node.rhs, Integer):
-            rhs_val = node.rhs.value
+    def visit_function(self, node: Function) -> Function:
+        if self._function:
+            self._function = 0
+        else:
+            self._functions += 1
+            self._function = self._functions
+        return node
 
-        if lhs_val is not None and rhs_val is not None:
-            return Integer(value=eval(f"{lhs_val} {node.op} {rhs_val}"), loc=node.loc)
+    def visit_branch(self, node: Branch) -> Branch | list[Statement]:
+        if self._enter_or_leave(node) or not isinstance(node.condition, Boolean):
+            return node
+        taken, dropped = node.body, node.else_
+        if node.condition.value == "false":
+            taken, dropped = dropped, taken
+        # Variables are seen by the rest of the function, keep where they're declared.
+        if _declares(dropped):
+            return node
+        return taken
+
+    def visit_while(self, node: While) -> While | list[Statement]:
+        if self._enter_or_leave(node) or not isinstance(node.condition, Boolean):
+            return node
+        if node.condition.value == "false" and not _declares(node.body):
+            return []
         return node
 
-    def visit_parenthesis(self, node: Parenthesis) -> Integer | Parenthesis:
-        if isinstance(node.expr, Integer):
-            return Integer(value=node.expr.value, loc=node.loc)
+    def visit_variable(self, node: Variable) -> Variable:
+        # Only a declaration every later statement runs after holds for them.
+        if (
+            not self._blocks
+            and node.sym in self._constants
+            and isinstance(node.expr, (Integer, Float, Boolean, Char))
+        ):
+            self._values[node.sym] = (node.expr, self._function)
         return node
 
+    def visit_name(self, node: Name) -> Expression:
+        value = self._values.get(node.sym)
+        if value is None or value[1] != self._function:
+            return node
+        return replace(value[0], loc=node.loc)
+
+    def visit_binop(self, node: BinOp) -> Expression:
+        lhs, rhs = _operand(node.lhs, node.ty), _operand(node.rhs, node.ty)
+        if lhs is None or rhs is None:
+            return node
+        if node.ty is Ty.INT:
+            value = _int_op(node.op, cast(int, lhs), cast(int, rhs))
+        else:
+            value = _float_op(node.op, cast(float, lhs), cast(float, rhs))
+        return _literal(value, node.loc) or node
+
+    def visit_relationalop(self, node: RelationalOp) -> Expression:
+        # The type is the one of the operands.
+        lhs, rhs = _operand(node.lhs, node.ty), _operand(node.rhs, node.ty)
+        if lhs is None or rhs is None:
+            return node
+        if node.ty is Ty.BOOL:
+            # `icmp` compares `i1` signed, true is -1.
+            lhs, rhs = -cast(bool, lhs), -cast(bool, rhs)
+        return _literal(_COMPARE[node.op](lhs, rhs), node.loc) or node
+
+    def visit_logicalop(self, node: LogicalOp) -> Expression:
+        lhs, rhs = _operand(node.lhs, Ty.BOOL), _operand(node.rhs, Ty.BOOL)
+        if lhs is None or rhs is None:
+            return node
+        value = (lhs and rhs) if node.op == "and" else (lhs or rhs)
+        return _literal(bool(value), node.loc) or node
+
+    def visit_negation(self, node: Negation) -> Expression:
+        value = _operand(node.expr, Ty.BOOL)
+        if value is None:
+            return node
+        return _literal(not value, node.loc) or node
+
+    def visit_unaryop(self, node: UnaryOp) -> Expression:
+        value = _operand(node.expr, node.ty)
+        if value is None:
+            return node
+        if node.ty is Ty.INT:
+            return _literal(_wrap(-cast(int, value)), node.loc) or node
+        # `fsub double 0.0, x`, which is 0.0 rather than -0.0 for 0.0.
+        return _literal(0.0 - cast(float, value), node.loc) or node
+
+    def visit_parenthesis(self, node: Parenthesis) -> Expression:
+        if isinstance(node.expr, (Integer, Float, Boolean)):
+            return replace(node.expr, loc=node.loc)
+        return node
+
+    def _enter_or_leave(self, node: Statement) -> bool:
+        """Whether the walk is entering rather than leaving `node`, a branch or
+        loop visited both before and after its children.
+        """
+        if self._blocks and self._blocks[-1] is node:
+            self._blocks.pop()
+            return False
+        self._blocks.append(node)
+        return True
+
+
+def fold_constants(program: Program, mode: MODE = "cow") -> Program:
+    return run_passes(program, [FoldConstants], mode)
+
+
+def _operand(node: Expression, ty: Ty) -> int | float | bool | None:
+    """The value of `node` if it's a literal of type `ty`."""
+    match node:
+        case Integer() if ty is Ty.INT:
+            return _wrap(node.value)
+        case Float() if ty is Ty.FLOAT:
+            return float(node.value)
+        case Boolean() if ty is Ty.BOOL:
+            return node.value == "true"
+    return None
+
+
+def _literal(value: int | float | bool | None, loc: SourceLoc) -> Expression | None:
+    """`value` as a literal, if it can be written as one."""
+    match value:
+        case None:
+            return None
+        case bool():
+            return Boolean(value="true" if value else "false", loc=loc)
+        case int():
+            return Integer(value=value, loc=loc)
+    text = repr(value)
+    # Wabbit has no exponents, infinities or NaN.
+    if not math.isfinite(value) or "e" in text:
+        return None
+    return Float(value=text, loc=loc)
+
+
+def _wrap(value: int) -> int:
+    """`value` as an `i32` holds it."""
+    return (value - _I32_MIN) % (1 << 32) + _I32_MIN
+
+
+def _int_op(op: str, lhs: int, rhs: int) -> int | None:
+    match op:
+        case "+":
+            return _wrap(lhs + rhs)
+        case "-":
+            return _wrap(lhs - rhs)
+        case "*":
+            return _wrap(lhs * rhs)
+    # `sdiv` is undefined for these, leave them to it.
+    if rhs == 0 or (lhs == _I32_MIN and rhs == -1):
+        return None
+    # `sdiv` rounds toward zero.
+    quotient = abs(lhs) // abs(rhs)
+    return quotient if (lhs < 0) == (rhs < 0) else -quotient
+
+
+def _float_op(op: str, lhs: float, rhs: float) -> float | None:
+    match op:
+        case "+":
+            return lhs + rhs
+        case "-":
+            return lhs - rhs
+        case "*":
+            return lhs * rhs
+    # Infinity or NaN, neither can be written as a literal.
+    if rhs == 0.0:
+        return None
+    return lhs / rhs
+
+
+def _declared_once(statements: list[Statement]) -> set[int]:
+    """The symbols of variables declared once with a value and never set after."""
+    declared: Counter[int] = Counter()
+    others: set[int] = set()
+    stack = list(statements)
+    while stack:
+        stmt = stack.pop()
+        match stmt:
+            case Variable():
+                declared[stmt.sym] += 1
+            case VariableDecl():
+                others.add(stmt.sym)
+            case Assignment():
+                others.add(stmt.lhs.sym)
+            case Function():
+                others.add(stmt.sym)
+                others.update(arg.sym for arg in stmt.args)
+                stack.extend(stmt.body)
+            case Branch():
+                stack.extend(stmt.body)
+                stack.extend(stmt.else_)
+            case While():
+                stack.extend(stmt.body)
+    return {sym for sym, count in declared.items() if count == 1} - others - {-1}
+
 
-def fold_constants(program: Program) -> Program:
-    visitor = FoldConstants(
-        to_visit=[BinOp, Parenthesis],
-        pre_visit=[],
-        source=program.source,
-        fname=program.fname,
-    )
-    walker = Walker(visitor)
-    return cast(Program, walker.traverse(program))
+def _declares(statements: list[Statement]) -> bool:
+    """Whether `statements` declare a variable, in nested bodies too."""
+    stack = list(statements)
+    while stack:
+        stmt = stack.pop()
+        match stmt:
+            case Variable() | VariableDecl():
+                return True
+            case Branch():
+                stack.extend(stmt.body)
+                stack.extend(stmt.else_)
+            case While():
+                stack.extend(stmt.body)
+    return False
@@ -5,6 +5,7 @@ from wabbit.model import (
     Branch,
     Break,
     Call,
+    Char,
     ExprAsStatement,
     Expression,
     Float,
@@ -39,50 +40,87 @@ def format_program(program: Program) -> str:
     return "\n".join(lines)
 
 
+# Actions on the work list of `fmt_stmt`.
+_STMT, _LINE, _INDENT, _DEDENT = range(4)
+
+
 def fmt_expr(node: Expression) -> str:
-    match node:
-        case LocalName():
-            return f"local[{node.value}]"
+    """Format `node` with an explicit stack, joining the pieces once at the end."""
+    pieces: list[str] = []
+    stack: list[Expression | str] = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            pieces.append(node)
+            continue
+        match node:
+            case LocalName():
+                pieces.append(f"local[{node.value}]")
 
-        case GlobalName():
-            return f"global[{node.value}]"
+            case GlobalName():
+                pieces.append(f"global[{node.value}]")
 
-        case FunctionArg():
-            return f"{node.value} {node.type_.value}"
+            case FunctionArg():
+                pieces.append(f"{node.value} {node.type_.value}")
 
-        case Name():
-            return node.value
+            case Name():
+                pieces.append(node.value)
 
-        case Integer():
-            return str(node.value)
+            case Integer():
+                pieces.append(str(node.value))
 
-        case Float():
-            return str(node.value)
+            case Float():
+                pieces.append(str(node.value))
 
-        case BinOp() | RelationalOp() | LogicalOp():
-            return f"{fmt_expr(node.lhs)} {node.op} {fmt_expr(node.rhs)}"
+            case Char():
+                pieces.append(f"'{node.value}'")
 
-        case UnaryOp():
-            return f"{node.op}{fmt_expr(node.expr)}"
+            case BinOp() | RelationalOp() | LogicalOp():
+                stack.extend((node.rhs, f" {node.op} ", node.lhs))
 
-        case Parenthesis():
-            return f"({fmt_expr(node.expr)})"
+            case UnaryOp():
+                pieces.append(node.op)
+                stack.append(node.expr)
 
-        case Call():
-            formatted_args = ", ".join(fmt_expr(arg) for arg in node.args)
-            return f"{node.name}({formatted_args})"
+            case Parenthesis():
+                pieces.append("(")
+                stack.extend((")", node.expr))
 
-        case Boolean():
-            return node.value
+            case Call():
+                pieces.append(f"{node.name}(")
+                stack.append(")")
+                for idx, arg in enumerate(reversed(node.args)):
+                    if idx:
+                        stack.append(", ")
+                    stack.append(arg)
 
-        case Negation():
-            return f"{node.op} {fmt_expr(node.expr)}"
+            case Boolean():
+                pieces.append(node.value)
 
-        case _:
-            raise ValueError(f"Unexpected expression: {node}")
+            case Negation():
+                pieces.append(f"{node.op} ")
+                stack.append(node.expr)
+
+            case _:
+                raise ValueError(f"Unexpected expression: {node}")
+    return "".join(pieces)
 
 
 def fmt_stmt(node: Statement, lines: Lines) -> None:
+    work: list[tuple[int, object]] = [(_STMT, node)]
+    while work:
+        action, arg = work.pop()
+        if action == _LINE:
+            lines.append(arg)
+        elif action == _INDENT:
+            lines.push_indent()
+        elif action == _DEDENT:
+            lines.pop_indent()
+        else:
+            _fmt_stmt(arg, lines, work)
+
+
+def _fmt_stmt(node: Statement, lines: Lines, work: list[tuple[int, object]]) -> None:
     match node:
         case Assignment():
             lines.append(f"{fmt_expr(node.lhs)} = {fmt_expr(node.rhs)};")
@@ -104,28 +142,25 @@ def fmt_stmt(node: Statement, lines: Lines) -> None:
 
         case While():
             lines.append(f"while {fmt_expr(node.condition)} {{")
-            with lines.indent():
-                any(fmt_stmt(stmt, lines) for stmt in node.body)
-            lines.append("}")
+            lines.push_indent()
+            work.extend(((_LINE, "}"), (_DEDENT, None)))
+            work.extend((_STMT, stmt) for stmt in reversed(node.body))
 
         case Branch():
             lines.append(f"if {fmt_expr(node.condition)} {{")
-            with lines.indent():
-                any(fmt_stmt(stmt, lines) for stmt in node.body)
-
+            lines.push_indent()
+            work.extend(((_LINE, "}"), (_DEDENT, None)))
             if node.else_:
-                lines.append("} else {")
-                with lines.indent():
-                    any(fmt_stmt(stmt, lines) for stmt in node.else_)
-
-            lines.append("}")
+                work.extend((_STMT, stmt) for stmt in reversed(node.else_))
+                work.extend(((_INDENT, None), (_LINE, "} else {"), (_DEDENT, None)))
+            work.extend((_STMT, stmt) for stmt in reversed(node.body))
 
         case Function():
             formatted_args = ", ".join(fmt_expr(arg) for arg in node.args)
             lines.append(f"func {node.name}({formatted_args}) {node.ret_type_.value}{{")
-            with lines.indent():
-                any(fmt_stmt(stmt, lines) for stmt in node.body)
-            lines.append("}")
+            lines.push_indent()
+            work.extend(((_LINE, "}"), (_DEDENT, None)))
+            work.extend((_STMT, stmt) for stmt in reversed(node.body))
 
         case Return():
             lines.append(f"return {fmt_expr(node.expr)};")
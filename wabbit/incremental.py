@@ -0,0 +1,297 @@
+import re
+from array import array
+from bisect import bisect_left
+from copy import copy
+from dataclasses import fields
+from hashlib import blake2b
+
+from wabbit.exceptions import WabbitSyntaxError
+from wabbit.model import (
+    Branch,
+    ErrorExpr,
+    ExprAsStatement,
+    Node,
+    Program,
+    SourceLoc,
+    Statement,
+)
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import (
+    LBRACE,
+    LPAREN,
+    RBRACE,
+    RPAREN,
+    TokenTable,
+    lex_chunk,
+    statement_spans,
+    tokenize_table,
+)
+from wabbit.utils import gc_paused
+
+_BRACES = re.compile(b"[" + re.escape(bytes([LPAREN, RPAREN, LBRACE, RBRACE])) + b"]")
+
+
+def retokenize(
+    table: TokenTable,
+    offset: int,
+    deleted: int,
+    inserted: str,
+    fname: str = "file.wb",
+) -> TokenTable:
+    """Apply an edit to the source of `table` and lex only what it affects.
+
+    `deleted` characters at `offset` are replaced by `inserted`. Lexing restarts
+    at the last token that ends before the edit and stops as soon as a token
+    after it lines up with one of the old tokens, the rest are copied over with
+    their positions shifted. The result is the same as `tokenize_table` on the
+    edited source.
+    """
+    old = table.source
+    source = old[:offset] + inserted + old[offset + deleted :]
+    delta = len(inserted) - deleted
+    edit_end = offset + len(inserted)
+
+    # Tokens ending in front of the edit can't have looked at it.
+    keep = bisect_left(table.ends, offset)
+    if keep:
+        restart = table.ends[keep - 1]
+        lineno = table.linenos[keep - 1]
+        last_line_pos = table.starts[keep - 1] - table.columns[keep - 1]
+    else:
+        restart, lineno, last_line_pos = 0, 1, 0
+
+    # Lex whole lines past the edit, twice as many each time nothing lines up.
+    size = max(edit_end - restart, 1)
+    while True:
+        stop = source.find("\n", restart + size) + 1 or len(source)
+        if stop < edit_end:
+            stop = source.find("\n", edit_end) + 1 or len(source)
+        errors: list[WabbitSyntaxError] = []
+        window, *_ = lex_chunk(
+            source[restart:stop],
+            fname,
+            source,
+            errors,
+            restart,
+            lineno,
+            last_line_pos,
+            partial=stop < len(source),
+            symbols=table.symbols,
+        )
+        synced = _sync(table, window, restart, edit_end, delta)
+        if synced or stop == len(source):
+            break
+        size *= 2
+
+    if errors:
+        for err in errors:
+            print(err)
+        exit()
+
+    used, resume = synced if synced else (len(window), len(table))
+    new = TokenTable(source, table.symbols)
+    new.types = table.types[:keep] + window.types[:used] + table.types[resume:]
+    new.starts = (
+        table.starts[:keep]
+        + _shifted(window.starts[:used], restart)
+        + _shifted(table.starts[resume:], delta)
+    )
+    new.ends = (
+        table.ends[:keep]
+        + _shifted(window.ends[:used], restart)
+        + _shifted(table.ends[resume:], delta)
+    )
+    line_delta = 0
+    if used < len(window):
+        line_delta = window.linenos[used] - table.linenos[resume]
+    new.linenos = (
+        table.linenos[:keep]
+        + window.linenos[:used]
+        + _shifted(table.linenos[resume:], line_delta)
+    )
+    new.columns = table.columns[:keep] + window.columns[:used] + table.columns[resume:]
+    new.syms = table.syms[:keep] + window.syms[:used] + table.syms[resume:]
+    # Pairs can span the edit, so pair up the braces again. Only the brace
+    # tokens themselves are visited.
+    new.partners = array("i", [-1]) * len(new.types)
+    pair = new.braces.pair
+    for match in _BRACES.finditer(new.types.tobytes()):
+        pair(new, match.start())
+    return new
+
+
+def _sync(
+    table: TokenTable, window: TokenTable, restart: int, edit_end: int, delta: int
+) -> tuple[int, int] | None:
+    """The first token of `window` past the edit that starts an old token too.
+
+    From there on both sources are the same text, so if the column matches the
+    lexer is in the same state and the old tokens can be reused. Returns the
+    index of the token in `window` and of the matching one in `table`.
+    """
+    starts = table.starts
+    for idx in range(bisect_left(window.starts, edit_end - restart), len(window)):
+        start = window.starts[idx] + restart - delta
+        old_idx = bisect_left(starts, start)
+        if (
+            old_idx < len(starts)
+            and starts[old_idx] == start
+            and table.columns[old_idx] == window.columns[idx]
+        ):
+            return idx, old_idx
+    return None
+
+
+def _shifted(values: array, by: int) -> array:
+    if not by:
+        return values
+    return array(values.typecode, map(by.__add__, values))
+
+
+def reparse(
+    previous: Program, source: str, tokens: TokenTable | None = None
+) -> Program:
+    """Parse `source`, an edited `previous.source`, reusing unchanged statements.
+
+    Top-level statements are told apart by a hash of the text of their tokens,
+    split up by `statement_spans`. Statements found in `previous` are reused,
+    moved to their new line, and only the runs of spans in between are parsed.
+    `tokens`, e.g. from `retokenize`, must be interned in `previous.symbols`.
+    The result is the same as `PredictiveParser(tokens, source).parse()`.
+    """
+    with gc_paused():
+        return _reparse(previous, source, tokens)
+
+
+def _reparse(previous: Program, source: str, tokens: TokenTable | None) -> Program:
+    fname = previous.fname
+    if tokens is None:
+        tokens = tokenize_table(source, fname, previous.symbols)
+    old = {
+        key: (lineno, stmt)
+        for (key, lineno), stmt in zip(_previous_spans(previous), previous.statements)
+    }
+
+    spans = [
+        (start, end, _span_key(tokens, start, end))
+        for start, end in statement_spans(tokens)
+    ]
+    reused: list[Statement | None] = []
+    for start, _, key in spans:
+        stmt = None
+        if found := old.get(key):
+            lineno, stmt = found
+            stmt = _moved(stmt, tokens.linenos[start] - lineno)
+        reused.append(stmt)
+
+    statements: list[Statement] = []
+    keys: list[tuple[bytes, int]] = []
+    idx = 0
+    while idx < len(spans):
+        stmt = reused[idx]
+        if stmt is not None:
+            statements.append(stmt)
+            keys.append((spans[idx][2], tokens.linenos[spans[idx][0]]))
+            idx += 1
+            continue
+        run = idx
+        while idx < len(spans) and reused[idx] is None:
+            idx += 1
+        first = spans[run][0]
+        batch = tokens.slice(first, spans[idx - 1][1])
+        parser = PredictiveParser(batch, source, fname)
+        try:
+            parsed = parser.parse().statements
+        except ValueError:
+            parsed = None
+        if parsed is None or parser.idx < len(batch) or len(parsed) != idx - run:
+            # Stops or fails somewhere in here, the way it does is only certain
+            # when parsing on to the end.
+            parser = PredictiveParser(tokens, source, fname)
+            parser.idx = first
+            parsed = parser.parse().statements
+            statements.extend(parsed)
+            idx = run + len(parsed) - 1
+            keys.extend(
+                (key, tokens.linenos[start]) for start, _, key in spans[run:idx]
+            )
+            break
+        statements.extend(parsed)
+        keys.extend((key, tokens.linenos[start]) for start, _, key in spans[run:idx])
+
+    return Program(
+        statements=statements,
+        loc=SourceLoc(lineno=0, start=0, end=len(source)),
+        source=source,
+        fname=fname,
+        symbols=tokens.symbols,
+        spans=keys,
+    )
+
+
+def _previous_spans(previous: Program) -> list[tuple[bytes, int]]:
+    """`previous.spans`, found by lexing `previous.source` again if it has none."""
+    if previous.spans or not previous.statements:
+        return previous.spans
+    source = previous.source
+    if not isinstance(source, str):
+        source = source[:].decode()
+    tokens = tokenize_table(source, previous.fname, previous.symbols)
+    spans = [
+        (_span_key(tokens, start, end), tokens.linenos[start])
+        for start, end in statement_spans(tokens)
+    ]
+    # The last statement might not have taken up its whole span, e.g. if the
+    # span goes on with an `else` that didn't parse.
+    return spans[: len(previous.statements) - 1]
+
+
+def _span_key(tokens: TokenTable, start: int, end: int) -> bytes:
+    # Columns of the first line depend on where the span starts.
+    text = tokens.source[tokens.starts[start] : tokens.ends[end - 1]]
+    key = f"{tokens.columns[start]}:{text}".encode()
+    return blake2b(key, digest_size=16).digest()
+
+
+def _moved(stmt: Statement, lines: int) -> Statement | None:
+    """A copy of `stmt` moved down by `lines`, `None` if it holds an error.
+
+    Errors quote their line, they are parsed again instead.
+    """
+    if not lines:
+        return stmt
+    moved = copy(stmt)
+    stack: list[Node] = [moved]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ErrorExpr):
+            return None
+        loc = node.loc
+        if isinstance(node, Branch):
+            # `Branch` has its line as its start, `ExprAsStatement` its column
+            # as its line. Neither the parser's doing to fix here.
+            node.loc = SourceLoc(loc.lineno + lines, loc.start + lines, loc.end)
+        elif not isinstance(node, ExprAsStatement):
+            node.loc = SourceLoc(loc.lineno + lines, loc.start, loc.end)
+        for name in _field_names(type(node)):
+            value = getattr(node, name)
+            if isinstance(value, Node):
+                value = copy(value)
+                stack.append(value)
+                setattr(node, name, value)
+            elif isinstance(value, list):
+                value = [copy(item) for item in value]
+                stack.extend(value)
+                setattr(node, name, value)
+    return moved
+
+
+_FIELD_NAMES: dict[type[Node], tuple[str, ...]] = {}
+
+
+def _field_names(node_type: type[Node]) -> tuple[str, ...]:
+    names = _FIELD_NAMES.get(node_type)
+    if names is None:
+        names = tuple(f.name for f in fields(node_type) if f.name != "loc")
+        _FIELD_NAMES[node_type] = names
+    return names
@@ -0,0 +1,636 @@
+from dataclasses import dataclass, field, fields, replace
+from mmap import mmap
+
+from wabbit.model import (
+    Assignment,
+    Boolean,
+    Branch,
+    Break,
+    Call,
+    Char,
+    ErrorExpr,
+    ExprAsStatement,
+    Expression,
+    Float,
+    Function,
+    Integer,
+    LogicalOp,
+    Name,
+    Node,
+    Parenthesis,
+    Print,
+    Program,
+    Return,
+    SourceLoc,
+    Statement,
+    Ty,
+    Type,
+    Variable,
+    VariableDecl,
+    While,
+)
+from wabbit.symbols import SymbolTable
+from wabbit.walker import MODE, Visitor, Walker, copy_node
+
+# The most nodes the body of a function put in place of its calls can have.
+THRESHOLD = 40
+
+_LITERALS = (Integer, Float, Boolean, Char)
+
+
+@dataclass
+class _Callee:
+    function: Function
+    # The parameters its body sets, their arguments can't be put in for them.
+    assigned: set[int]
+    # The names it reads without declaring them, globals.
+    free: set[int]
+    # What it returns, if that is all its body does and it calls nothing.
+    expr: Expression | None
+
+
+@dataclass
+class _Scope:
+    """A function or the top level, which calls are inlined into."""
+
+    function: Function | None
+    # The names it declares, which no function it calls can set.
+    names: set[int]
+    # Declarations moved to its start, out of the loops they'd run again in.
+    lifted: list[Statement] = field(default_factory=list)
+    loops: int = 0
+
+
+@dataclass
+class _Site:
+    """A statement whose expressions are being walked."""
+
+    node: Statement
+    # Whether statements can run before it, not so for the condition of a loop.
+    hoist: bool
+    # The statements to run before it.
+    pending: list[Statement] = field(default_factory=list)
+    # Whether what was evaluated so far can't change or be changed by the
+    # statements run before it.
+    clean: bool = True
+    # The calls being walked, with `clean` from before their arguments.
+    calls: list[tuple[Call, bool]] = field(default_factory=list)
+    # Whether the next name walked is the one an assignment sets.
+    target: bool = False
+
+
+class InlineFunctions(Visitor):
+    """Puts the body of small functions in place of their calls.
+
+    A function is inlined when its body has at most `threshold` nodes and it
+    can't call itself, through other functions or not. One that only returns
+    an expression is substituted into the call, which works anywhere. Other
+    bodies run just before the statement with the call, their `return`s
+    leaving a loop run once, and the call becomes their result. That is only
+    done where nothing the statement evaluates before the call could see the
+    difference, and not in loop conditions or `and`/`or`.
+
+    Parameters and the variables the body declares get names of their own,
+    with a `.` no name in the source has. An argument that is a literal or a
+    variable of the caller is put in for a parameter the body doesn't set.
+    """
+
+    requires = ("checked",)
+    produces = "inlined"
+    # Calls are only replaced in a tree free of type errors.
+    fuses = False
+
+    def __init__(
+        self,
+        to_visit: list[type[Node]],
+        pre_visit: list[type[Node]],
+        source: str | mmap,
+        fname: str,
+        symbols: SymbolTable | None = None,
+        threshold: int = THRESHOLD,
+        recursive: set[int] | None = None,
+    ) -> None:
+        super().__init__(to_visit, pre_visit, source, fname, symbols)
+        self._threshold = threshold
+        self._recursive = recursive if recursive is not None else set()
+        # The functions that can be inlined, once their own calls are.
+        self._callees: dict[int, _Callee] = {}
+        self._scopes = [_Scope(None, set())]
+        self._sites: list[_Site] = []
+        self._lazy: list[LogicalOp] = []
+        # Symbols from this one on are of names made here.
+        self._first_fresh = len(self.symbols)
+        self._inlined = 0
+
+    @classmethod
+    def for_program(
+        cls, program: Program, threshold: int = THRESHOLD
+    ) -> "InlineFunctions":
+        graph = _call_graph(program.statements)
+        recursive = _recursive({sym: calls for sym, (calls, _) in graph.items()})
+        sites = [Print, Assignment, Variable, ExprAsStatement, Return, Branch, While]
+        to_visit = [Program, Function, *sites, LogicalOp, Call, Name]
+        pre_visit = [Function, *sites, LogicalOp, Call]
+        # Inlining never makes a body smaller, don't walk a tree with nothing to do.
+        if not any(
+            cost <= threshold and sym not in recursive
+            for sym, (_, cost) in graph.items()
+        ):
+            to_visit, pre_visit = [], []
+        return cls(
+            to_visit=to_visit,
+            pre_visit=pre_visit,
+            source=program.source,
+            fname=program.fname,
+            symbols=program.symbols,
+            threshold=threshold,
+            recursive=recursive,
+        )
+
+    def visit_program(self, node: Program) -> Program:
+        node.statements = [*self._scopes[0].lifted, *node.statements]
+        return node
+
+    def visit_function(self, node: Function) -> Function:
+        scope = self._scopes[-1]
+        if scope.function is not node:
+            names = {arg.sym for arg in node.args} | _declared(node.body)
+            self._scopes.append(_Scope(node, names))
+            return node
+        self._scopes.pop()
+        node.body = [*scope.lifted, *node.body]
+        callee = self._callee(node)
+        if callee is not None:
+            self._callees[node.sym] = callee
+        return node
+
+    def visit_print(self, node: Print) -> Statement | list[Statement]:
+        return self._site(node)
+
+    def visit_assignment(self, node: Assignment) -> Statement | list[Statement]:
+        return self._site(node)
+
+    def visit_variable(self, node: Variable) -> Statement | list[Statement]:
+        return self._site(node)
+
+    def visit_exprasstatement(
+        self, node: ExprAsStatement
+    ) -> Statement | list[Statement]:
+        return self._site(node)
+
+    def visit_return(self, node: Return) -> Statement | list[Statement]:
+        return self._site(node)
+
+    def visit_branch(self, node: Branch) -> Statement | list[Statement]:
+        return self._site(node)
+
+    def visit_while(self, node: While) -> Statement | list[Statement]:
+        # The condition runs again each time around, nothing can run before it.
+        scope = self._scopes[-1]
+        if not self._sites or self._sites[-1].node is not node:
+            scope.loops += 1
+        else:
+            scope.loops -= 1
+        return self._site(node, hoist=False)
+
+    def visit_logicalop(self, node: LogicalOp) -> LogicalOp:
+        if self._lazy and self._lazy[-1] is node:
+            self._lazy.pop()
+        else:
+            self._lazy.append(node)
+        return node
+
+    def visit_name(self, node: Name) -> Name:
+        site = self._sites[-1] if self._sites else None
+        if site is None:
+            return node
+        if site.target:
+            site.target = False
+        elif not self._local(node.sym):
+            site.clean = False
+        return node
+
+    def visit_call(self, node: Call) -> Expression:
+        site = self._sites[-1] if self._sites else None
+        if site is None:
+            return node
+        if not site.calls or site.calls[-1][0] is not node:
+            site.calls.append((node, site.clean))
+            return node
+        _, clean = site.calls.pop()
+        callee = self._callees.get(node.sym)
+        if callee is None or callee.free & self._scopes[-1].names:
+            site.clean = False
+            return node
+        if callee.expr is not None and all(
+            isinstance(arg, _LITERALS) or type(arg) is Name for arg in node.args
+        ):
+            expr = self._substitute(callee, node.args)
+            if callee.free:
+                site.clean = False
+            return expr
+        if not (site.hoist and clean and not self._lazy):
+            site.clean = False
+            return node
+        site.clean = clean
+        return self._inline(callee, node, site)
+
+    def _site(self, node: Statement, hoist: bool = True) -> Statement | list[Statement]:
+        """Start walking the expressions of `node`, or once they are walked,
+        `node` with the statements to run before it.
+        """
+        if not self._sites or self._sites[-1].node is not node:
+            self._sites.append(_Site(node, hoist, target=isinstance(node, Assignment)))
+            return node
+        site = self._sites.pop()
+        return [*site.pending, node] if site.pending else node
+
+    def _local(self, sym: int) -> bool:
+        """Whether no function called can set the variable `sym`."""
+        return sym >= self._first_fresh or sym in self._scopes[-1].names
+
+    def _callee(self, node: Function) -> _Callee | None:
+        if node.sym in self._recursive:
+            return None
+        cost = 0
+        names: set[int] = set()
+        assigned: set[int] = set()
+        calls = False
+        stack: list = list(node.body)
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+                continue
+            if not isinstance(item, Node):
+                continue
+            cost += 1
+            match item:
+                case Function() | ErrorExpr():
+                    return None
+                case Call():
+                    calls = True
+                case Assignment():
+                    assigned.add(item.lhs.sym)
+                case Name():
+                    names.add(item.sym)
+            stack.extend(getattr(item, f.name) for f in fields(item))
+        if cost > self._threshold:
+            return None
+        params = {arg.sym for arg in node.args}
+        expr = None
+        if len(node.body) == 1 and isinstance(node.body[0], Return) and not calls:
+            expr = node.body[0].expr
+        return _Callee(
+            function=node,
+            assigned=assigned & params,
+            free=names - params - _declared(node.body),
+            expr=expr,
+        )
+
+    def _substitute(self, callee: _Callee, args: list[Expression]) -> Expression:
+        """What `callee` returns with `args` put in for its parameters."""
+        values = {param.sym: arg for param, arg in zip(callee.function.args, args)}
+        expr = _instantiate([callee.expr], values, {})[0]
+        if isinstance(expr, (*_LITERALS, Name)):
+            return expr
+        return Parenthesis(expr=expr, loc=expr.loc, ty=expr.ty)
+
+    def _inline(self, callee: _Callee, node: Call, site: _Site) -> Expression:
+        """Put the body of `callee` before `site`, the value of what it returns."""
+        self._inlined += 1
+        suffix = f".{self._inlined}"
+        func = callee.function
+        loc = node.loc
+        values: dict[int, Expression] = {}
+        renames: dict[int, tuple[str, int]] = {}
+        for param, arg in zip(func.args, node.args):
+            if param.sym not in callee.assigned and (
+                isinstance(arg, _LITERALS)
+                or (type(arg) is Name and self._local(arg.sym))
+            ):
+                values[param.sym] = arg
+                continue
+            name = self._fresh(param.value + suffix, Ty(param.type_.value), loc)
+            renames[param.sym] = (name.value, name.sym)
+            site.pending.extend(self._declare(name, arg))
+        for sym in _declared(func.body):
+            renames[sym] = self._fresh_name(self.symbols[sym] + suffix)
+        body = _instantiate(func.body, values, renames)
+        if self._scopes[-1].loops:
+            body = self._lift(body)
+
+        returns, in_loops = _returns(body)
+        if not returns:
+            site.pending.extend(body)
+            return _zero(Ty(func.ret_type_.value), loc)
+        if returns == 1 and isinstance(body[-1], Return):
+            expr = body.pop().expr
+            site.pending.extend(body)
+            if self._settled(expr):
+                if isinstance(expr, (*_LITERALS, Name)):
+                    return expr
+                return Parenthesis(expr=expr, loc=expr.loc, ty=expr.ty)
+            result = self._fresh(f"{func.name}.ret{suffix}", expr.ty, loc)
+            site.pending.extend(self._declare(result, expr))
+            return self._use(result)
+
+        # Each `return` sets the result and breaks out of a loop run once, and
+        # out of the loops of the body it's in with `done`.
+        ty = Ty(func.ret_type_.value)
+        result = self._fresh(f"{func.name}.ret{suffix}", ty, loc)
+        site.pending.extend(self._declare(result, _zero(ty, loc)))
+        done = None
+        if in_loops:
+            done = self._fresh(f"{func.name}.done{suffix}", Ty.BOOL, loc)
+            site.pending.extend(self._declare(done, Boolean(value="false", loc=loc)))
+        _exits(body, result, done)
+        site.pending.append(
+            While(
+                condition=Boolean(value="true", loc=loc),
+                body=[*body, Break(loc=loc)],
+                loc=loc,
+            )
+        )
+        return self._use(result)
+
+    def _settled(self, expr: Expression) -> bool:
+        """Whether `expr` has the same value anywhere in the statement, reading
+        only variables no function called sets.
+        """
+        stack: list = [expr]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, Node):
+                if isinstance(item, Call):
+                    return False
+                if type(item) is Name and not self._local(item.sym):
+                    return False
+                stack.extend(getattr(item, f.name) for f in fields(item))
+        return True
+
+    def _fresh_name(self, name: str) -> tuple[str, int]:
+        return name, self.symbols.intern(name)
+
+    def _fresh(self, name: str, ty: Ty, loc: SourceLoc) -> Name:
+        value, sym = self._fresh_name(name)
+        return Name(value=value, sym=sym, loc=loc, ty=ty)
+
+    def _use(self, name: Name) -> Name:
+        return replace(name)
+
+    def _declare(self, name: Name, expr: Expression) -> list[Statement]:
+        """Statements declaring `name` with the value of `expr`, where they run.
+
+        In a loop, the declaration goes to the start of the function instead
+        and they only assign it, each declaration taking more of the stack.
+        """
+        scope = self._scopes[-1]
+        if not scope.loops:
+            return [Variable(name=name.value, expr=expr, sym=name.sym, loc=name.loc)]
+        scope.lifted.append(
+            VariableDecl(
+                name=name.value,
+                type_=Type(value=name.ty.value, loc=name.loc),
+                sym=name.sym,
+                loc=name.loc,
+            )
+        )
+        return [Assignment(lhs=self._use(name), rhs=expr, loc=name.loc)]
+
+    def _lift(self, body: list[Statement]) -> list[Statement]:
+        """`body` with the declarations in it, nested ones too, moved to the
+        start of the function.
+        """
+        lifted = self._scopes[-1].lifted
+        new_body: list[Statement] = []
+        stack: list[tuple[list[Statement], list[Statement]]] = [(body, new_body)]
+        while stack:
+            old, new = stack.pop()
+            for stmt in old:
+                match stmt:
+                    case Variable():
+                        lifted.append(
+                            VariableDecl(
+                                name=stmt.name,
+                                type_=Type(value=stmt.expr.ty.value, loc=stmt.loc),
+                                sym=stmt.sym,
+                                loc=stmt.loc,
+                            )
+                        )
+                        lhs = Name(
+                            value=stmt.name, sym=stmt.sym, loc=stmt.loc, ty=stmt.expr.ty
+                        )
+                        new.append(Assignment(lhs=lhs, rhs=stmt.expr, loc=stmt.loc))
+                        continue
+                    case VariableDecl():
+                        lifted.append(stmt)
+                        continue
+                    case Branch():
+                        body_, else_ = stmt.body, stmt.else_
+                        stmt.body, stmt.else_ = [], []
+                        stack.extend([(body_, stmt.body), (else_, stmt.else_)])
+                    case While():
+                        body_, stmt.body = stmt.body, []
+                        stack.append((body_, stmt.body))
+                new.append(stmt)
+        return new_body
+
+
+def inline_functions(
+    program: Program, mode: MODE = "cow", threshold: int = THRESHOLD
+) -> Program:
+    visitor = InlineFunctions.for_program(program, threshold)
+    program = Walker(visitor, mode).traverse(program)
+    visitor.report_errors()
+    return program
+
+
+def _instantiate(
+    body: list, values: dict[int, Expression], renames: dict[int, tuple[str, int]]
+) -> list:
+    """A copy of `body` with copies of `values` put in for the names of their
+    symbols, and the variables of the symbols of `renames` given those names.
+    """
+    copied = list(body)
+    stack: list = [copied]
+    while stack:
+        item = stack.pop()
+        children = (
+            enumerate(item)
+            if isinstance(item, list)
+            else ((f.name, getattr(item, f.name)) for f in fields(item))
+        )
+        for key, child in children:
+            if type(child) is Name and child.sym in values:
+                new = replace(values[child.sym], loc=child.loc)
+            elif isinstance(child, Node):
+                new = copy_node(child)
+                match new:
+                    case Variable() | VariableDecl() if new.sym in renames:
+                        new.name, new.sym = renames[new.sym]
+                    case Name() if new.sym in renames:
+                        new.value, new.sym = renames[new.sym]
+                stack.append(new)
+            elif isinstance(child, list):
+                new = list(child)
+                stack.append(new)
+            else:
+                continue
+            if isinstance(item, list):
+                item[key] = new
+            else:
+                setattr(item, key, new)
+    return copied
+
+
+def _exits(body: list[Statement], result: Name, done: Name | None) -> None:
+    """Make each `return` in `body` set `result` and break out, in place.
+
+    A `return` in a loop also sets `done`, which the loops around it check.
+    """
+    stack: list[tuple[list[Statement], bool]] = [(body, False)]
+    while stack:
+        statements, in_loop = stack.pop()
+        new: list[Statement] = []
+        for stmt in statements:
+            match stmt:
+                case Return():
+                    new.append(
+                        Assignment(lhs=replace(result), rhs=stmt.expr, loc=stmt.loc)
+                    )
+                    if in_loop and done is not None:
+                        true = Boolean(value="true", loc=stmt.loc)
+                        new.append(
+                            Assignment(lhs=replace(done), rhs=true, loc=stmt.loc)
+                        )
+                    new.append(Break(loc=stmt.loc))
+                    continue
+                case Branch():
+                    stack.extend([(stmt.body, in_loop), (stmt.else_, in_loop)])
+                case While():
+                    stack.append((stmt.body, True))
+                    if done is not None and _returns(stmt.body)[0]:
+                        new.append(stmt)
+                        stmt = Branch(
+                            condition=replace(done),
+                            body=[Break(loc=stmt.loc)],
+                            else_=[],
+                            loc=stmt.loc,
+                        )
+            new.append(stmt)
+        statements[:] = new
+
+
+def _returns(body: list[Statement]) -> tuple[int, bool]:
+    """How many `return`s there are in `body`, and whether any is in a loop."""
+    count, in_loops = 0, False
+    stack: list[tuple[Statement, bool]] = [(stmt, False) for stmt in body]
+    while stack:
+        stmt, in_loop = stack.pop()
+        match stmt:
+            case Return():
+                count += 1
+                in_loops = in_loops or in_loop
+            case Branch():
+                stack.extend((child, in_loop) for child in (*stmt.body, *stmt.else_))
+            case While():
+                stack.extend((child, True) for child in stmt.body)
+    return count, in_loops
+
+
+def _declared(body: list[Statement]) -> set[int]:
+    """The symbols of the variables declared in `body`, in nested bodies too."""
+    found: set[int] = set()
+    stack = list(body)
+    while stack:
+        stmt = stack.pop()
+        match stmt:
+            case Variable() | VariableDecl():
+                found.add(stmt.sym)
+            case Branch():
+                stack.extend(stmt.body)
+                stack.extend(stmt.else_)
+            case While():
+                stack.extend(stmt.body)
+    return found
+
+
+def _zero(ty: Ty, loc: SourceLoc) -> Expression:
+    """What a function returning `ty` returns when it runs off its end."""
+    match ty:
+        case Ty.FLOAT:
+            return Float(value="0.0", loc=loc)
+        case Ty.BOOL:
+            return Boolean(value="false", loc=loc)
+        case Ty.CHAR:
+            return Char(value="\0", loc=loc)
+    return Integer(value=0, loc=loc)
+
+
+def _call_graph(statements: list[Statement]) -> dict[int, tuple[set[int], int]]:
+    """The functions each function in `statements` calls, and the nodes of its body."""
+    graph: dict[int, tuple[set[int], int]] = {}
+    for stmt in statements:
+        if not isinstance(stmt, Function):
+            continue
+        callees: set[int] = set()
+        cost = 0
+        stack: list = list(stmt.body)
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, Node):
+                cost += 1
+                if isinstance(item, Call):
+                    callees.add(item.sym)
+                stack.extend(getattr(item, f.name) for f in fields(item))
+        graph[stmt.sym] = (callees, cost)
+    return graph
+
+
+def _recursive(calls: dict[int, set[int]]) -> set[int]:
+    """The functions that can end up calling themselves, by Tarjan's strongly
+    connected components of the graph of `calls`.
+    """
+    index: dict[int, int] = {}
+    low: dict[int, int] = {}
+    path: list[int] = []
+    on_path: set[int] = set()
+    found: set[int] = set()
+    for root in calls:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        path.append(root)
+        on_path.add(root)
+        work = [(root, iter(calls[root]))]
+        while work:
+            func, callees_left = work[-1]
+            for callee in callees_left:
+                if callee not in calls:
+                    continue
+                if callee not in index:
+                    index[callee] = low[callee] = len(index)
+                    path.append(callee)
+                    on_path.add(callee)
+                    work.append((callee, iter(calls[callee])))
+                    break
+                if callee in on_path:
+                    low[func] = min(low[func], index[callee])
+            else:
+                work.pop()
+                if work:
+                    caller = work[-1][0]
+                    low[caller] = min(low[caller], low[func])
+                if low[func] == index[func]:
+                    component = []
+                    while not component or component[-1] != func:
+                        component.append(path.pop())
+                        on_path.discard(component[-1])
+                    if len(component) > 1 or func in calls[func]:
+                        found.update(component)
+    return found
@@ -1,64 +1,48 @@
-from typing import Literal
-
 from wabbit.model import (
     Assignment,
-    BoolCall,
+    BinOp,
     Boolean,
-    BoolGlobalName,
-    BoolLocalName,
-    BoolPrint,
-    BoolRelOp,
-    BoolTyped,
     Branch,
     Break,
+    Call,
     Char,
-    CharCall,
-    CharGlobalName,
-    CharLocalName,
-    CharPrint,
-    CharTyped,
     ExprAsStatement,
     Expression,
     Float,
-    FloatBinOp,
-    FloatCall,
-    FloatGlobalName,
-    FloatLocalName,
-    FloatPrint,
-    FloatRelOp,
-    FloatTyped,
-    FloatUnaryOp,
     Function,
     GlobalName,
     GlobalVar,
-    IntBinOp,
-    IntCall,
     Integer,
-    IntGlobalName,
-    IntLocalName,
-    IntPrint,
-    IntRelOp,
-    IntTyped,
-    IntUnaryOp,
     LocalName,
     LocalVar,
     LogicalOp,
     Name,
     Negation,
     Parenthesis,
+    Print,
     Program,
+    RelationalOp,
     Return,
     Statement,
+    Ty,
+    UnaryOp,
     While,
 )
+from wabbit.symbols import SymbolTable
 from wabbit.utils import Lines
 
 # Generate a unique name like ".1", ".2", ".3", etc.
 _n = 0
 
+# Names of the program being generated, set by `generate_llvm`.
+_symbols = SymbolTable()
+
 
 types = {"int": "i32", "float": "double", "bool": "i1", "char": "i32"}
 
+# Actions on the work list of `out_stmt`.
+_STMT, _LINE, _LABEL, _INDENT, _DEDENT = range(5)
+
 
 def gensym() -> str:
     global _n
@@ -67,6 +51,8 @@ def gensym() -> str:
 
 
 def generate_llvm(program: Program) -> str:
+    global _symbols
+    _symbols = program.symbols
     lines = Lines()
     lines.append("declare i32 @_print_int(i32 %x)")
     lines.append("declare double @_print_float(double %x)")
@@ -77,39 +63,75 @@ def generate_llvm(program: Program) -> str:
     return "\n".join(lines)
 
 
+def mangle(prefix: str, name: str, sym: int) -> str:
+    if sym < 0:
+        return f"{prefix}{name}"
+    return _symbols.mangled(prefix, sym)
+
+
 def out_name(node: Name) -> str:
     match node:
         case GlobalName():
-            return f"@{node.value}"
+            return mangle("@", node.value, node.sym)
         case LocalName():
-            return f"%{node.value}"
+            return mangle("%", node.value, node.sym)
         case _:
             raise ValueError(f"Unexpected name: {node}")
 
 
 def res_expr(node: Expression, lines: Lines) -> str:
-    literals = {Integer, Name, LocalName, GlobalName}
+    """Emit the instructions computing `node`, returning the value holding it.
+
+    Operands are resolved with an explicit stack, in the same order a recursive
+    walk would, so nesting depth is only limited by memory.
+    """
+    results: list[str] = []
+    stack: list[tuple[Expression, bool]] = [(node, False)]
+    while stack:
+        node, resolved = stack.pop()
+        operands = _operands(node)
+        if resolved or not operands:
+            start = len(results) - len(operands) if resolved else len(results)
+            res = _emit_expr(node, results[start:], lines)
+            del results[start:]
+            results.append(res)
+            continue
+        stack.append((node, True))
+        stack.extend((operand, False) for operand in reversed(operands))
+    return results[0]
+
+
+def _operands(node: Expression) -> list[Expression]:
+    match node:
+        case LogicalOp() | BinOp() | RelationalOp():
+            return [node.lhs, node.rhs]
+
+        case Negation() | UnaryOp() | Parenthesis():
+            return [node.expr]
+
+        case Call():
+            return node.args
+
+        case _:
+            return []
+
+
+def _emit_expr(node: Expression, operands: list[str], lines: Lines) -> str:
     match node:
         case LogicalOp():
-            lhs_res = res_expr(node.lhs, lines)
-            rhs_res = res_expr(node.rhs, lines)
+            lhs_res, rhs_res = operands
             id_ = gensym()
             lines.append(f"%{id_} = {node.op} i1 {lhs_res}, {rhs_res}")
             return f"%{id_}"
 
         case Negation():
-            res = res_expr(node.expr, lines)
+            (res,) = operands
             id_ = gensym()
             lines.append(f"%{id_} = xor i1 1, {res}")
             return f"%{id_}"
 
-        case IntBinOp() | IntRelOp():
-            lhs_res = (
-                res_expr(node.lhs, lines) if type(node) not in literals else node.lhs
-            )
-            rhs_res = (
-                res_expr(node.rhs, lines) if type(node) not in literals else node.rhs
-            )
+        case BinOp() | RelationalOp() if node.ty is Ty.INT:
+            lhs_res, rhs_res = operands
             id_ = gensym()
             match node.op:
                 case "+":
@@ -134,13 +156,8 @@ def res_expr(node: Expression, lines: Lines) -> str:
                     lines.append(f"%{id_} = icmp ne i32 {lhs_res}, {rhs_res}")
             return f"%{id_}"
 
-        case FloatBinOp() | FloatRelOp():
-            lhs_res = (
-                res_expr(node.lhs, lines) if type(node) not in literals else node.lhs
-            )
-            rhs_res = (
-                res_expr(node.rhs, lines) if type(node) not in literals else node.rhs
-            )
+        case BinOp() | RelationalOp() if node.ty is Ty.FLOAT:
+            lhs_res, rhs_res = operands
             id_ = gensym()
             match node.op:
                 case "+":
@@ -165,13 +182,8 @@ def res_expr(node: Expression, lines: Lines) -> str:
                     lines.append(f"%{id_} = fcmp one double {lhs_res}, {rhs_res}")
             return f"%{id_}"
 
-        case BoolRelOp():
-            lhs_res = (
-                res_expr(node.lhs, lines) if type(node) not in literals else node.lhs
-            )
-            rhs_res = (
-                res_expr(node.rhs, lines) if type(node) not in literals else node.rhs
-            )
+        case RelationalOp() if node.ty is Ty.BOOL:
+            lhs_res, rhs_res = operands
             id_ = gensym()
             match node.op:
                 case "<":
@@ -191,79 +203,37 @@ def res_expr(node: Expression, lines: Lines) -> str:
         case Boolean():
             return "1" if node.value == "true" else "0"
 
-        case IntUnaryOp():
-            res = res_expr(node.expr, lines)
+        case UnaryOp() if node.ty is Ty.INT:
+            (res,) = operands
             id_ = gensym()
             lines.append(f"%{id_} = sub i32 0, {res}")
             return f"%{id_}"
 
-        case FloatUnaryOp():
-            res = res_expr(node.expr, lines)
+        case UnaryOp() if node.ty is Ty.FLOAT:
+            (res,) = operands
             id_ = gensym()
             lines.append(f"%{id_} = fsub double 0.0, {res}")
             return f"%{id_}"
 
         case Parenthesis():
-            return res_expr(node.expr, lines)
+            return operands[0]
 
-        case IntCall() | CharCall():
+        case Call():
             args_res = ", ".join(
-                [f"{_type(arg)} {res_expr(arg, lines)}" for arg in node.args]
+                f"{_type(arg)} {res}" for arg, res in zip(node.args, operands)
             )
             arg_types = ", ".join(_type(arg) for arg in node.args)
             id_ = gensym()
 
-            lines.append(f"%{id_} = call i32 ({arg_types}) @{node.name}({args_res})")
+            name = mangle("@", node.name, node.sym)
+            ret_type = _type(node)
+            lines.append(f"%{id_} = call {ret_type} ({arg_types}) {name}({args_res})")
             return f"%{id_}"
 
-        case FloatCall():
-            args_res = ", ".join(
-                [f"{_type(arg)} {res_expr(arg, lines)}" for arg in node.args]
-            )
-            arg_types = ", ".join(_type(arg) for arg in node.args)
+        case LocalName() | GlobalName():
+            type_ = _type(node)
             id_ = gensym()
-
-            lines.append(f"%{id_} = call double ({arg_types}) @{node.name}({args_res})")
-            return f"%{id_}"
-
-        case BoolCall():
-            args_res = ", ".join(
-                [f"{_type(arg)} {res_expr(arg, lines)}" for arg in node.args]
-            )
-            arg_types = ", ".join(_type(arg) for arg in node.args)
-            id_ = gensym()
-
-            lines.append(f"%{id_} = call i1 ({arg_types}) @{node.name}({args_res})")
-            return f"%{id_}"
-
-        case IntLocalName() | CharLocalName():
-            id_ = gensym()
-            lines.append(f"%{id_} = load i32, i32* %{node.value}")
-            return f"%{id_}"
-
-        case FloatLocalName():
-            id_ = gensym()
-            lines.append(f"%{id_} = load double, double* %{node.value}")
-            return f"%{id_}"
-
-        case BoolLocalName():
-            id_ = gensym()
-            lines.append(f"%{id_} = load i1, i1* %{node.value}")
-            return f"%{id_}"
-
-        case IntGlobalName() | CharGlobalName():
-            id_ = gensym()
-            lines.append(f"%{id_} = load i32, i32* @{node.value}")
-            return f"%{id_}"
-
-        case FloatGlobalName():
-            id_ = gensym()
-            lines.append(f"%{id_} = load double, double* @{node.value}")
-            return f"%{id_}"
-
-        case BoolGlobalName():
-            id_ = gensym()
-            lines.append(f"%{id_} = load i1, i1* @{node.value}")
+            lines.append(f"%{id_} = load {type_}, {type_}* {out_name(node)}")
             return f"%{id_}"
 
         case Integer():
@@ -280,70 +250,69 @@ def res_expr(node: Expression, lines: Lines) -> str:
 
 
 def out_stmt(node: Statement, lines: Lines, break_to: str | None = None) -> None:
+    """Emit `node`. Nested bodies are queued on a work list rather than recursed into."""
+    work: list[tuple[int, object]] = [(_STMT, (node, break_to))]
+    while work:
+        action, arg = work.pop()
+        if action == _STMT:
+            _out_stmt(*arg, lines, work)
+        elif action == _LINE:
+            lines.append(arg)
+        elif action == _LABEL:
+            lines.extend([arg])
+        elif action == _INDENT:
+            lines.push_indent()
+        else:
+            lines.pop_indent()
+
+
+def _out_stmt(
+    node: Statement, break_to: str | None, lines: Lines, work: list[tuple[int, object]]
+) -> None:
     match node:
         case Assignment():
             res_rhs = res_expr(node.rhs, lines)
-            if isinstance(node.rhs, (IntTyped, CharTyped)):
-                lines.append(f"store i32 {res_rhs}, i32* {out_name(node.lhs)}")
-                return
-
-            elif isinstance(node.rhs, BoolTyped):
-                lines.append(f"store i1 {res_rhs}, i1* {out_name(node.lhs)}")
-                return
-
-            elif isinstance(node.rhs, FloatTyped):
-                lines.append(f"store double {res_rhs}, double* {out_name(node.lhs)}")
-                return
-
-            raise ValueError(f"Untyped expression! {node.rhs}")
+            if node.rhs.ty is Ty.UNKNOWN:
+                raise ValueError(f"Untyped expression! {node.rhs}")
+            type_ = _type(node.rhs)
+            lines.append(f"store {type_} {res_rhs}, {type_}* {out_name(node.lhs)}")
 
         case GlobalVar():
             if node.type_.value in {"int", "char"}:
-                lines.append(f"@{node.name} = global i32 0")
+                lines.append(f"{mangle('@', node.name, node.sym)} = global i32 0")
                 return
 
             elif node.type_.value == "float":
-                lines.append(f"@{node.name} = global double 0.0")
+                lines.append(f"{mangle('@', node.name, node.sym)} = global double 0.0")
                 return
 
             elif node.type_.value == "bool":
-                lines.append(f"@{node.name} = global i1 0")
+                lines.append(f"{mangle('@', node.name, node.sym)} = global i1 0")
                 return
 
             raise ValueError(f"Unknown type: {node.type_.value}")
 
         case LocalVar():
             if node.type_.value in {"int", "char"}:
-                lines.append(f"%{node.name} = alloca i32")
+                lines.append(f"{mangle('%', node.name, node.sym)} = alloca i32")
                 return
             elif node.type_.value == "float":
-                lines.append(f"%{node.name} = alloca double")
+                lines.append(f"{mangle('%', node.name, node.sym)} = alloca double")
                 return
 
             elif node.type_.value == "bool":
-                lines.append(f"%{node.name} = alloca i1")
+                lines.append(f"{mangle('%', node.name, node.sym)} = alloca i1")
                 return
 
             raise ValueError(f"Unknown type: {node.type_.value}")
 
-        case IntPrint():
-            lines.append(
-                f"call i32 (i32) @_print_int(i32 {res_expr(node.expr, lines)})"
-            )
-
-        case FloatPrint():
-            lines.append(
-                f"call double (double) @_print_float(double {res_expr(node.expr, lines)})"
-            )
-
-        case CharPrint():
+        case Print() if node.expr.ty is not Ty.UNKNOWN:
+            type_ = _type(node.expr)
+            res = res_expr(node.expr, lines)
             lines.append(
-                f"call i32 (i32) @_print_char(i32 {res_expr(node.expr, lines)})"
+                f"call {type_} ({type_}) @_print_{node.expr.ty.value}({type_} {res})"
             )
 
-        case BoolPrint():
-            lines.append(f"call i1 (i1) @_print_bool(i1 {res_expr(node.expr, lines)})")
-
         case While():
             lt = gensym()
             lb = gensym()
@@ -356,11 +325,12 @@ def out_stmt(node: Statement, lines: Lines, break_to: str | None = None) -> None
                 lines.append(f"br i1 {test}, label %{lb}, label %{le}")
 
             lines.extend([f"{lb}:"])
-            with lines.indent():
-                any(out_stmt(stmt, lines, break_to=le) for stmt in node.body)
-                lines.append(f"br label %{lt}")
-
-            lines.extend([f"{le}:"])
+            lines.push_indent()
+            work.append((_LABEL, f"{le}:"))
+            work.append((_DEDENT, None))
+            if not _ends(node.body):
+                work.append((_LINE, f"br label %{lt}"))
+            work.extend((_STMT, (stmt, le)) for stmt in reversed(node.body))
 
         case Branch():
             test = res_expr(node.condition, lines)
@@ -370,14 +340,18 @@ def out_stmt(node: Statement, lines: Lines, break_to: str | None = None) -> None
 
             lines.append(f"br i1 {test}, label %{lc}, label %{la}")
             lines.extend([f"{lc}:"])
-            with lines.indent():
-                any(out_stmt(stmt, lines, break_to=break_to) for stmt in node.body)
-                lines.append(f"br label %{lm}")
-            lines.extend([f"{la}:"])
-            with lines.indent():
-                any(out_stmt(stmt, lines, break_to=break_to) for stmt in node.else_)
-                lines.append(f"br label %{lm}")
-            lines.extend([f"{lm}:"])
+            lines.push_indent()
+            work.append((_LABEL, f"{lm}:"))
+            work.append((_DEDENT, None))
+            if not _ends(node.else_):
+                work.append((_LINE, f"br label %{lm}"))
+            work.extend((_STMT, (stmt, break_to)) for stmt in reversed(node.else_))
+            work.append((_INDENT, None))
+            work.append((_LABEL, f"{la}:"))
+            work.append((_DEDENT, None))
+            if not _ends(node.body):
+                work.append((_LINE, f"br label %{lm}"))
+            work.extend((_STMT, (stmt, break_to)) for stmt in reversed(node.body))
 
         case Function():
             res_args = ", ".join(
@@ -385,18 +359,21 @@ def out_stmt(node: Statement, lines: Lines, break_to: str | None = None) -> None
                 for idx, arg in enumerate(node.args)
             )
             ret_type = types[node.ret_type_.value]
-            lines.append(f"define {ret_type} @{node.name}({res_args}) {{")
-            with lines.indent():
-                for idx, arg in enumerate(node.args):
-                    t = arg.type_.value
-                    lines.append(f"%{arg.value} = alloca {types[t]}")
-                    lines.append(f"store {types[t]} %.a{idx}, {types[t]}* %{arg.value}")
-                any(out_stmt(stmt, lines) for stmt in node.body)
-                lines.append(
-                    f"ret {ret_type} {'0' if ret_type in ('i32', 'i1') else '0.0'}"
-                )
-
-            lines.append("}")
+            name = mangle("@", node.name, node.sym)
+            lines.append(f"define {ret_type} {name}({res_args}) {{")
+            lines.push_indent()
+            for idx, arg in enumerate(node.args):
+                t = arg.type_.value
+                arg_name = mangle("%", arg.value, arg.sym)
+                lines.append(f"{arg_name} = alloca {types[t]}")
+                lines.append(f"store {types[t]} %.a{idx}, {types[t]}* {arg_name}")
+            work.append((_LINE, "}"))
+            work.append((_DEDENT, None))
+            # For a body that can run off its end.
+            if not (node.body and isinstance(node.body[-1], Return)):
+                zero = "0" if ret_type in ("i32", "i1") else "0.0"
+                work.append((_LINE, f"ret {ret_type} {zero}"))
+            work.extend((_STMT, (stmt, None)) for stmt in reversed(node.body))
 
         case Break():
             if not break_to:
@@ -405,18 +382,9 @@ def out_stmt(node: Statement, lines: Lines, break_to: str | None = None) -> None
 
         case Return():
             res = res_expr(node.expr, lines)
-            if isinstance(node.expr, (IntTyped, CharTyped)):
-                lines.append(f"ret i32 {res}")
-                return
-            elif isinstance(node.expr, FloatTyped):
-                lines.append(f"ret double {res}")
-                return
-
-            elif isinstance(node.expr, BoolTyped):
-                lines.append(f"ret i1 {res}")
-                return
-
-            raise ValueError(f"Untyped expression! {node.expr}")
+            if node.expr.ty is Ty.UNKNOWN:
+                raise ValueError(f"Untyped expression! {node.expr}")
+            lines.append(f"ret {_type(node.expr)} {res}")
 
         case ExprAsStatement():
             res_expr(node.expr, lines)
@@ -425,12 +393,12 @@ def out_stmt(node: Statement, lines: Lines, break_to: str | None = None) -> None
             raise ValueError(f"Unexpected statement: {node}")
 
 
-def _type(node) -> Literal["i32", "double", "char", "i1"]:
-    if isinstance(node, (IntTyped, CharTyped)):
-        return "i32"
-    elif isinstance(node, FloatTyped):
-        return "double"
-    elif isinstance(node, BoolTyped):
-        return "i1"
-    else:
+def _ends(body: list[Statement]) -> bool:
+    """Whether `body` ends in a terminator, after which a branch would be dead."""
+    return bool(body) and isinstance(body[-1], (Return, Break))
+
+
+def _type(node: Expression) -> str:
+    if node.ty is Ty.UNKNOWN:
         raise TypeError(f"Unexpected type: {node}")
+    return types[node.ty.value]
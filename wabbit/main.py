@@ -1,30 +1,77 @@
 import subprocess
+import sys
+from contextlib import contextmanager
+from enum import Enum
+from mmap import mmap
 from pathlib import Path
 from pprint import pprint
 from tempfile import TemporaryDirectory
+from typing import Iterator, Literal, cast
 
 from typer import Typer
 
-from wabbit.add_types import add_types
 from wabbit.bracecheck import validate_braces
-from wabbit.check_types import check_types
-from wabbit.deinit import deinit_variables
-from wabbit.fold_constants import fold_constants
+from wabbit.cache import StageCache
 from wabbit.format import format_program
 from wabbit.llvm import generate_llvm
 from wabbit.model import Program
+from wabbit.parallel import parse_parallel
 from wabbit.parser import Parser
-from wabbit.resolve import resolve_scopes
+from wabbit.pipeline import PassManager, schedule
+from wabbit.predictive import PredictiveParser
+from wabbit.stream import TokenCursor, iter_token_chunks, open_source
+from wabbit.symbols import SymbolTable
+from wabbit.timings import Timings, stage
 from wabbit.tokenizer import tokenize as _tokenize
-from wabbit.unscript import unscript_toplevel
-from wabbit.validator import validate_ast
+from wabbit.tokenizer import tokenize_table
+from wabbit.walker import MODE, run_passes
 
 app = Typer()
 
 
+class ParserName(str, Enum):
+    """The choices of `--parser`."""
+
+    PREDICTIVE = "predictive"
+    BACKTRACKING = "backtracking"
+
+
+PARSERS = {ParserName.PREDICTIVE: PredictiveParser, ParserName.BACKTRACKING: Parser}
+
+
+class EngineName(str, Enum):
+    """The choices of `tokenize --engine`."""
+
+    REGEX = "regex"
+    SCAN = "scan"
+
+
+# What has to hold for the tree at each stage, see `wabbit.pipeline`.
+STAGES: dict[str, tuple[str, ...]] = {
+    "parsed": (),
+    "typed": ("checked",),
+    "folded": ("checked", "folded"),
+    "resolved": ("checked", "resolved"),
+    "unscripted": ("checked", "unscripted"),
+    "pruned": ("checked", "pruned"),
+}
+
+
 @app.command()
-def llvm(file: str, output: str | None = None):
-    llvm = compile_to_llvm(file)
+def llvm(
+    file: str,
+    output: str | None = None,
+    stream: bool = False,
+    parser: ParserName = ParserName.PREDICTIVE,
+    jobs: int = 1,
+    share: bool = False,
+    cache_dir: str | None = None,
+    timings: str | None = None,
+    profile: str | None = None,
+    memory: bool = False,
+):
+    with _report("llvm", file, timings, profile, memory):
+        llvm = compile_to_llvm(file, stream, parser, jobs, share, cache_dir)
     if output:
         with open(output, "w") as f:
             f.write(llvm)
@@ -36,31 +83,55 @@ def llvm(file: str, output: str | None = None):
 def compile(
     in_file: str,
     output: str,
+    stream: bool = False,
+    parser: ParserName = ParserName.PREDICTIVE,
+    jobs: int = 1,
+    share: bool = False,
+    cache_dir: str | None = None,
+    timings: str | None = None,
+    profile: str | None = None,
+    memory: bool = False,
 ):
     path = Path(output)
-    llvm = compile_to_llvm(in_file)
-
-    with TemporaryDirectory() as temp_dir:
+    with (
+        _report("compile", in_file, timings, profile, memory),
+        TemporaryDirectory() as temp_dir,
+    ):
+        llvm = compile_to_llvm(in_file, stream, parser, jobs, share, cache_dir)
         file_path = Path(temp_dir) / path.with_suffix(".ll")
         with open(file_path, "w") as f:
             f.write(llvm)
-        subprocess.call(
-            [
-                "clang",
-                str(file_path),
-                "wabbit/misc/runtime.c",
-                "-o",
-                f"wabbit/bin/{output}",
-            ]
-        )
+        with stage("clang"):
+            subprocess.call(
+                [
+                    "clang",
+                    str(file_path),
+                    "wabbit/misc/runtime.c",
+                    "-o",
+                    f"wabbit/bin/{output}",
+                ]
+            )
 
 
 @app.command()
-def source(file: str, optimize: bool = False):
-    ast = _to_ast(file)
-    if optimize:
-        ast = _simplify_tree(ast)
-    print(format_program(ast))
+def source(
+    file: str,
+    optimize: bool = False,
+    stream: bool = False,
+    parser: ParserName = ParserName.PREDICTIVE,
+    jobs: int = 1,
+    share: bool = False,
+    cache_dir: str | None = None,
+    timings: str | None = None,
+    profile: str | None = None,
+    memory: bool = False,
+):
+    with _report("source", file, timings, profile, memory):
+        name = "pruned" if optimize else "parsed"
+        ast = _to_ast(file, stream, parser, jobs, share, cache_dir, name)
+        with stage("format"):
+            formatted = format_program(ast)
+    print(formatted)
 
 
 @app.command()
@@ -71,80 +142,181 @@ def ast(
     typed: bool = False,
     fold: bool = False,
     type_check: bool = False,
+    inline: bool = False,
     deinit: bool = False,
     resolve: bool = False,
     unscript: bool = False,
+    prune: bool = False,
+    stream: bool = False,
+    parser: ParserName = ParserName.PREDICTIVE,
+    jobs: int = 1,
+    share: bool = False,
+    cache_dir: str | None = None,
+    timings: str | None = None,
+    profile: str | None = None,
+    memory: bool = False,
 ):
-    # TODO(kennipj) Set up automatic dependency-based AST parsing.:
-    ast = _to_ast(file)
-    if validate:
-        ast = validate_ast(ast)
-    elif precedence:
-        ast = validate_ast(ast)
-    elif typed:
-        ast = validate_ast(ast)
-        ast = add_types(ast)
-    elif type_check:
-        ast = validate_ast(ast)
-        ast = add_types(ast)
-        ast = check_types(ast)
-    elif fold:
-        ast = validate_ast(ast)
-        ast = add_types(ast)
-        ast = fold_constants(ast)
-    elif deinit:
-        ast = validate_ast(ast)
-        ast = add_types(ast)
-        ast = fold_constants(ast)
-        ast = deinit_variables(ast)
-    elif resolve:
-        ast = validate_ast(ast)
-        ast = add_types(ast)
-        ast = fold_constants(ast)
-        ast = deinit_variables(ast)
-        ast = resolve_scopes(ast)
-    elif unscript:
-        ast = validate_ast(ast)
-        ast = add_types(ast)
-        ast = fold_constants(ast)
-        ast = deinit_variables(ast)
-        ast = resolve_scopes(ast)
-        ast = unscript_toplevel(ast)
+    # The first flag given wins.
+    flags = {
+        "validated": validate or precedence,
+        "typed": typed,
+        "checked": type_check,
+        "inlined": inline,
+        "folded": fold,
+        "deinit": deinit,
+        "resolved": resolve,
+        "unscripted": unscript,
+        "pruned": prune,
+    }
+    wanted = [fact for fact, given in flags.items() if given][:1]
+    with _report("ast", file, timings, profile, memory):
+        manager = _pass_manager(file, stream, parser, jobs, share, cache_dir)
+        ast = manager.get(*wanted)
 
     pprint(ast)
 
 
 @app.command()
-def tokenize(file: str) -> None:
+def tokenize(
+    file: str,
+    engine: EngineName = EngineName.REGEX,
+    timings: str | None = None,
+    profile: str | None = None,
+    memory: bool = False,
+) -> None:
     with open(file) as f:
         source = f.read()
-    pprint(_tokenize(source, file))
+    with _report("tokenize", file, timings, profile, memory), stage("tokenize"):
+        tokens = _tokenize(
+            source, file, engine=cast(Literal["regex", "scan"], engine.value)
+        )
+    pprint(tokens)
+
 
+def compile_to_llvm(
+    path: str,
+    stream: bool = False,
+    parser: str = "predictive",
+    jobs: int = 1,
+    share: bool = False,
+    cache_dir: str | None = None,
+):
+    ast = _to_ast(path, stream, parser, jobs, share, cache_dir, "pruned")
+    with stage("llvm", ast):
+        return generate_llvm(ast)
 
-def compile_to_llvm(path: str):
-    ast = _to_ast(path)
-    ast = _simplify_tree(ast)
-    return generate_llvm(ast)
 
+@contextmanager
+def _report(
+    command: str,
+    file: str,
+    timings: str | None,
+    profile: str | None,
+    memory: bool = False,
+) -> Iterator[None]:
+    """Time the stages of `command`, writing the times as JSON to `timings`
+    and their profiles as collapsed stacks to `profile`. "-" is stderr.
+
+    With `memory`, the JSON has the memory of each stage too, on stderr
+    unless there is a `timings`.
+    """
+    if memory and timings is None:
+        timings = "-"
+    if timings is None and profile is None:
+        yield
+        return
+    with Timings(profile is not None, memory) as recorder:
+        yield
+    if timings is not None:
+        _write(timings, recorder.to_json(command=command, file=file))
+    if profile is not None:
+        _write(profile, "\n".join(recorder.collapsed_stacks()))
+
+
+def _write(path: str, text: str) -> None:
+    if path == "-":
+        print(text, file=sys.stderr)
+        return
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+def _simplify_tree(ast: Program, mode: MODE = "cow"):
+    return run_passes(ast, schedule(STAGES["pruned"]), mode)
+
+
+def _to_ast(
+    file: str,
+    stream: bool = False,
+    parser: str = "predictive",
+    jobs: int = 1,
+    share: bool = False,
+    cache_dir: str | None = None,
+    stage: str = "parsed",
+) -> Program:
+    """The tree of `file` after `stage`, one of `STAGES`."""
+    manager = _pass_manager(file, stream, parser, jobs, share, cache_dir)
+    return manager.get(*STAGES[stage])
+
+
+def _pass_manager(
+    file: str,
+    stream: bool,
+    parser: str,
+    jobs: int,
+    share: bool,
+    cache_dir: str | None,
+) -> PassManager:
+    """A `PassManager` for one command, with a `cache_dir` it starts from the
+    furthest stage cached there and caches the one asked for.
+    """
+    cache = None
+    if cache_dir is not None:
+        if stream:
+            source: str | mmap = open_source(file)
+        else:
+            with open(file) as f:
+                source = f.read()
+        cache = StageCache(cache_dir, source, file)
+    # Nothing else holds on to the trees, the passes can change them in place.
+    return PassManager(
+        lambda: _parse(file, stream, parser, jobs), cache, share, keep=False
+    )
 
-def _simplify_tree(ast: Program):
-    ast = validate_ast(ast)
-    # ast = set_precedence(ast)
-    ast = add_types(ast)
-    ast = check_types(ast)
-    ast = fold_constants(ast)
-    ast = deinit_variables(ast)
-    ast = resolve_scopes(ast)
-    ast = unscript_toplevel(ast)
-    return ast
 
+def _parse(file: str, stream: bool, parser: str, jobs: int) -> Program:
+    parser_cls = PARSERS[parser]
+    if stream and jobs > 1:
+        print("--jobs needs every token at once, it can't be used with --stream")
+        exit()
+    if stream:
+        # Lex the mapped file twice rather than holding on to every token.
+        # The mapping stays open as the source of the tree, later passes read
+        # their errors from it.
+        mapped = open_source(file)
+        symbols = SymbolTable()
+        with stage("bracecheck"):
+            validate_braces(iter_token_chunks(mapped, file), mapped, file)
+        # Tokens are read as the parser needs them.
+        with stage("parse") as parsed:
+            chunks = iter_token_chunks(mapped, file, symbols=symbols)
+            cursor = TokenCursor(chunks, symbols)
+            parsed.output = program = parser_cls(cursor, mapped, file).parse()
+        return program
 
-def _to_ast(file: str) -> Program:
     with open(file) as f:
         source = f.read()
-    tokens = _tokenize(source, file)
-    validate_braces(tokens, source, file)
-    return Parser(tokens, source, file).parse()
+    with stage("tokenize"):
+        tokens = tokenize_table(source, file)
+    with stage("bracecheck"):
+        validate_braces(tokens, source, file)
+    with stage("parse") as parsed:
+        if jobs > 1:
+            program = parse_parallel(tokens, source, file, jobs, parser_cls)
+        else:
+            program = parser_cls(tokens, source, file).parse()
+        parsed.output = program
+    return program
 
 
 if __name__ == "__main__":
@@ -1,396 +1,348 @@
-from dataclasses import dataclass
-from typing import Literal
+from dataclasses import dataclass, field, fields
+from enum import Enum
+from mmap import mmap
+from typing import Literal, TypeVar, cast
 
 from wabbit.exceptions import WabbitError
+from wabbit.symbols import SymbolTable
 
 
-class UnknownType:
-    ...
+class Ty(Enum):
+    """Resolved type of an expression, set by `wabbit.add_types`."""
 
+    UNKNOWN = "unknown"
+    INT = "int"
+    FLOAT = "float"
+    CHAR = "char"
+    BOOL = "bool"
 
-class IntTyped:
-    ...
+    def __repr__(self) -> str:
+        return f"Ty.{self.name}"
 
 
-class BoolTyped:
-    ...
+class SourceLoc(int):
+    """Line and column span of a node, packed into a single int.
 
+    There is one for every node, a plain int takes less than half the memory
+    of a tuple of three and isn't tracked by the GC.
+    """
 
-class FloatTyped:
-    ...
+    __slots__ = ()
 
+    def __new__(cls, lineno: int, start: int, end: int) -> "SourceLoc":
+        return super().__new__(cls, lineno << 64 | start << 32 | end)
 
-class CharTyped:
-    ...
+    @property
+    def lineno(self) -> int:
+        return self >> 64
+
+    @property
+    def start(self) -> int:
+        return self >> 32 & _COLUMN_MASK
+
+    @property
+    def end(self) -> int:
+        return self & _COLUMN_MASK
+
+    def __getnewargs__(self) -> tuple[int, int, int]:
+        return self.lineno, self.start, self.end
 
+    def __repr__(self) -> str:
+        return f"SourceLoc(lineno={self.lineno}, start={self.start}, end={self.end})"
 
-@dataclass
-class SourceLoc:
-    lineno: int
-    start: int
-    end: int
 
+_COLUMN_MASK = (1 << 32) - 1
 
-@dataclass
+
+@dataclass(slots=True)
 class Node:
     loc: SourceLoc
 
 
-@dataclass
+@dataclass(slots=True)
 class Statement(Node):
     ...
 
 
-@dataclass
+@dataclass(slots=True)
 class Expression(Node):
-    ...
+    ty: Ty = field(default=Ty.UNKNOWN, kw_only=True)
 
 
-@dataclass
+@dataclass(slots=True)
 class Type(Node):
     value: Literal["int", "float", "char", "bool"]
 
 
-@dataclass
+@dataclass(slots=True)
 class Name(Expression):
     value: str
+    sym: int = field(default=-1, kw_only=True)
 
 
-@dataclass
-class IntName(Name, IntTyped):
-    ...
-
-
-@dataclass
-class FloatName(Name, FloatTyped):
-    ...
-
-
-@dataclass
-class CharName(Name, CharTyped):
-    ...
-
-
-@dataclass
-class BoolName(Name, BoolTyped):
-    ...
-
-
-@dataclass
-class Integer(Expression, IntTyped):
+@dataclass(slots=True)
+class Integer(Expression):
     value: int
+    ty: Ty = field(default=Ty.INT, kw_only=True)
 
 
-@dataclass
-class Float(Expression, FloatTyped):
+@dataclass(slots=True)
+class Float(Expression):
     value: str
+    ty: Ty = field(default=Ty.FLOAT, kw_only=True)
 
 
-@dataclass
-class Char(Expression, CharTyped):
+@dataclass(slots=True)
+class Char(Expression):
     value: str
+    ty: Ty = field(default=Ty.CHAR, kw_only=True)
 
 
-@dataclass
+@dataclass(slots=True)
 class BinOp(Expression):
     op: Literal["+", "*", "-", "/"]
     lhs: Expression
     rhs: Expression
 
 
-@dataclass
-class IntBinOp(BinOp, IntTyped):
-    ...
-
-
-@dataclass
-class FloatBinOp(BinOp, FloatTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class RelationalOp(Expression):
     op: Literal["==", "<", ">", "<=", ">=", "!="]
     lhs: Expression
     rhs: Expression
 
 
-@dataclass
-class IntRelOp(RelationalOp, IntTyped):
-    ...
-
-
-@dataclass
-class FloatRelOp(RelationalOp, FloatTyped):
-    ...
-
-
-@dataclass
-class BoolRelOp(RelationalOp, BoolTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class Assignment(Statement):
     lhs: Name
     rhs: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class Variable(Statement):
     name: str
     expr: Expression
+    sym: int = field(default=-1, kw_only=True)
 
 
-@dataclass
-class IntVariable(Variable, IntTyped):
-    ...
-
-
-@dataclass
-class FloatVariable(Variable, FloatTyped):
-    ...
-
-
-@dataclass
-class CharVariable(Variable, FloatTyped):
-    ...
-
-
-@dataclass
-class BoolVariable(Variable, BoolTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class VariableDecl(Statement):
     name: str
     type_: Type
+    sym: int = field(default=-1, kw_only=True)
 
 
-@dataclass
+@dataclass(slots=True)
 class Print(Statement):
     expr: Expression
 
 
-@dataclass
-class IntPrint(Print, IntTyped):
-    ...
-
-
-@dataclass
-class FloatPrint(Print, FloatTyped):
-    ...
-
-
-@dataclass
-class CharPrint(Print, CharTyped):
-    ...
-
-
-@dataclass
-class BoolPrint(Print, BoolTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class Parenthesis(Expression):
     expr: Expression
 
 
-@dataclass
-class IntParen(Parenthesis, IntTyped):
-    ...
-
-
-@dataclass
-class FloatParen(Parenthesis, FloatTyped):
-    ...
-
-
-@dataclass
-class BoolParen(Parenthesis, BoolTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class While(Statement):
     condition: Expression
     body: list[Statement]
 
 
-@dataclass
+@dataclass(slots=True)
 class Branch(Statement):
     condition: Expression
     body: list[Statement]
     else_: list[Statement]
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionArg(Name):
     type_: Type
 
 
-@dataclass
-class FloatFunctionArg(FunctionArg, FloatTyped):
-    ...
-
-
-@dataclass
-class IntFunctionArg(FunctionArg, IntTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class Function(Statement):
     name: str
     args: list[FunctionArg]
     body: list[Statement]
     ret_type_: Type
+    sym: int = field(default=-1, kw_only=True)
 
 
-@dataclass
+@dataclass(slots=True)
 class Return(Statement):
     expr: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class Call(Expression):
     name: str
     args: list[Expression]
+    sym: int = field(default=-1, kw_only=True)
 
 
-@dataclass
-class IntCall(Call, IntTyped):
-    ...
-
-
-@dataclass
-class FloatCall(Call, FloatTyped):
-    ...
-
-
-@dataclass
-class CharCall(Call, CharTyped):
-    ...
-
-
-@dataclass
-class BoolCall(Call, BoolTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class LocalVar(VariableDecl):
     ...
 
 
-@dataclass
+@dataclass(slots=True)
 class GlobalVar(VariableDecl):
     ...
 
 
-@dataclass
+@dataclass(slots=True)
 class LocalName(Name):
     ...
 
 
-@dataclass
-class IntLocalName(LocalName, IntTyped):
-    ...
-
-
-@dataclass
-class FloatLocalName(LocalName, FloatTyped):
-    ...
-
-
-@dataclass
-class CharLocalName(LocalName, CharTyped):
-    ...
-
-
-@dataclass
-class BoolLocalName(LocalName, BoolTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class GlobalName(Name):
     ...
 
 
-@dataclass
-class IntGlobalName(GlobalName, IntTyped):
-    ...
-
-
-@dataclass
-class FloatGlobalName(GlobalName, FloatTyped):
-    ...
-
-
-@dataclass
-class CharGlobalName(GlobalName, CharTyped):
-    ...
-
-
-@dataclass
-class BoolGlobalName(GlobalName, BoolTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expression):
     op: Literal["-"]
     expr: Expression
 
 
-@dataclass
-class IntUnaryOp(UnaryOp, IntTyped):
-    ...
-
-
-@dataclass
-class FloatUnaryOp(UnaryOp, FloatTyped):
-    ...
-
-
-@dataclass
+@dataclass(slots=True)
 class ExprAsStatement(Statement):
     expr: Expression
 
 
-@dataclass
-class Boolean(Expression, BoolTyped):
+@dataclass(slots=True)
+class Boolean(Expression):
     value: Literal["true", "false"]
+    ty: Ty = field(default=Ty.BOOL, kw_only=True)
 
 
-@dataclass
-class LogicalOp(Expression, BoolTyped):
+@dataclass(slots=True)
+class LogicalOp(Expression):
     op: Literal["and", "or"]
     lhs: Expression
     rhs: Expression
+    ty: Ty = field(default=Ty.BOOL, kw_only=True)
 
 
-@dataclass
-class Negation(Expression, BoolTyped):
+@dataclass(slots=True)
+class Negation(Expression):
     op: Literal["not"]
     expr: Expression
+    ty: Ty = field(default=Ty.BOOL, kw_only=True)
 
 
-@dataclass
+@dataclass(slots=True)
 class Break(Statement):
     ...
 
 
-@dataclass
-class ErrorExpr(Expression, UnknownType):
+@dataclass(slots=True)
+class ErrorExpr(Expression):
     err: WabbitError
 
 
-@dataclass
+@dataclass(slots=True)
 class Program(Node):
     statements: list[Statement]
-    source: str
+    # Errors are read from it in every pass. A mapping, see
+    # `wabbit.stream.open_source`, belongs to the tree and closes with it.
+    source: str | mmap
     fname: str = "file.wb"
+    # Not compared itself, the nodes already carry the ids they were given.
+    symbols: SymbolTable = field(default_factory=SymbolTable, compare=False)
+    # Hash and first line of the tokens of each leading statement, as found
+    # by `wabbit.incremental.reparse`.
+    spans: list[tuple[bytes, int]] = field(
+        default_factory=list, compare=False, repr=False
+    )
+    # Set when the constants of the tree are shared, see `Interner.tree`.
+    interner: "Interner | None" = field(default=None, compare=False, repr=False)
+
+
+_N = TypeVar("_N")
+
+
+class Interner:
+    """Hash-conses constant subtrees: `Type`s, literals and operators on them.
+
+    Subtrees that are the same apart from their locations come back as one
+    shared instance, the first one seen, so two interned nodes are equal
+    exactly when they are the same object. A node is keyed on the ids of its
+    already interned children, hashing it never descends any further.
+
+    Names aren't shared, their type depends on where they are. A shared node
+    keeps the location of its first occurrence, errors reported on a repeated
+    constant point at that one.
+    """
+
+    def __init__(self) -> None:
+        self._nodes: dict[tuple, Node] = {}
+        self._shared: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __call__(self, node: _N) -> _N:
+        """The shared instance of `node`, or `node` itself if it can't be shared."""
+        names = _SHAREABLE.get(type(node))
+        if names is None:
+            return node
+        key: list = [type(node)]
+        for name in names:
+            value = getattr(node, name)
+            if isinstance(value, Node):
+                if id(value) not in self._shared:
+                    return node
+                value = id(value)
+            key.append(value)
+        shared = self._nodes.setdefault(tuple(key), node)
+        if shared is node:
+            self._shared.add(id(node))
+        return cast(_N, shared)
+
+    def is_shared(self, node: Node) -> bool:
+        return id(node) in self._shared
+
+    def tree(self, program: Program) -> Program:
+        """Share the constant subtrees of `program`, in place, bottom-up."""
+        stack: list[tuple[object, bool]] = [(program, False)]
+        while stack:
+            item, children_done = stack.pop()
+            if not children_done:
+                stack.append((item, True))
+                if isinstance(item, list):
+                    stack.extend((child, False) for child in reversed(item))
+                elif isinstance(item, Node):
+                    stack.extend(
+                        (getattr(item, f.name), False) for f in reversed(fields(item))
+                    )
+            elif isinstance(item, list):
+                item[:] = [self(child) for child in item]
+            elif isinstance(item, Node):
+                for f in fields(item):
+                    value = getattr(item, f.name)
+                    if isinstance(value, Node):
+                        setattr(item, f.name, self(value))
+        program.interner = self
+        return program
+
+
+# Fields making up the key of each class `Interner` shares.
+_SHAREABLE = {
+    cls: tuple(f.name for f in fields(cls) if f.name != "loc")
+    for cls in (
+        Type,
+        Integer,
+        Float,
+        Char,
+        Boolean,
+        BinOp,
+        RelationalOp,
+        LogicalOp,
+        UnaryOp,
+        Negation,
+        Parenthesis,
+    )
+}
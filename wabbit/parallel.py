@@ -0,0 +1,108 @@
+import gc
+import pickle
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from wabbit.model import Program, SourceLoc, Statement
+from wabbit.parser import Parser
+from wabbit.predictive import PredictiveParser
+from wabbit.tokenizer import TokenTable, statement_spans
+from wabbit.utils import gc_paused
+
+# Batches per worker, so a few large functions don't leave the others idle.
+BATCHES_PER_JOB = 4
+
+# Set in each worker by `_init_worker`.
+_tokens = TokenTable()
+_source = ""
+_fname = ""
+_parser_cls: type[PredictiveParser | Parser] = PredictiveParser
+
+
+def parse_parallel(
+    tokens: TokenTable,
+    source: str,
+    fname: str = "file.wb",
+    jobs: int = 1,
+    parser_cls: type[PredictiveParser | Parser] = PredictiveParser,
+) -> Program:
+    """Parse batches of top-level statements in `jobs` processes.
+
+    Same as `parser_cls(tokens, source, fname).parse()`. Statements are split
+    on the token boundaries found by `statement_spans`. As soon as a batch
+    doesn't parse as a whole, the rest of the file is parsed serially from its
+    first token, so invalid programs stop and fail the way they do serially.
+    """
+    statements: list[Statement] = []
+    batch_size = max(len(tokens) // (jobs * BATCHES_PER_JOB), 1)
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(tokens, source, fname, parser_cls),
+    ) as pool:
+        futures = [
+            (start, pool.submit(_parse_batch, start, end))
+            for start, end in _batches(tokens, batch_size)
+        ]
+        for start, future in futures:
+            batch = future.result()
+            if batch is None:
+                pool.shutdown(cancel_futures=True)
+                parser = parser_cls(tokens, source, fname)
+                parser.idx = start
+                statements.extend(parser.parse().statements)
+                break
+            statements.extend(_load(batch))
+
+    return Program(
+        statements=statements,
+        loc=SourceLoc(lineno=0, start=0, end=len(source)),
+        source=source,
+        fname=fname,
+        symbols=tokens.symbols,
+    )
+
+
+def _batches(tokens: TokenTable, size: int) -> Iterator[tuple[int, int]]:
+    start = 0
+    for _, end in statement_spans(tokens):
+        if end - start >= size:
+            yield start, end
+            start = end
+    if start < len(tokens):
+        yield start, len(tokens)
+
+
+def _init_worker(
+    tokens: TokenTable,
+    source: str,
+    fname: str,
+    parser_cls: type[PredictiveParser | Parser],
+) -> None:
+    global _tokens, _source, _fname, _parser_cls
+    _tokens, _source, _fname, _parser_cls = tokens, source, fname, parser_cls
+    # Workers only build trees, none of which are cyclic garbage, see `_load`.
+    gc.disable()
+
+
+def _parse_batch(start: int, end: int) -> bytes | None:
+    """The pickled statements of tokens `start` to `end`, `None` unless all parse.
+
+    A tree nested too deep to be pickled counts as not parsing, the parent
+    process parses it again serially.
+    """
+    batch = _tokens.slice(start, end)
+    parser = _parser_cls(batch, _source, _fname)
+    try:
+        statements = parser.parse().statements
+        if parser.idx < len(batch):
+            return None
+        return pickle.dumps(statements, pickle.HIGHEST_PROTOCOL)
+    except (ValueError, SyntaxError, RecursionError):
+        return None
+
+
+def _load(batch: bytes) -> list[Statement]:
+    # Unpickling takes five times as long with the GC on.
+    with gc_paused():
+        return pickle.loads(batch)
@@ -1,4 +1,5 @@
 from functools import partial
+from mmap import mmap
 from typing import Literal, cast
 
 from wabbit.exceptions import WabbitSyntaxError
@@ -33,7 +34,8 @@ from wabbit.model import (
     VariableDecl,
     While,
 )
-from wabbit.tokenizer import Token
+from wabbit.stream import TokenCursor
+from wabbit.tokenizer import Token, TokenTable
 
 # BIN_OPS = ["+", "-", "*", "/", "<", "<=", "==", ">", ">=", "!=", "and", "or"]
 OP_PRECEDENCE = {
@@ -57,9 +59,12 @@ LOG_OPS = {"and", "or"}
 
 class Parser:
     def __init__(
-        self, tokens: list[Token], source: str, fname: str = "file.wb"
+        self,
+        tokens: TokenTable | TokenCursor,
+        source: str | mmap,
+        fname: str = "file.wb",
     ) -> None:
-        self.tokens = tokens
+        self.tokens = tokens if isinstance(tokens, TokenCursor) else TokenCursor(tokens)
         self.idx = 0
         self.source = source
         self.fname = fname
@@ -68,43 +73,51 @@ class Parser:
         return self.expect_one_of(type_, fatal=fatal)
 
     def expect_one_of(self, *type_: str, fatal: bool = False) -> Token:
-        token = self.tokens[self.idx]
-        if token.type_ in type_:
+        if self.tokens.type_at(self.idx) in type_:
             self.idx += 1
-            return token
+            return cast(Token, self.tokens.get(self.idx - 1))
         elif fatal:
-            raise ValueError(f"Expected {type_}. Got {token}")
-        raise SyntaxError(f"Expected {type_}. Got {token}")
+            raise ValueError(f"Expected {type_}. Got {self.tokens.get(self.idx)}")
+        raise SyntaxError(f"Expected {type_}. Got {self.tokens.type_at(self.idx)}")
+
+    def expect_name(self) -> tuple[Token, int]:
+        """Consume a `NAME` token, returning it along with its symbol."""
+        token = self.expect("NAME")
+        return token, self.tokens.sym_at(self.idx - 1)
 
     def peek(self, type_: str, num: int = 0) -> Token | None:
-        if not (self.idx + num < len(self.tokens)):
-            return None
-        token = self.tokens[self.idx + num]
-        if token.type_ == type_:
-            return token
+        if self.tokens.type_at(self.idx + num) == type_:
+            return self.tokens.get(self.idx + num)
 
     def peek_one_of_val(self, *val: str, num: int = 0) -> Token | None:
-        if not (self.idx + num < len(self.tokens)):
-            return None
-        token = self.tokens[self.idx + num]
-        if token.value in val:
-            return token
+        if self.tokens.value_at(self.idx + num) in val:
+            return self.tokens.get(self.idx + num)
         return None
 
+    def at_end(self) -> bool:
+        return self.tokens.type_at(self.idx) is None
+
     def parse(self) -> Program:
-        statements = self.parse_statements()
+        statements = []
+        while stmt := self.parse_statement():
+            statements.append(stmt)
+            # Nothing before a complete top-level statement is ever revisited.
+            self.tokens.release(self.idx)
+            if self.at_end():
+                break
         return Program(
             statements=statements,
             loc=SourceLoc(lineno=0, start=0, end=len(self.source)),
             source=self.source,
             fname=self.fname,
+            symbols=self.tokens.symbols,
         )
 
     def parse_statements(self) -> list[Statement]:
         statements = []
         while stmt := self.parse_statement():
             statements.append(stmt)
-            if self.idx >= len(self.tokens):
+            if self.at_end():
                 break
         return statements
 
@@ -151,7 +164,7 @@ class Parser:
                 return func()
             except SyntaxError:
                 self.idx = start
-        raise SyntaxError(f"Unexpected token: {self.tokens[start]}")
+        raise SyntaxError(f"Unexpected token: {self.tokens.get(start)}")
 
     def parse_term(self, err: WabbitSyntaxError | None = None) -> Expression:
         start = self.idx
@@ -172,7 +185,7 @@ class Parser:
                 return func()
             except SyntaxError:
                 self.idx = start
-        raise SyntaxError(f"Unexpected token: {self.tokens[start]}")
+        raise SyntaxError(f"Unexpected token: {self.tokens.get(start)}")
 
     def parse_type(self, err: WabbitSyntaxError | None = None) -> Type:
         start = self.idx
@@ -187,7 +200,7 @@ class Parser:
                 return func()
             except SyntaxError:
                 self.idx = start
-        raise SyntaxError(f"Unexpected token: {self.tokens[start]}")
+        raise SyntaxError(f"Unexpected token: {self.tokens.get(start)}")
 
     def parse_binop(self) -> Expression:
         output_stack: list[Expression | Token] = []
@@ -463,23 +476,25 @@ class Parser:
 
     def parse_vardecl(self) -> VariableDecl:
         var = self.expect("VAR")
-        name = self.expect("NAME")
+        name, sym = self.expect_name()
         type_ = self.parse_type()
         end = self.expect("SEMI")
         return VariableDecl(
             name=name.value,
+            sym=sym,
             type_=type_,
             loc=SourceLoc(lineno=var.lineno, start=var.column, end=end.column),
         )
 
     def parse_var(self) -> Variable:
         var = self.expect("VAR")
-        name = self.expect("NAME")
+        name, sym = self.expect_name()
         self.expect("ASSIGN")
         expr = self.parse_expression()
         end = self.expect("SEMI", fatal=True)
         return Variable(
             name=name.value,
+            sym=sym,
             expr=expr,
             loc=SourceLoc(lineno=var.lineno, start=var.column, end=end.column),
         )
@@ -503,7 +518,7 @@ class Parser:
         )
 
     def parse_call(self) -> Call:
-        func = self.expect("NAME")
+        func, sym = self.expect_name()
         self.expect("LPAREN")
         if not self.peek("RPAREN"):
             args = self.parse_call_args()
@@ -512,6 +527,7 @@ class Parser:
         end_paren = self.expect("RPAREN", fatal=True)
         return Call(
             name=func.value,
+            sym=sym,
             args=args,
             loc=SourceLoc(lineno=func.lineno, start=func.column, end=end_paren.column),
         )
@@ -529,7 +545,7 @@ class Parser:
 
     def parse_func(self) -> Function:
         func = self.expect("FUNC")
-        name = self.expect("NAME")
+        name, sym = self.expect_name()
         self.expect("LPAREN")
         args = self.parse_func_args()
         self.expect("RPAREN", fatal=True)
@@ -539,6 +555,7 @@ class Parser:
         end_brace = self.expect("RBRACE")
         return Function(
             name=name.value,
+            sym=sym,
             args=args,
             body=statements,
             ret_type_=type_,
@@ -546,10 +563,11 @@ class Parser:
         )
 
     def parse_func_arg(self) -> FunctionArg:
-        name = self.expect("NAME")
+        name, sym = self.expect_name()
         type_ = self.parse_type()
         return FunctionArg(
             value=name.value,
+            sym=sym,
             type_=type_,
             loc=SourceLoc(lineno=name.lineno, start=name.column, end=type_.loc.end),
         )
@@ -622,8 +640,8 @@ class Parser:
         )
 
     def parse_name(self) -> Name:
-        token = self.expect("NAME", fatal=False)
-        return Name(value=token.value, loc=_loc_from_token(token))
+        token, sym = self.expect_name()
+        return Name(value=token.value, sym=sym, loc=_loc_from_token(token))
 
     def parse_char(self) -> Char | ErrorExpr:
         token = self.expect("CHARACTER")
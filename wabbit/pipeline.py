@@ -0,0 +1,134 @@
+"""Which passes to run for a stage of the tree, and the trees of stages already run.
+
+Each pass declares what it `requires` to hold for the tree and what it
+`produces`. A stage is the set of those that hold for it. Adding a pass is
+adding it to `PASSES`, after the ones it requires.
+"""
+
+from typing import Callable, Iterable, Sequence
+
+from wabbit.add_types import AddTypes
+from wabbit.cache import StageCache
+from wabbit.check_types import TypeCheck
+from wabbit.dead_code import EliminateDeadCode
+from wabbit.deinit import DeinitVisitor
+from wabbit.fold_constants import FoldConstants
+from wabbit.inline import InlineFunctions
+from wabbit.model import Interner, Program
+from wabbit.resolve import ResolveScopes
+from wabbit.timings import stage as timed
+from wabbit.unscript import UnscriptToplevel
+from wabbit.validator import Validator
+from wabbit.walker import Visitor, run_passes
+
+# Every pass, in the order they run in.
+PASSES: tuple[type[Visitor], ...] = (
+    Validator,
+    # SetPrecedence,
+    AddTypes,
+    TypeCheck,
+    InlineFunctions,
+    FoldConstants,
+    DeinitVisitor,
+    ResolveScopes,
+    UnscriptToplevel,
+    EliminateDeadCode,
+)
+
+
+def schedule(
+    wanted: Iterable[str], passes: Sequence[type[Visitor]] = PASSES
+) -> list[type[Visitor]]:
+    """The passes needed for all of `wanted` to hold, and nothing else."""
+    producers = {cls.produces: cls for cls in passes}
+    needed: set[str] = set()
+    todo = list(wanted)
+    while todo:
+        fact = todo.pop()
+        if fact in needed:
+            continue
+        if fact not in producers:
+            raise ValueError(f"No pass produces {fact!r}")
+        needed.add(fact)
+        todo.extend(producers[fact].requires)
+    return [cls for cls in passes if cls.produces in needed]
+
+
+class PassManager:
+    """The tree of one source at each stage asked for.
+
+    A stage starts from the furthest one along its way that is already
+    kept, or cached in `cache`, and only runs the passes left. With
+    `keep=False`, a tree is changed in place to get to the next stage and
+    only the last one is kept.
+    """
+
+    def __init__(
+        self,
+        parse: Callable[[], Program],
+        cache: StageCache | None = None,
+        share: bool = False,
+        keep: bool = True,
+        passes: Sequence[type[Visitor]] = PASSES,
+    ) -> None:
+        self._parse = parse
+        self._cache = cache
+        self._share = share
+        self._keep = keep
+        self._passes = passes
+        self._stages: dict[frozenset[str], Program] = {}
+
+    def get(self, *wanted: str) -> Program:
+        """The tree once the passes for `wanted` have run."""
+        passes = schedule(wanted, self._passes)
+        produced = [cls.produces for cls in passes]
+        for done in range(len(passes), -1, -1):
+            program = self._load(frozenset(produced[:done]))
+            if program is not None:
+                break
+        else:
+            program = self._parse()
+            self._save(frozenset(), program)
+            if self._share:
+                program = self._intern(program)
+            self._stages[frozenset()] = program
+        if done == len(passes):
+            return program
+
+        start = frozenset(produced[:done])
+        if not self._keep:
+            self._stages.pop(start, None)
+        program = run_passes(
+            program, passes[done:], "cow" if self._keep else "in_place"
+        )
+        stage = frozenset(produced)
+        self._stages[stage] = program
+        self._save(stage, program)
+        return program
+
+    def _load(self, stage: frozenset[str]) -> Program | None:
+        if stage in self._stages:
+            return self._stages[stage]
+        if self._cache is None:
+            return None
+        with timed("cache load") as loaded:
+            loaded.output = program = self._cache.load(_stage_name(stage))
+        if program is not None:
+            if self._share:
+                program = self._intern(program)
+            self._stages[stage] = program
+        return program
+
+    def _save(self, stage: frozenset[str], program: Program) -> None:
+        if self._cache is not None:
+            with timed("cache save"):
+                self._cache.save(_stage_name(stage), program)
+
+    def _intern(self, program: Program) -> Program:
+        with timed("share", program) as shared:
+            shared.output = program = Interner().tree(program)
+        return program
+
+
+def _stage_name(stage: frozenset[str]) -> str:
+    return "+".join(sorted(stage)) or "parsed"
@@ -0,0 +1,663 @@
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from mmap import mmap
+from typing import Literal, cast
+
+from wabbit.exceptions import WabbitSyntaxError
+from wabbit.model import (
+    Assignment,
+    BinOp,
+    Boolean,
+    Branch,
+    Break,
+    Call,
+    Char,
+    ErrorExpr,
+    ExprAsStatement,
+    Expression,
+    Float,
+    Function,
+    FunctionArg,
+    Integer,
+    LogicalOp,
+    Name,
+    Negation,
+    Parenthesis,
+    Print,
+    Program,
+    RelationalOp,
+    Return,
+    SourceLoc,
+    Statement,
+    Type,
+    UnaryOp,
+    Variable,
+    VariableDecl,
+    While,
+)
+from wabbit.parser import BIN_OPS, LOG_OPS, OP_PRECEDENCE, REL_OPS, _loc_from_token
+from wabbit.stream import TokenCursor
+from wabbit.tokenizer import (
+    CHARACTER,
+    INTEGER,
+    NAME,
+    ONE_CHAR_SYMBOLS,
+    TOKEN_TYPES,
+    TWO_CHAR_SYMBOLS,
+    TYPE_CODES,
+    Token,
+    TokenTable,
+)
+
+ASSIGN = TYPE_CODES["ASSIGN"]
+BOOL = TYPE_CODES["BOOL"]
+BREAK = TYPE_CODES["BREAK"]
+COMMA = TYPE_CODES["COMMA"]
+DOT = TYPE_CODES["DOT"]
+ELSE = TYPE_CODES["ELSE"]
+FUNC = TYPE_CODES["FUNC"]
+IF = TYPE_CODES["IF"]
+LBRACE = TYPE_CODES["LBRACE"]
+LPAREN = TYPE_CODES["LPAREN"]
+MINUS = TYPE_CODES["MINUS"]
+NOT = TYPE_CODES["NOT"]
+PRINT = TYPE_CODES["PRINT"]
+RBRACE = TYPE_CODES["RBRACE"]
+RETURN = TYPE_CODES["RETURN"]
+RPAREN = TYPE_CODES["RPAREN"]
+SEMI = TYPE_CODES["SEMI"]
+VAR = TYPE_CODES["VAR"]
+WHILE = TYPE_CODES["WHILE"]
+
+TYPE_NAMES = {
+    TYPE_CODES["INT"]: "int",
+    TYPE_CODES["FLOAT"]: "float",
+    TYPE_CODES["CHAR"]: "char",
+    BOOL: "bool",
+}
+# Tokens that are always a binary operator. A `CHARACTER` whose value is one
+# counts as well, since `Parser` looks operators up by value.
+OPERATORS = {
+    TYPE_CODES[type_]: op
+    for op, type_ in (
+        ONE_CHAR_SYMBOLS | TWO_CHAR_SYMBOLS | {"and": "AND", "or": "OR"}
+    ).items()
+    if op in OP_PRECEDENCE
+}
+
+
+# What an expression frame is parsed for, and what kind of block a block frame is.
+_TOP, _PAREN, _NOT, _ARG = range(4)
+_IF, _ELSE, _WHILE, _FUNC = range(1, 5)
+
+
+@dataclass
+class _Call:
+    """A call whose arguments are being parsed."""
+
+    start: int
+    token: Token
+    sym: int
+    args: list[Expression] = field(default_factory=list)
+
+
+@dataclass
+class _Expr:
+    """An expression being parsed, one per `(`, `not` and call argument."""
+
+    kind: int
+    start: int
+    token: Token | None = None
+    call: _Call | None = None
+    operands: list[Expression] = field(default_factory=list)
+    operators: list[str] = field(default_factory=list)
+    # The `-` tokens in front of the term being parsed.
+    minuses: list[Token] = field(default_factory=list)
+    first: Expression | None = None
+    after_first: int = 0
+
+    def push(self, op: str) -> None:
+        """Shunting-yard, every operator is left associative."""
+        operators, operands = self.operators, self.operands
+        while operators and OP_PRECEDENCE[operators[-1]] >= OP_PRECEDENCE[op]:
+            rhs = operands.pop()
+            operands[-1] = _binary(operators.pop(), operands[-1], rhs)
+        operators.append(op)
+
+    def reduce(self) -> Expression:
+        operators, operands = self.operators, self.operands
+        while operators:
+            rhs = operands.pop()
+            operands[-1] = _binary(operators.pop(), operands[-1], rhs)
+        return operands[0]
+
+
+@dataclass
+class _Block:
+    """A block being parsed, opened by the statement starting at `start`."""
+
+    kind: int
+    start: int
+    token: Token | None = None
+    condition: Expression | None = None
+    name: tuple[Token, int] | None = None
+    args: list[FunctionArg] | None = None
+    type_: Type | None = None
+    # The body of an `if` and its closing brace, while parsing the `else`.
+    body: list[Statement] | None = None
+    end_brace: Token | None = None
+    statements: list[Statement] = field(default_factory=list)
+
+
+class PredictiveParser:
+    """Parses the same grammar as `Parser` without trying every alternative.
+
+    The rule for a statement or term is looked up by the type of its first
+    token, with a token or two of lookahead where rules share a prefix. A rule
+    that doesn't match returns `None` where `Parser` raises `SyntaxError`, so
+    both build the same `Program`, and fail the same way, for any input.
+
+    Nested blocks and expressions are kept on explicit stacks of frames rather
+    than on the Python stack, so there is no limit on how deep they go.
+    """
+
+    def __init__(
+        self,
+        tokens: TokenTable | TokenCursor,
+        source: str | mmap,
+        fname: str = "file.wb",
+    ) -> None:
+        self.tokens = tokens if isinstance(tokens, TokenCursor) else TokenCursor(tokens)
+        self.idx = 0
+        self.source = source
+        self.fname = fname
+        self._statements: dict[int, Callable[[], Statement | None]] = {
+            NAME: self.parse_name_statement,
+            PRINT: self.parse_print,
+            VAR: self.parse_var,
+            RETURN: self.parse_return,
+            BREAK: self.parse_break,
+        }
+        self._blocks: dict[int, Callable[[], _Block | None]] = {
+            IF: self.open_branch,
+            FUNC: self.open_func,
+            WHILE: self.open_while,
+        }
+        # Terms that can't hold another expression.
+        self._terms: dict[int, Callable[[], Expression]] = {
+            INTEGER: self.parse_number,
+            CHARACTER: self.parse_char,
+            BOOL: self.parse_bool,
+        }
+        for code in (LPAREN, MINUS, NOT, *self._terms):
+            self._statements.setdefault(code, self.parse_expr_as_stmt)
+
+    def accept(self, code: int) -> Token | None:
+        if self.tokens.code_at(self.idx) == code:
+            self.idx += 1
+            return self.tokens.get(self.idx - 1)
+        return None
+
+    def expect(self, code: int) -> Token:
+        if (token := self.accept(code)) is not None:
+            return token
+        raise ValueError(
+            f"Expected {(TOKEN_TYPES[code],)}. Got {self.tokens.get(self.idx)}"
+        )
+
+    def accept_name(self) -> tuple[Token, int] | None:
+        if (token := self.accept(NAME)) is not None:
+            return token, self.tokens.sym_at(self.idx - 1)
+        return None
+
+    def at_end(self) -> bool:
+        return self.tokens.code_at(self.idx) < 0
+
+    def parse(self) -> Program:
+        blocks = [_Block(_TOP, 0)]
+        block = blocks[-1]
+        while True:
+            start = self.idx
+            code = self.tokens.code_at(start)
+            if open_block := self._blocks.get(code):
+                if inner := open_block():
+                    blocks.append(inner)
+                    block = inner
+                    continue
+                stmt = None
+            else:
+                rule = self._statements.get(code)
+                stmt = rule() if rule else None
+
+            # A block ends on the first statement that doesn't parse, and once
+            # closed is a statement of the block around it.
+            while True:
+                if stmt is None:
+                    self.idx = start
+                else:
+                    block.statements.append(stmt)
+                    if block.kind == _TOP:
+                        # Nothing before a complete top-level statement is
+                        # ever revisited.
+                        self.tokens.release(self.idx)
+                    if not self.at_end():
+                        break
+                if block.kind == _TOP:
+                    return Program(
+                        statements=block.statements,
+                        loc=SourceLoc(lineno=0, start=0, end=len(self.source)),
+                        source=self.source,
+                        fname=self.fname,
+                        symbols=self.tokens.symbols,
+                    )
+                blocks.pop()
+                closed = self.close_block(block)
+                if isinstance(closed, _Block):
+                    blocks.append(closed)
+                    block = closed
+                    break
+                stmt = closed
+                start = block.start
+                block = blocks[-1]
+
+    def close_block(self, block: _Block) -> Statement | _Block | None:
+        """The statement `block` ends, or the block of its `else`."""
+        token = cast(Token, block.token)
+        if block.kind == _IF:
+            end_brace = self.expect(RBRACE)
+            if self.accept(ELSE) is not None:
+                if self.accept(LBRACE) is None:
+                    return None
+                return _Block(
+                    _ELSE,
+                    block.start,
+                    token=token,
+                    condition=block.condition,
+                    body=block.statements,
+                    end_brace=end_brace,
+                )
+            return Branch(
+                condition=cast(Expression, block.condition),
+                body=block.statements,
+                else_=[],
+                loc=SourceLoc(
+                    lineno=token.lineno, start=token.lineno, end=end_brace.column
+                ),
+            )
+
+        elif block.kind == _ELSE:
+            self.expect(RBRACE)
+            end_brace = cast(Token, block.end_brace)
+            return Branch(
+                condition=cast(Expression, block.condition),
+                body=cast(list[Statement], block.body),
+                else_=block.statements,
+                loc=SourceLoc(
+                    lineno=token.lineno, start=token.lineno, end=end_brace.column
+                ),
+            )
+
+        elif block.kind == _WHILE:
+            end_brace = self.expect(RBRACE)
+            return While(
+                condition=cast(Expression, block.condition),
+                body=block.statements,
+                loc=SourceLoc(
+                    lineno=token.lineno, start=token.column, end=end_brace.column
+                ),
+            )
+
+        elif block.kind == _FUNC:
+            if (end_brace := self.accept(RBRACE)) is None:
+                return None
+            name, sym = cast(tuple[Token, int], block.name)
+            return Function(
+                name=name.value,
+                sym=sym,
+                args=cast(list[FunctionArg], block.args),
+                body=block.statements,
+                ret_type_=cast(Type, block.type_),
+                loc=SourceLoc(
+                    lineno=token.lineno, start=token.column, end=end_brace.column
+                ),
+            )
+
+        raise ValueError(f"Unexpected block: {block}")
+
+    def parse_name_statement(self) -> Statement | None:
+        if self.tokens.code_at(self.idx + 1) == ASSIGN:
+            return self.parse_assignment()
+        return self.parse_expr_as_stmt()
+
+    def parse_assignment(self) -> Assignment | None:
+        name = self.parse_name()
+        self.idx += 1
+        expr = self.parse_expression()
+        if expr is None:
+            return None
+        self.expect(SEMI)
+        return Assignment(
+            lhs=name,
+            rhs=expr,
+            loc=SourceLoc(
+                lineno=name.loc.lineno, start=name.loc.start, end=expr.loc.end
+            ),
+        )
+
+    def parse_expr_as_stmt(self) -> ExprAsStatement | None:
+        expr = self.parse_expression()
+        if expr is None or (end := self.accept(SEMI)) is None:
+            return None
+        return ExprAsStatement(
+            expr=expr,
+            loc=SourceLoc(lineno=expr.loc.start, start=expr.loc.start, end=end.column),
+        )
+
+    def parse_print(self) -> Print | None:
+        print_ = self.expect(PRINT)
+        expr = self.parse_expression()
+        if expr is None:
+            return None
+        end = self.expect(SEMI)
+        return Print(
+            expr=expr,
+            loc=SourceLoc(lineno=print_.lineno, start=print_.column, end=end.column),
+        )
+
+    def parse_var(self) -> VariableDecl | Variable | None:
+        var = self.expect(VAR)
+        if (name := self.accept_name()) is None:
+            return None
+        token, sym = name
+        if self.tokens.code_at(self.idx) != ASSIGN:
+            type_ = self.parse_type()
+            if type_ is None or (end := self.accept(SEMI)) is None:
+                return None
+            return VariableDecl(
+                name=token.value,
+                sym=sym,
+                type_=type_,
+                loc=SourceLoc(lineno=var.lineno, start=var.column, end=end.column),
+            )
+        self.idx += 1
+        expr = self.parse_expression()
+        if expr is None:
+            return None
+        end = self.expect(SEMI)
+        return Variable(
+            name=token.value,
+            sym=sym,
+            expr=expr,
+            loc=SourceLoc(lineno=var.lineno, start=var.column, end=end.column),
+        )
+
+    def parse_return(self) -> Return | None:
+        ret = self.expect(RETURN)
+        expr = self.parse_expression()
+        if expr is None:
+            return None
+        end = self.expect(SEMI)
+        return Return(
+            expr=expr,
+            loc=SourceLoc(lineno=ret.lineno, start=ret.column, end=end.column),
+        )
+
+    def open_branch(self) -> _Block | None:
+        start = self.idx
+        if_ = self.expect(IF)
+        rel = self.parse_expression()
+        if rel is None:
+            return None
+        self.expect(LBRACE)
+        return _Block(_IF, start, token=if_, condition=rel)
+
+    def open_func(self) -> _Block | None:
+        start = self.idx
+        func = self.expect(FUNC)
+        if (name := self.accept_name()) is None or self.accept(LPAREN) is None:
+            return None
+        args = self.parse_func_args()
+        if args is None:
+            return None
+        self.expect(RPAREN)
+        type_ = self.parse_type()
+        if type_ is None or self.accept(LBRACE) is None:
+            return None
+        return _Block(_FUNC, start, token=func, name=name, args=args, type_=type_)
+
+    def parse_func_args(self) -> list[FunctionArg] | None:
+        args: list[FunctionArg] = []
+        while (name := self.accept_name()) is not None:
+            token, sym = name
+            type_ = self.parse_type()
+            if type_ is None:
+                return None
+            args.append(
+                FunctionArg(
+                    value=token.value,
+                    sym=sym,
+                    type_=type_,
+                    loc=SourceLoc(
+                        lineno=token.lineno, start=token.column, end=type_.loc.end
+                    ),
+                )
+            )
+            if self.tokens.code_at(self.idx) == RPAREN:
+                break
+            self.expect(COMMA)
+        return args
+
+    def open_while(self) -> _Block | None:
+        start = self.idx
+        while_ = self.expect(WHILE)
+        rel = self.parse_expression()
+        if rel is None:
+            return None
+        self.expect(LBRACE)
+        return _Block(_WHILE, start, token=while_, condition=rel)
+
+    def parse_break(self) -> Break | None:
+        token = self.expect(BREAK)
+        if (end := self.accept(SEMI)) is None:
+            return None
+        return Break(
+            loc=SourceLoc(lineno=token.lineno, start=token.column, end=end.column),
+        )
+
+    def parse_type(self) -> Type | None:
+        value = TYPE_NAMES.get(self.tokens.code_at(self.idx))
+        if value is None:
+            return None
+        self.idx += 1
+        token = cast(Token, self.tokens.get(self.idx - 1))
+        return Type(value=value, loc=_loc_from_token(token))
+
+    def parse_expression(self) -> Expression | None:
+        tokens = self.tokens
+        code_at = tokens.code_at
+        frame = _Expr(_TOP, self.idx)
+        frames = [frame]
+        while True:
+            code = code_at(self.idx)
+            term: Expression | None
+            if code == MINUS:
+                frame.minuses.append(cast(Token, tokens.get(self.idx)))
+                self.idx += 1
+                continue
+            elif code == LPAREN or code == NOT:
+                token = tokens.get(self.idx)
+                self.idx += 1
+                frame = _Expr(_PAREN if code == LPAREN else _NOT, self.idx, token)
+                frames.append(frame)
+                continue
+            elif code == NAME and code_at(self.idx + 1) == LPAREN:
+                start = self.idx
+                call = _Call(start, *cast(tuple[Token, int], self.accept_name()))
+                self.idx += 1
+                if code_at(self.idx) != RPAREN:
+                    frame = _Expr(_ARG, self.idx, call=call)
+                    frames.append(frame)
+                    continue
+                term = self._call(call)
+            elif code == NAME:
+                term = self.parse_name()
+            else:
+                rule = self._terms.get(code)
+                term = rule() if rule else None
+
+            # Hand the term to its frame, and the expression of every frame
+            # that ends with it to the frame below.
+            while True:
+                if term is not None:
+                    for minus in reversed(frame.minuses):
+                        term = UnaryOp(
+                            op="-",
+                            expr=term,
+                            loc=SourceLoc(
+                                lineno=minus.lineno,
+                                start=minus.column,
+                                end=term.loc.end,
+                            ),
+                        )
+                    frame.minuses.clear()
+                    if frame.first is None:
+                        frame.first = term
+                        frame.after_first = self.idx
+                    frame.operands.append(term)
+                    if op := self._peek_operator():
+                        frame.push(op)
+                        self.idx += 1
+                        break
+                    expr = frame.reduce()
+                elif frame.first is not None:
+                    # `Parser` falls back to the first term on its own, leaving
+                    # the operator for whoever comes next to fail on.
+                    self.idx = frame.after_first
+                    expr = frame.first
+                else:
+                    frames.pop()
+                    if frame.kind == _TOP:
+                        self.idx = frame.start
+                        return None
+                    if frame.kind == _ARG:
+                        # Not a call after all, just a name.
+                        self.idx = cast(_Call, frame.call).start
+                        term = self.parse_name()
+                    frame = frames[-1]
+                    continue
+
+                frames.pop()
+                if frame.kind == _TOP:
+                    return expr
+                elif frame.kind == _PAREN:
+                    start = cast(Token, frame.token)
+                    end = self.expect(RPAREN)
+                    term = Parenthesis(
+                        expr=expr,
+                        loc=SourceLoc(
+                            lineno=start.lineno, start=start.column, end=end.column
+                        ),
+                    )
+                elif frame.kind == _NOT:
+                    negate = cast(Token, frame.token)
+                    term = Negation(
+                        op="not",
+                        expr=expr,
+                        loc=SourceLoc(
+                            lineno=negate.lineno, start=negate.column, end=expr.loc.end
+                        ),
+                    )
+                else:
+                    call = cast(_Call, frame.call)
+                    call.args.append(expr)
+                    if code_at(self.idx) != RPAREN:
+                        self.expect(COMMA)
+                        frame = _Expr(_ARG, self.idx, call=call)
+                        frames.append(frame)
+                        break
+                    term = self._call(call)
+                frame = frames[-1]
+
+    def _peek_operator(self) -> str | None:
+        code = self.tokens.code_at(self.idx)
+        if code == CHARACTER:
+            value = cast(str, self.tokens.value_at(self.idx))
+            return value if value in OP_PRECEDENCE else None
+        return OPERATORS.get(code)
+
+    def _call(self, call: _Call) -> Call:
+        end_paren = self.expect(RPAREN)
+        return Call(
+            name=call.token.value,
+            sym=call.sym,
+            args=call.args,
+            loc=SourceLoc(
+                lineno=call.token.lineno, start=call.token.column, end=end_paren.column
+            ),
+        )
+
+    def parse_name(self) -> Name:
+        token, sym = cast(tuple[Token, int], self.accept_name())
+        return Name(value=token.value, sym=sym, loc=_loc_from_token(token))
+
+    def parse_number(self) -> Float | Integer:
+        base = self.expect(INTEGER)
+        code_at = self.tokens.code_at
+        if code_at(self.idx) == DOT and code_at(self.idx + 1) == INTEGER:
+            self.idx += 2
+            decimals = cast(Token, self.tokens.get(self.idx - 1))
+            return Float(
+                value=f"{base.value}.{decimals.value}",
+                loc=SourceLoc(
+                    lineno=base.lineno,
+                    start=base.column,
+                    end=decimals.column + len(decimals),
+                ),
+            )
+        return Integer(
+            value=int(base.value),
+            loc=SourceLoc(
+                lineno=base.lineno, start=base.column, end=base.column + len(base)
+            ),
+        )
+
+    def parse_char(self) -> Char | ErrorExpr:
+        token = self.expect(CHARACTER)
+        loc = SourceLoc(
+            lineno=token.lineno, start=token.column, end=token.column + len(token) + 1
+        )
+        if len(token.value) != 1:
+            return ErrorExpr(
+                err=WabbitSyntaxError.from_token(
+                    f"Found {len(token)} characters, only 1 is expected.",
+                    self.fname,
+                    self.source,
+                    token,
+                ),
+                loc=loc,
+            )
+        return Char(value=token.value, loc=loc)
+
+    def parse_bool(self) -> Boolean:
+        bool = self.expect(BOOL)
+        return Boolean(
+            value=cast(Literal["true", "false"], bool.value),
+            loc=SourceLoc(lineno=bool.lineno, start=bool.column, end=len(bool)),
+        )
+
+
+def _binary(op: str, lhs: Expression, rhs: Expression) -> Expression:
+    loc = SourceLoc(lineno=lhs.loc.lineno, start=lhs.loc.start, end=rhs.loc.end)
+    if op in BIN_OPS:
+        return BinOp(
+            op=cast(Literal["*", "/", "+", "-"], op), lhs=lhs, rhs=rhs, loc=loc
+        )
+    elif op in REL_OPS:
+        return RelationalOp(
+            op=cast(Literal["<", "<=", "==", ">", ">=", "!="], op),
+            lhs=lhs,
+            rhs=rhs,
+            loc=loc,
+        )
+    assert op in LOG_OPS
+    return LogicalOp(op=cast(Literal["and", "or"], op), lhs=lhs, rhs=rhs, loc=loc)
@@ -1,22 +1,12 @@
-from typing import cast
+from mmap import mmap
 
 from wabbit.exceptions import WabbitSyntaxError
 from wabbit.model import (
-    BoolGlobalName,
-    BoolLocalName,
-    BoolName,
     Branch,
-    CharGlobalName,
-    CharLocalName,
-    CharName,
-    FloatGlobalName,
-    FloatLocalName,
-    FloatName,
     Function,
+    GlobalName,
     GlobalVar,
-    IntGlobalName,
-    IntLocalName,
-    IntName,
+    LocalName,
     LocalVar,
     Name,
     Node,
@@ -24,26 +14,51 @@ from wabbit.model import (
     VariableDecl,
     While,
 )
-from wabbit.walker import Visitor, Walker
+from wabbit.symbols import SymbolTable
+from wabbit.walker import MODE, Visitor, run_passes
 
 
 class ResolveScopes(Visitor):
+    requires = ("deinit",)
+    produces = "resolved"
+    # `deinit_variables` adds the declarations and names it has to see.
+    fuses = False
+
     def __init__(
         self,
         to_visit: list[type[Node]],
         pre_visit: list[type[Node]],
-        source: str,
+        source: str | mmap,
         fname: str,
+        symbols: SymbolTable | None = None,
     ) -> None:
         self.errors = []
         self._visit_status: dict[int, bool] = {}
-        self._globals = set()
-        self._varnames = set()
         self._scope_level = 0
-        super().__init__(to_visit, pre_visit, source, fname)
+        super().__init__(to_visit, pre_visit, source, fname, symbols)
+        # Flags indexed by symbol id.
+        self._globals = bytearray(len(self.symbols))
+        self._varnames = bytearray(len(self.symbols))
+
+    @classmethod
+    def for_program(cls, program: Program) -> "ResolveScopes":
+        return cls(
+            to_visit=[
+                VariableDecl,
+                Branch,
+                While,
+                Function,
+                Name,
+            ],
+            pre_visit=[Function, Branch, While],
+            source=program.source,
+            fname=program.fname,
+            symbols=program.symbols,
+        )
 
     def visit_function(self, node: Function) -> Function:
-        self._varnames.update({arg.value for arg in node.args})
+        for arg in node.args:
+            self._varnames[arg.sym] = 1
         self._visit_status[id(node)] = not self._visit_status.get(id(node), True)
         self._scope_level += -1 if self._visit_status[id(node)] else 1
         return node
@@ -59,46 +74,22 @@ class ResolveScopes(Visitor):
         return node
 
     def visit_variabledecl(self, node: VariableDecl) -> VariableDecl:
-        self._varnames.add(node.name)
+        self._varnames[node.sym] = 1
         if self._scope_level > 0:
-            return LocalVar(name=node.name, loc=node.loc, type_=node.type_)
-        self._globals.add(node.name)
-        return GlobalVar(name=node.name, loc=node.loc, type_=node.type_)
-
-    def visit_intname(self, node: IntName) -> IntLocalName | IntGlobalName:
-        self._maybe_error(node)
-        if node.value in self._globals:
-            return IntGlobalName(value=node.value, loc=node.loc)
-        if self._scope_level > 0:
-            return IntLocalName(value=node.value, loc=node.loc)
-        return IntGlobalName(value=node.value, loc=node.loc)
-
-    def visit_floatname(self, node: FloatName) -> FloatLocalName | FloatGlobalName:
-        self._maybe_error(node)
-        if node.value in self._globals:
-            return FloatGlobalName(value=node.value, loc=node.loc)
-        if self._scope_level > 0:
-            return FloatLocalName(value=node.value, loc=node.loc)
-        return FloatGlobalName(value=node.value, loc=node.loc)
-
-    def visit_charname(self, node: CharName) -> CharLocalName | CharGlobalName:
-        self._maybe_error(node)
-        if node.value in self._globals:
-            return CharGlobalName(value=node.value, loc=node.loc)
-        if self._scope_level > 0:
-            return CharLocalName(value=node.value, loc=node.loc)
-        return CharGlobalName(value=node.value, loc=node.loc)
+            return LocalVar(
+                name=node.name, sym=node.sym, loc=node.loc, type_=node.type_
+            )
+        self._globals[node.sym] = 1
+        return GlobalVar(name=node.name, sym=node.sym, loc=node.loc, type_=node.type_)
 
-    def visit_boolname(self, node: BoolName) -> BoolLocalName | BoolGlobalName:
+    def visit_name(self, node: Name) -> LocalName | GlobalName:
         self._maybe_error(node)
-        if node.value in self._globals:
-            return BoolGlobalName(value=node.value, loc=node.loc)
-        if self._scope_level > 0:
-            return BoolLocalName(value=node.value, loc=node.loc)
-        return BoolGlobalName(value=node.value, loc=node.loc)
+        if self._scope_level > 0 and not self._globals[node.sym]:
+            return LocalName(value=node.value, sym=node.sym, loc=node.loc, ty=node.ty)
+        return GlobalName(value=node.value, sym=node.sym, loc=node.loc, ty=node.ty)
 
     def _maybe_error(self, node: Name) -> None:
-        if node.value not in self._varnames:
+        if not self._varnames[node.sym]:
             self.errors.append(
                 WabbitSyntaxError(
                     msg=f"Undeclared variable: `{node.value}`.",
@@ -111,25 +102,5 @@ class ResolveScopes(Visitor):
             )
 
 
-def resolve_scopes(program: Program) -> Program:
-    visitor = ResolveScopes(
-        to_visit=[
-            VariableDecl,
-            Branch,
-            While,
-            Function,
-            IntName,
-            FloatName,
-            CharName,
-            BoolName,
-        ],
-        pre_visit=[Function, Branch, While],
-        source=program.source,
-        fname=program.fname,
-    )
-    walker = Walker(visitor)
-    if visitor.errors:
-        for err in visitor.errors:
-            print(err)
-        exit()
-    return cast(Program, walker.traverse(program))
+def resolve_scopes(program: Program, mode: MODE = "cow") -> Program:
+    return run_passes(program, [ResolveScopes], mode)
@@ -0,0 +1,319 @@
+"""A compact binary encoding of `Program` trees, without pickle.
+
+The tree is written in pre-order as one flat array of ints: the kind of
+each node, its location, then its fields in declaration order, strings as
+indices into a table stored next to it. The array takes the narrowest item
+size that holds all of them, usually two bytes. Loading reads it back with
+a single `frombytes` and rebuilds the nodes straight from it, no tokenizing
+or parsing involved.
+"""
+
+import sys
+from array import array
+from dataclasses import fields
+from mmap import mmap
+from struct import Struct
+from typing import get_args, get_origin
+
+from wabbit import exceptions, model
+from wabbit.exceptions import WabbitError
+from wabbit.model import Integer, Node, Program, SourceLoc, Ty
+from wabbit.symbols import SymbolTable
+from wabbit.utils import gc_paused
+
+# Bump whenever the layout of the encoding or of a node class changes.
+FORMAT_VERSION = 1
+
+_MAGIC = b"WBAST"
+# Magic, format version, number of strings, size of their text, number of
+# ints and their typecode.
+_HEADER = Struct("<5sHIIIc")
+_TYPECODES = "bhiq"
+
+# Every node class by kind code.
+KINDS: tuple[type[Node], ...] = tuple(
+    cls
+    for cls in vars(model).values()
+    if isinstance(cls, type) and issubclass(cls, Node) and cls is not Program
+)
+KIND_CODES = {cls: code for code, cls in enumerate(KINDS)}
+
+TYS = tuple(Ty)
+TY_CODES = {ty: code for code, ty in enumerate(TYS)}
+
+ERRORS: tuple[type[WabbitError], ...] = tuple(
+    cls
+    for cls in vars(exceptions).values()
+    if isinstance(cls, type) and issubclass(cls, WabbitError)
+)
+ERROR_CODES = {cls: code for code, cls in enumerate(ERRORS)}
+
+# Integer literals that don't fit in an int32 are written as this, then as a
+# string.
+_WIDE = -(1 << 31)
+_INT32_MAX = (1 << 31) - 1
+
+# How each field is written, see `_layout`.
+_NODE, _NODES, _STR, _INT, _SYM, _TY, _ERR = range(7)
+
+
+def dump_program(program: Program) -> bytes:
+    """Encode `program`, without its source, spans or shared constants."""
+    writer = _Writer()
+    writer.write_list(program.statements)
+    writer.ints.extend(writer.string(name) for name in program.symbols.names)
+    writer.ints.append(len(program.symbols))
+    loc = program.loc
+    writer.ints.extend((loc.lineno, loc.start, loc.end))
+
+    lengths = array("I")
+    text = bytearray()
+    for string in writer.strings:
+        encoded = string.encode()
+        lengths.append(len(encoded))
+        text += encoded
+    values = writer.ints
+    low, high = (min(values), max(values)) if values else (0, 0)
+    for typecode in _TYPECODES:
+        ints = array(typecode)
+        bits = ints.itemsize * 8 - 1
+        if -(1 << bits) <= low and high < 1 << bits:
+            break
+    ints.extend(values)
+    if sys.byteorder == "big":
+        lengths.byteswap()
+        ints.byteswap()
+    header = _HEADER.pack(
+        _MAGIC,
+        FORMAT_VERSION,
+        len(writer.strings),
+        len(text),
+        len(ints),
+        typecode.encode(),
+    )
+    return b"".join((header, lengths.tobytes(), text, ints.tobytes()))
+
+
+def load_program(data: bytes, source: str | mmap, fname: str = "file.wb") -> Program:
+    """Decode a tree written by `dump_program`, of `source` in `fname`.
+
+    Raises a `ValueError` if `data` isn't an encoded tree of this version.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("not an encoded wabbit tree")
+    magic, version, n_strings, text_size, n_ints, typecode = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != FORMAT_VERSION:
+        raise ValueError("not an encoded wabbit tree of this version")
+    if typecode.decode() not in _TYPECODES:
+        raise ValueError("corrupt encoded wabbit tree")
+    lengths = array("I")
+    ints = array(typecode.decode())
+    offset = _HEADER.size
+    end = offset + n_strings * lengths.itemsize
+    lengths.frombytes(data[offset:end])
+    text = data[end : end + text_size].decode()
+    offset = end + text_size
+    if len(data) != offset + n_ints * ints.itemsize:
+        raise ValueError("truncated encoded wabbit tree")
+    ints.frombytes(data[offset:])
+    if sys.byteorder == "big":
+        lengths.byteswap()
+        ints.byteswap()
+
+    strings = []
+    start = 0
+    for length in lengths:
+        strings.append(text[start : start + length])
+        start += length
+
+    # The trailer sits at the end, read it back to front.
+    values = ints.tolist()
+    end = len(values) - 3
+    loc = SourceLoc(*values[end:])
+    n_names = values[end - 1]
+    symbols = SymbolTable()
+    for index in values[end - 1 - n_names : end - 1]:
+        symbols.intern(strings[index])
+
+    reader = _Reader(values, strings, source, fname)
+    with gc_paused():
+        statements = reader.read_list()
+    return Program(
+        loc=loc, statements=statements, source=source, fname=fname, symbols=symbols
+    )
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.ints: list[int] = []
+        self.strings: list[str] = []
+        self._indices: dict[str, int] = {}
+
+    def string(self, string: str) -> int:
+        index = self._indices.get(string)
+        if index is None:
+            index = self._indices[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def write_list(self, nodes: list) -> None:
+        """Write `nodes` and their subtrees, with an explicit stack.
+
+        A node's fields are pushed as they come: subtrees to write in turn,
+        everything else as a tuple of ints already encoded.
+        """
+        ints = self.ints
+        stack: list = [nodes]
+        while stack:
+            item = stack.pop()
+            if type(item) is tuple:
+                ints.extend(item)
+            elif type(item) is list:
+                ints.append(len(item))
+                stack.extend(reversed(item))
+            else:
+                kind = KIND_CODES[type(item)]
+                loc = item.loc
+                ints.extend((kind, loc.lineno, loc.start, loc.end))
+                fields_ = [
+                    value if how == _NODE or how == _NODES else self.encode(how, value)
+                    for name, how in _LAYOUTS[kind]
+                    for value in (getattr(item, name),)
+                ]
+                stack.extend(reversed(fields_))
+
+    def encode(self, how: int, value: object) -> tuple[int, ...]:
+        if how == _STR:
+            return (self.string(value),)
+        if how == _SYM:
+            return (value,)
+        if how == _TY:
+            return (TY_CODES[value],)
+        if how == _INT:
+            if _WIDE < value <= _INT32_MAX:
+                return (value,)
+            return (_WIDE, self.string(str(value)))
+        return (
+            ERROR_CODES[type(value)],
+            self.string(value._msg),
+            value.lineno,
+            value.start,
+            value.end,
+        )
+
+
+class _Reader:
+    def __init__(
+        self, values: list[int], strings: list[str], source: str | mmap, fname: str
+    ) -> None:
+        self._next = iter(values).__next__
+        self._strings = strings
+        self._source = source
+        self._fname = fname
+
+    def read_list(self) -> list:
+        """Read a list of nodes and their subtrees, with an explicit stack.
+
+        Each frame is a list with the number of nodes it still needs, or a
+        node with its fields still to read and the name of the one being read.
+        """
+        next_ = self._next
+        strings = self._strings
+        nodes: list = []
+        stack: list[list] = [[nodes, next_()]]
+        while True:
+            frame = stack[-1]
+            target = frame[0]
+            if type(target) is list:
+                if not frame[1]:
+                    stack.pop()
+                    if not stack:
+                        return nodes
+                    parent = stack[-1]
+                    setattr(parent[0], parent[2], target)
+                    continue
+                frame[1] -= 1
+                stack.append(self.start_node())
+                continue
+
+            for name, how in frame[1]:
+                if how == _NODE:
+                    frame[2] = name
+                    stack.append(self.start_node())
+                    break
+                if how == _NODES:
+                    frame[2] = name
+                    stack.append([[], next_()])
+                    break
+                if how == _STR:
+                    value = strings[next_()]
+                elif how == _SYM:
+                    value = next_()
+                elif how == _TY:
+                    value = TYS[next_()]
+                elif how == _INT:
+                    value = next_()
+                    if value == _WIDE:
+                        value = int(strings[next_()])
+                else:
+                    value = self.read_error()
+                setattr(target, name, value)
+            else:
+                stack.pop()
+                parent = stack[-1]
+                if type(parent[0]) is list:
+                    parent[0].append(target)
+                else:
+                    setattr(parent[0], parent[2], target)
+
+    def start_node(self) -> list:
+        """A frame for the next node, with its location read."""
+        next_ = self._next
+        kind = next_()
+        cls = KINDS[kind]
+        node = cls.__new__(cls)
+        node.loc = SourceLoc(next_(), next_(), next_())
+        return [node, iter(_LAYOUTS[kind]), None]
+
+    def read_error(self) -> WabbitError:
+        next_ = self._next
+        cls = ERRORS[next_()]
+        err = cls.__new__(cls)
+        err._msg = self._strings[next_()]
+        err.lineno, err.start, err.end = next_(), next_(), next_()
+        err._err_msg = err._make_err_msg(self._fname, self._source)
+        return err
+
+
+def _layout(cls: type[Node]) -> tuple[tuple[str, int], ...]:
+    """How each field of `cls` but its location is written, in order."""
+    layout = []
+    for f in fields(cls):
+        type_ = f.type
+        if f.name == "loc":
+            continue
+        if f.name == "sym":
+            how = _SYM
+        elif cls is Integer and f.name == "value":
+            how = _INT
+        elif type_ is Ty:
+            how = _TY
+        elif type_ is WabbitError:
+            how = _ERR
+        elif get_origin(type_) is list:
+            how = _NODES
+        elif isinstance(type_, type) and issubclass(type_, Node):
+            how = _NODE
+        elif (
+            type_ is str
+            or get_origin(type_) is not None
+            and all(isinstance(arg, str) for arg in get_args(type_))
+        ):
+            how = _STR
+        else:
+            raise TypeError(f"can't encode {cls.__name__}.{f.name}")
+        layout.append((f.name, how))
+    return tuple(layout)
+
+
+_LAYOUTS = [_layout(cls) for cls in KINDS]
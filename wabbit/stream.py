@@ -0,0 +1,192 @@
+from collections import deque
+from collections.abc import Iterable, Iterator
+from mmap import ACCESS_READ, mmap
+
+from wabbit.exceptions import WabbitSyntaxError
+from wabbit.symbols import SymbolTable
+from wabbit.tokenizer import TOKEN_TYPES, BraceMatcher, Token, TokenTable, lex_chunk
+
+CHUNK_SIZE = 1 << 16
+
+
+class MappedSource(mmap):
+    """A read-only mapping of a source file, shared rather than copied."""
+
+    def __copy__(self) -> "MappedSource":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "MappedSource":
+        return self
+
+
+def open_source(path: str) -> "str | mmap":
+    """Map `path` read-only. Empty files can't be mapped and are returned as `""`.
+
+    The mapping is the `source` of the trees made from it, not closed before
+    they are done with it but released along with them.
+    """
+    with open(path, "rb") as f:
+        try:
+            return MappedSource(f.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            return ""
+
+
+def iter_token_chunks(
+    source: "str | mmap",
+    fname: str,
+    chunk_size: int = CHUNK_SIZE,
+    symbols: SymbolTable | None = None,
+) -> Iterator[TokenTable]:
+    """Lazily lex a mapped source file, one newline-terminated chunk at a time.
+
+    Only a single chunk is decoded at once, so memory use is independent of the
+    size of the file. Errors are reported once the whole file has been lexed,
+    same as `tokenize`. All chunks share one `BraceMatcher`, so the partner of
+    a brace is only known once the chunk holding it has been lexed.
+    """
+    if isinstance(source, str):
+        source = source.encode()
+    if symbols is None:
+        symbols = SymbolTable()
+    braces = BraceMatcher()
+    n_tokens = 0
+    errors: list[WabbitSyntaxError] = []
+    size = len(source)
+    pos = 0
+    offset = 0
+    lineno = 1
+    last_line_pos = 0
+    to_read = chunk_size
+    while pos < size:
+        end = min(size, pos + to_read)
+        if end < size:
+            end = source.find(b"\n", end) + 1 or size
+        text = source[pos:end].decode()
+        table, consumed, lineno, last_line_pos = lex_chunk(
+            text,
+            fname,
+            source,
+            errors,
+            offset,
+            lineno,
+            last_line_pos,
+            partial=end < size,
+            symbols=symbols,
+            braces=braces,
+            base=n_tokens,
+        )
+        if consumed == len(text):
+            pos = end
+            to_read = chunk_size
+        elif consumed:
+            pos += len(text[:consumed].encode())
+        else:
+            # A `'` with no closing quote in sight, look further ahead.
+            to_read *= 2
+        offset += consumed
+        if len(table):
+            n_tokens += len(table)
+            yield table
+
+    if errors:
+        for err in errors:
+            print(err)
+        exit()
+
+
+class TokenCursor:
+    """Random access into a stream of token tables, over a window of chunks.
+
+    Chunks are pulled from the underlying iterator as they are asked for and
+    are kept around until `release` is called, so the parser can backtrack to
+    any index after the last released one.
+    """
+
+    def __init__(
+        self,
+        tokens: TokenTable | Iterable[TokenTable],
+        symbols: SymbolTable | None = None,
+    ) -> None:
+        if isinstance(tokens, TokenTable):
+            symbols = tokens.symbols
+            tokens = [tokens]
+        # The table the `NAME` tokens of every chunk are interned in.
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self._chunks: deque[TokenTable] = deque()
+        self._more = iter(tokens)
+        # Absolute index of the first token of `_chunks[0]`, and one past the last.
+        self._base = 0
+        self._end = 0
+        # Most lookups hit the newest chunk, keep it at hand.
+        self._last = TokenTable()
+        self._last_types = self._last.types
+        self._last_base = 0
+
+    def locate(self, idx: int) -> tuple[TokenTable, int] | None:
+        """The chunk holding token `idx` and its index within the chunk."""
+        pos = idx - self._last_base
+        if 0 <= pos < len(self._last_types):
+            return self._last, pos
+        while idx >= self._end:
+            chunk = next(self._more, None)
+            if chunk is None:
+                return None
+            self._chunks.append(chunk)
+            self._last = chunk
+            self._last_types = chunk.types
+            self._last_base = self._end
+            self._end += len(chunk)
+        pos = idx - self._last_base
+        if pos >= 0:
+            return self._last, pos
+        pos = idx - self._base
+        for chunk in self._chunks:
+            if pos < len(chunk):
+                return chunk, pos
+            pos -= len(chunk)
+        raise IndexError(f"Token {idx} has already been released")
+
+    def get(self, idx: int) -> Token | None:
+        if found := self.locate(idx):
+            return found[0][found[1]]
+        return None
+
+    def type_at(self, idx: int) -> str | None:
+        pos = idx - self._last_base
+        if 0 <= pos < len(self._last_types):
+            return TOKEN_TYPES[self._last_types[pos]]
+        if found := self.locate(idx):
+            return TOKEN_TYPES[found[0].types[found[1]]]
+        return None
+
+    def code_at(self, idx: int) -> int:
+        """Type code of token `idx`, or -1 past the last token."""
+        pos = idx - self._last_base
+        if 0 <= pos < len(self._last_types):
+            return self._last_types[pos]
+        if found := self.locate(idx):
+            return found[0].types[found[1]]
+        return -1
+
+    def value_at(self, idx: int) -> str | None:
+        if found := self.locate(idx):
+            return found[0].value(found[1])
+        return None
+
+    def sym_at(self, idx: int) -> int:
+        if found := self.locate(idx):
+            return found[0].syms[found[1]]
+        return -1
+
+    def partner_at(self, idx: int) -> int:
+        """Index of the brace or paren paired with the one at `idx`, or -1."""
+        if found := self.locate(idx):
+            return found[0].partners[found[1]]
+        return -1
+
+    def release(self, idx: int) -> None:
+        """Drop every buffered chunk that ends in front of `idx`."""
+        chunks = self._chunks
+        while len(chunks) > 1 and self._base + len(chunks[0]) <= idx:
+            self._base += len(chunks.popleft())
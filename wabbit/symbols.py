@@ -0,0 +1,44 @@
+class SymbolTable:
+    """The names of one compilation, interned as dense integer ids.
+
+    Passes index plain lists with these ids instead of hashing names over and
+    over. The names themselves are only looked up again to emit code.
+    """
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self._ids: dict[str, int] = {}
+        self._mangled: dict[str, list[str | None]] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, sym: int) -> str:
+        return self.names[sym]
+
+    def __copy__(self) -> "SymbolTable":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "SymbolTable":
+        # Ids stay valid across copies of the tree, so every copy shares the table.
+        return self
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.names)} names)"
+
+    def intern(self, name: str) -> int:
+        sym = self._ids.get(name)
+        if sym is None:
+            sym = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return sym
+
+    def mangled(self, prefix: str, sym: int) -> str:
+        """`prefix` followed by the name of `sym`, built once per prefix and id."""
+        cache = self._mangled.setdefault(prefix, [])
+        if sym >= len(cache):
+            cache.extend([None] * (len(self.names) - len(cache)))
+        name = cache[sym]
+        if name is None:
+            name = cache[sym] = f"{prefix}{self.names[sym]}"
+        return name
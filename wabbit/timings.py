@@ -0,0 +1,248 @@
+"""Where the time and memory of a compilation go, see `--timings`, `--profile`
+and `--memory` in `wabbit.main`.
+
+Stages time themselves with `stage`, which does nothing unless a `Timings`
+is recording.
+"""
+
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from pathlib import Path
+from pstats import Stats
+from typing import Iterator, cast
+
+from wabbit.model import Node
+
+# The `Timings` stages report to, if any.
+_active: "Timings | None" = None
+
+
+@dataclass
+class Stage:
+    name: str
+    wall: float = 0.0
+    # Of this process and the subprocesses it waited for, like clang.
+    cpu: float = 0.0
+    nodes_in: int | None = None
+    nodes_out: int | None = None
+    # The tree the stage made, counted once its time is taken.
+    output: object = None
+    # Bytes allocated at most during the stage, over what there was before it.
+    peak: int | None = None
+    # Bytes allocated during the stage and still held after it.
+    retained: int | None = None
+    # Of those, the most by file allocating them.
+    retained_by_file: dict[str, int] | None = None
+    # The nodes of the tree made by class.
+    node_classes: dict[str, int] | None = None
+
+
+class Timings:
+    """Records each stage run while it is entered, profiling them with
+    `profile` and tracing their memory with `memory`.
+
+    Tracing memory makes everything a lot slower, the times it records with
+    it are only good for comparing stages.
+    """
+
+    def __init__(self, profile: bool = False, memory: bool = False) -> None:
+        self.stages: list[Stage] = []
+        self._profile = profile
+        self._profiles: list[tuple[str, cProfile.Profile]] = []
+        self._memory = memory
+        self._snapshot: tracemalloc.Snapshot | None = None
+
+    def __enter__(self) -> "Timings":
+        global _active
+        self._outer, _active = _active, self
+        self._traced = self._memory and not tracemalloc.is_tracing()
+        if self._traced:
+            tracemalloc.start()
+        if self._memory:
+            self._snapshot = tracemalloc.take_snapshot()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        global _active
+        _active = self._outer
+        self._snapshot = None
+        if self._traced:
+            tracemalloc.stop()
+
+    def to_json(self, **info: object) -> str:
+        """The stages as JSON, along with `info`."""
+        stages = [
+            {
+                "stage": s.name,
+                "wall": s.wall,
+                "cpu": s.cpu,
+                **({"nodes_in": s.nodes_in} if s.nodes_in is not None else {}),
+                **({"nodes_out": s.nodes_out} if s.nodes_out is not None else {}),
+                **(
+                    {
+                        "peak_bytes": s.peak,
+                        "retained_bytes": s.retained,
+                        "retained_by_file": s.retained_by_file,
+                    }
+                    if s.peak is not None
+                    else {}
+                ),
+                **({"node_classes": s.node_classes} if s.node_classes else {}),
+            }
+            for s in self.stages
+        ]
+        total = {
+            "wall": sum(s.wall for s in self.stages),
+            "cpu": sum(s.cpu for s in self.stages),
+        }
+        return json.dumps({**info, "stages": stages, "total": total}, indent=2)
+
+    def collapsed_stacks(self) -> list[str]:
+        """The profiles as collapsed stacks in microseconds, one root frame per
+        stage, as flamegraph tools read them.
+
+        cProfile only keeps who called whom, so a function's time is split
+        between its callers in proportion to the time it spent under each.
+        """
+        lines: list[str] = []
+        for name, profile in self._profiles:
+            for stack, seconds in _stacks(Stats(profile).stats):  # type: ignore[attr-defined]
+                micros = round(seconds * 1e6)
+                if micros:
+                    lines.append(f"{';'.join([name, *stack])} {micros}")
+        return lines
+
+    def _retained_by_file(self, limit: int = 10) -> dict[str, int]:
+        """The files that allocated the most still held since the last call."""
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+        diff = snapshot.compare_to(
+            cast(tracemalloc.Snapshot, self._snapshot), "filename"
+        )
+        self._snapshot = snapshot
+        return {
+            str(stat.traceback[0].filename): stat.size_diff
+            for stat in sorted(diff, key=lambda stat: -stat.size_diff)[:limit]
+            if stat.size_diff > 0
+        }
+
+
+@contextmanager
+def stage(name: str, tree: Node | None = None) -> Iterator[Stage]:
+    """Time the block as `name`, counting the nodes of `tree` going in and of
+    `Stage.output` coming out.
+    """
+    timings = _active
+    entry = Stage(name)
+    if timings is None:
+        yield entry
+        return
+    if tree is not None:
+        entry.nodes_in = count_nodes(tree)
+    profile = cProfile.Profile() if timings._profile else None
+    if timings._memory:
+        tracemalloc.reset_peak()
+        memory = tracemalloc.get_traced_memory()[0]
+    wall, cpu = time.perf_counter(), _cpu_time()
+    if profile is not None:
+        profile.enable()
+    try:
+        yield entry
+    finally:
+        if profile is not None:
+            profile.disable()
+        entry.wall = time.perf_counter() - wall
+        entry.cpu = _cpu_time() - cpu
+        if timings._memory:
+            current, peak = tracemalloc.get_traced_memory()
+            entry.peak, entry.retained = peak - memory, current - memory
+            entry.retained_by_file = timings._retained_by_file()
+        if isinstance(entry.output, Node):
+            entry.nodes_out = count_nodes(entry.output)
+            if timings._memory:
+                entry.node_classes = count_node_classes(entry.output)
+        entry.output = None
+        timings.stages.append(entry)
+        if profile is not None:
+            timings._profiles.append((name, profile))
+
+
+def count_nodes(tree: Node) -> int:
+    """The nodes in `tree`, a shared node counts once per use."""
+    count = 0
+    stack: list = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, Node):
+            count += 1
+            stack.extend(getattr(item, f.name) for f in fields(item))
+    return count
+
+
+def count_node_classes(tree: Node) -> dict[str, int]:
+    """The nodes in `tree` by class, most common first."""
+    counts: Counter[str] = Counter()
+    stack: list = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, Node):
+            counts[type(item).__name__] += 1
+            stack.extend(getattr(item, f.name) for f in fields(item))
+    return dict(counts.most_common())
+
+
+def _cpu_time() -> float:
+    # `os.times` only counts in clock ticks, good enough for subprocesses.
+    children = os.times()
+    return time.process_time() + children.children_user + children.children_system
+
+
+# (file, line, function) of a function in cProfile's stats.
+_Func = tuple[str, int, str]
+
+
+def _stacks(stats: dict) -> Iterator[tuple[list[str], float]]:
+    """The stacks and the time spent in the last frame of each, see
+    `Timings.collapsed_stacks`.
+    """
+    callees: dict[_Func, list[_Func]] = {}
+    for func, (*_, callers) in stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+    roots = [func for func, (*_, callers) in stats.items() if not callers]
+    # The share of the cumulative time of a function spent down a path.
+    todo: list[tuple[list[_Func], float]] = [([func], 1.0) for func in roots]
+    while todo:
+        path, share = todo.pop()
+        func = path[-1]
+        yield [_frame(f) for f in path], stats[func][2] * share
+        for callee in callees.get(func, ()):
+            # Recursion stays in the frame it started in.
+            if callee in path:
+                continue
+            under = share * stats[callee][4][func][3]
+            # Paths under a microsecond don't show up anyway, and there can be
+            # very many of them.
+            if under >= 1e-6:
+                todo.append(([*path, callee], under / stats[callee][3]))
+
+
+def _frame(func: _Func) -> str:
+    file, line, name = func
+    if file == "~":
+        return name
+    return f"{Path(file).stem}:{name}:{line}"
@@ -1,6 +1,14 @@
+import re
+from array import array
+from collections.abc import Iterator
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Literal
 
 from wabbit.exceptions import WabbitSyntaxError
+from wabbit.symbols import SymbolTable
+
+if TYPE_CHECKING:
+    from mmap import mmap
 
 KEYWORDS = {
     "var": "VAR",
@@ -48,6 +56,30 @@ TWO_CHAR_SYMBOLS = {
 }
 
 
+TOKEN_TYPES = list(
+    dict.fromkeys(
+        [
+            "NAME",
+            "INTEGER",
+            "CHARACTER",
+            *KEYWORDS.values(),
+            *ONE_CHAR_SYMBOLS.values(),
+            *TWO_CHAR_SYMBOLS.values(),
+        ]
+    )
+)
+TYPE_CODES = {type_: code for code, type_ in enumerate(TOKEN_TYPES)}
+NAME = TYPE_CODES["NAME"]
+INTEGER = TYPE_CODES["INTEGER"]
+CHARACTER = TYPE_CODES["CHARACTER"]
+LPAREN = TYPE_CODES["LPAREN"]
+RPAREN = TYPE_CODES["RPAREN"]
+LBRACE = TYPE_CODES["LBRACE"]
+RBRACE = TYPE_CODES["RBRACE"]
+SEMI = TYPE_CODES["SEMI"]
+ELSE = TYPE_CODES["ELSE"]
+
+
 @dataclass
 class Token:
     type_: str
@@ -59,7 +91,283 @@ class Token:
         return len(self.value)
 
 
-def tokenize(source: str, fname: str = "file.wb") -> list[Token]:
+class TokenTable:
+    """Tokens stored column-wise, as offsets into `source`.
+
+    `Token` objects are only created when indexing into the table, e.g. for
+    error reporting. `NAME` tokens also carry their id in `symbols`, every
+    other token has a symbol of -1. Braces and parens carry the index of their
+    partner in `partners`, see `BraceMatcher`.
+    """
+
+    def __init__(
+        self,
+        source: str = "",
+        symbols: SymbolTable | None = None,
+        braces: "BraceMatcher | None" = None,
+        base: int = 0,
+    ) -> None:
+        self.source = source
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.braces = braces if braces is not None else BraceMatcher()
+        # Index of the first token in the whole stream, for chunked tables.
+        self.base = base
+        self.types = array("B")
+        self.starts = array("L")
+        self.ends = array("L")
+        self.linenos = array("I")
+        self.columns = array("I")
+        self.syms = array("i")
+        self.partners = array("i")
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, idx: int) -> Token:
+        return Token(
+            TOKEN_TYPES[self.types[idx]],
+            self.value(idx),
+            self.linenos[idx],
+            self.columns[idx],
+        )
+
+    def __iter__(self) -> Iterator[Token]:
+        return (self[idx] for idx in range(len(self)))
+
+    def type_(self, idx: int) -> str:
+        return TOKEN_TYPES[self.types[idx]]
+
+    def value(self, idx: int) -> str:
+        if self.types[idx] == CHARACTER:
+            literal = self.source[self.starts[idx] + 1 : self.ends[idx] - 1]
+            return literal.encode().decode("unicode_escape")
+        return self.source[self.starts[idx] : self.ends[idx]]
+
+    def length(self, idx: int) -> int:
+        """Same as `len(self[idx])`."""
+        if self.types[idx] == CHARACTER:
+            return len(self.value(idx))
+        return self.ends[idx] - self.starts[idx]
+
+    def append(
+        self, code: int, start: int, end: int, lineno: int, column: int, sym: int = -1
+    ):
+        self.types.append(code)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.linenos.append(lineno)
+        self.columns.append(column)
+        self.syms.append(sym)
+        self.partners.append(-1)
+
+    def slice(self, start: int, end: int) -> "TokenTable":
+        """Tokens `start` to `end` as a table of their own, over the same source.
+
+        Partners outside of the slice are dropped.
+        """
+        table = TokenTable(self.source, self.symbols)
+        table.types = self.types[start:end]
+        table.starts = self.starts[start:end]
+        table.ends = self.ends[start:end]
+        table.linenos = self.linenos[start:end]
+        table.columns = self.columns[start:end]
+        table.syms = self.syms[start:end]
+        first = self.base + start
+        table.partners = array(
+            "i",
+            (
+                partner - first if first <= partner < first + len(table.types) else -1
+                for partner in self.partners[start:end]
+            ),
+        )
+        return table
+
+
+class BraceMatcher:
+    """Pairs up `(` with `)` and `{` with `}` while tokens are being lexed.
+
+    Both tokens of a pair get the index of the other one in `partners`, indices
+    count from the start of the stream so pairs can span chunks. Tokens without
+    a partner are kept for `validate_braces` to report.
+    """
+
+    def __init__(self) -> None:
+        self.parens: list[tuple[TokenTable, int]] = []
+        self.curlies: list[tuple[TokenTable, int]] = []
+        # Closing tokens with no opening one, in the order they were found.
+        self.unmatched: list[tuple[TokenTable, int]] = []
+
+    def pair(self, table: TokenTable, idx: int) -> None:
+        code = table.types[idx]
+        if code == LPAREN:
+            self.parens.append((table, idx))
+        elif code == LBRACE:
+            self.curlies.append((table, idx))
+        else:
+            opened = self.parens if code == RPAREN else self.curlies
+            if not opened:
+                self.unmatched.append((table, idx))
+                return
+            other, other_idx = opened.pop()
+            other.partners[other_idx] = table.base + idx
+            table.partners[idx] = other.base + other_idx
+
+
+def statement_spans(
+    table: TokenTable, start: int = 0, end: int | None = None
+) -> Iterator[tuple[int, int]]:
+    """Split the tokens in `table[start:end]` into ranges of whole statements.
+
+    Anything in parens or braces is skipped by jumping straight to the partner
+    token, so only the tokens at the outermost level are looked at.
+    """
+    types = table.types
+    partners = table.partners
+    end = len(types) if end is None else end
+    idx = start
+    while idx < end:
+        code = types[idx]
+        if code == SEMI:
+            yield start, idx + 1
+            start = idx + 1
+        elif code == LPAREN or code == LBRACE:
+            partner = partners[idx]
+            idx = end - 1 if partner < 0 else partner - table.base
+            if code == LBRACE and (idx + 1 >= end or types[idx + 1] != ELSE):
+                yield start, idx + 1
+                start = idx + 1
+        idx += 1
+    if start < end:
+        yield start, end
+
+
+# One alternative per token class, tried in the same order as `tokenize_scan`.
+# Horizontal whitespace is consumed as a prefix of every match, so `finditer`
+# only stops on tokens, newlines and comments.
+_TOKEN_PATTERN = re.compile(
+    r"[^\S\n]*(?:"
+    r"(?P<NEWLINE>\n)"
+    r"|(?P<WORD>[^\W\d_]\w*)"
+    r"|(?P<INTEGER>\d+)"
+    r"|(?P<CHARACTER>'[^']*')"
+    r"|(?P<COMMENT>//[^\n]*)"
+    r"|(?P<SYMBOL>"
+    + "|".join(re.escape(sym) for sym in TWO_CHAR_SYMBOLS if sym != "//")
+    + "|["
+    + "".join(re.escape(sym) for sym in ONE_CHAR_SYMBOLS)
+    + "])"
+    r"|(?P<ERROR>\S)"
+    r")"
+)
+_WORD_CODES = {word: TYPE_CODES[type_] for word, type_ in KEYWORDS.items()}
+_SYMBOL_CODES = {
+    symbol: TYPE_CODES[type_]
+    for symbol, type_ in (ONE_CHAR_SYMBOLS | TWO_CHAR_SYMBOLS).items()
+}
+_BRACE_CODES = {LPAREN, RPAREN, LBRACE, RBRACE}
+
+
+def tokenize(
+    source: str,
+    fname: str = "file.wb",
+    engine: Literal["regex", "scan"] = "regex",
+) -> list[Token]:
+    if engine == "scan":
+        return tokenize_scan(source, fname)
+    if engine == "regex":
+        return tokenize_regex(source, fname)
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+def tokenize_regex(source: str, fname: str = "file.wb") -> list[Token]:
+    return list(tokenize_table(source, fname))
+
+
+def tokenize_table(
+    source: str, fname: str = "file.wb", symbols: SymbolTable | None = None
+) -> TokenTable:
+    errors: list[WabbitSyntaxError] = []
+    table, *_ = lex_chunk(source, fname, source, errors, symbols=symbols)
+    if errors:
+        for err in errors:
+            print(err)
+        exit()
+    return table
+
+
+def lex_chunk(
+    text: str,
+    fname: str,
+    source: "str | mmap",
+    errors: list[WabbitSyntaxError],
+    offset: int = 0,
+    lineno: int = 1,
+    last_line_pos: int = 0,
+    partial: bool = False,
+    symbols: SymbolTable | None = None,
+    braces: BraceMatcher | None = None,
+    base: int = 0,
+) -> tuple[TokenTable, int, int, int]:
+    """Lex `text`, which starts `offset` characters into `source`.
+
+    Returns a table of the tokens (offsets relative to `text`), the number of
+    characters consumed and the `lineno` and `last_line_pos` to resume from.
+    With `partial`, lexing stops in front of an unterminated `'` so the caller
+    can retry once more of the source is known. `base` is the number of tokens
+    lexed from `source` so far.
+    """
+    table = TokenTable(text, symbols, braces, base)
+    append = table.append
+    intern = table.symbols.intern
+    pair = table.braces.pair
+    for match in _TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        start = match.start(kind)
+        end = match.end()
+        if kind == "NEWLINE":
+            lineno += 1
+            last_line_pos = offset + start
+
+        elif kind == "WORD":
+            word = match[kind]
+            code = _WORD_CODES.get(word, NAME)
+            column = offset + start - last_line_pos
+            if code == NAME:
+                append(NAME, start, end, lineno, column, intern(word))
+            else:
+                append(code, start, end, lineno, column)
+
+        elif kind == "SYMBOL":
+            code = _SYMBOL_CODES[match[kind]]
+            append(code, start, end, lineno, offset + start - last_line_pos)
+            if code in _BRACE_CODES:
+                pair(table, len(table.types) - 1)
+
+        elif kind == "INTEGER":
+            append(INTEGER, start, end, lineno, offset + start - last_line_pos)
+
+        elif kind == "CHARACTER":
+            append(CHARACTER, start, end, lineno, offset + start - last_line_pos)
+
+        elif kind == "ERROR" and partial and match[kind] == "'":
+            return table, start, lineno, last_line_pos
+
+        elif kind == "ERROR":
+            errors.append(
+                WabbitSyntaxError(
+                    f"Invalid character: `{match[kind]}`",
+                    fname,
+                    source,
+                    lineno,
+                    offset + start - last_line_pos,
+                    offset + start - last_line_pos + 1,
+                )
+            )
+
+    return table, len(text), lineno, last_line_pos
+
+
+def tokenize_scan(source: str, fname: str = "file.wb") -> list[Token]:
     tokens = []
     n = 0
     lineno = 1
@@ -124,7 +432,7 @@ def tokenize(source: str, fname: str = "file.wb") -> list[Token]:
 
 
 def peek(start: int, num: int, source: str) -> str | None:
-    if start + num < len(source) - num:
+    if start + num < len(source):
         return source[start : start + num + 1]
     return None
 
@@ -1,5 +1,3 @@
-from typing import cast
-
 from wabbit.model import (
     Function,
     FunctionArg,
@@ -10,16 +8,22 @@ from wabbit.model import (
     SourceLoc,
     Type,
 )
-from wabbit.walker import Visitor, Walker
+from wabbit.walker import MODE, Visitor, run_passes
 
 
 class UnscriptToplevel(Visitor):
+    requires = ("resolved",)
+    produces = "unscripted"
+    to_visit = (Program,)
+
     def visit_program(self, node: Program) -> Program:
         new_func = Function(
             name="main",
+            sym=node.symbols.intern("main"),
             args=[
                 FunctionArg(
                     value="_",
+                    sym=node.symbols.intern("_"),
                     type_=Type(value="int", loc=SourceLoc(0, 0, 0)),
                     loc=SourceLoc(0, 0, 0),
                 )
@@ -44,10 +48,5 @@ class UnscriptToplevel(Visitor):
         return node
 
 
-def unscript_toplevel(program: Program) -> Program:
-    walker = Walker(
-        UnscriptToplevel(
-            to_visit=[Program], pre_visit=[], source=program.source, fname=program.fname
-        )
-    )
-    return cast(Program, walker.traverse(program))
+def unscript_toplevel(program: Program, mode: MODE = "cow") -> Program:
+    return run_passes(program, [UnscriptToplevel], mode)
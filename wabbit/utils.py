@@ -1,3 +1,4 @@
+import gc
 from contextlib import contextmanager
 
 
@@ -8,12 +9,33 @@ class Lines(list[str]):
 
     @contextmanager
     def indent(self):
-        self._indentation += 4
+        self.push_indent()
         try:
             yield
         finally:
-            self._indentation -= 4
+            self.pop_indent()
+
+    def push_indent(self) -> None:
+        self._indentation += 4
+
+    def pop_indent(self) -> None:
+        self._indentation -= 4
 
     def append(self, line: str) -> None:
         indented = f"{self._indentation * ' '}{line}"
         return super().append(indented)
+
+
+@contextmanager
+def gc_paused():
+    """Pause the cyclic GC while building lots of nodes, none of them garbage.
+
+    Left enabled, it scans the whole heap over and over as they are created.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
@@ -1,20 +1,15 @@
 from wabbit.model import ErrorExpr, Program
-from wabbit.walker import Visitor, Walker
+from wabbit.walker import MODE, Visitor, run_passes
 
 
 class Validator(Visitor):
+    produces = "validated"
+    to_visit = (ErrorExpr,)
+
     def visit_errorexpr(self, node: ErrorExpr) -> ErrorExpr:
         self.errors.append(node.err)
         return node
 
 
-def validate_ast(ast: Program):
-    visitor = Validator(
-        to_visit=[ErrorExpr], pre_visit=[], source=ast.source, fname=ast.fname
-    )
-    Walker(visitor).traverse(ast)
-    if visitor.errors:
-        for err in visitor.errors:
-            print(err)
-        exit()
-    return ast
+def validate_ast(ast: Program, mode: MODE = "cow") -> Program:
+    return run_passes(ast, [Validator], mode)
@@ -1,72 +1,465 @@
-from copy import deepcopy
 from dataclasses import fields
-from typing import Callable, Literal, Sequence, cast
+from functools import cache, partial
+from mmap import mmap
+from typing import Callable, Literal, Sequence, TypeVar, cast, get_args, get_origin
 
-from wabbit.model import Expression, Node
+from wabbit.model import Interner, Node, Program
+from wabbit.symbols import SymbolTable
+from wabbit.timings import stage
 
 DIRECTION = Literal["backwards", "forwards", "both"]
+# How `Walker.traverse` treats the nodes it is given.
+MODE = Literal["copy", "cow", "in_place"]
+
+_N = TypeVar("_N", bound=Node)
 
 
 class Visitor:
+    # What the pass needs to hold for the tree before it runs, and what holds
+    # after, see `wabbit.pipeline`.
+    requires: tuple[str, ...] = ()
+    produces: str = ""
+    # Whether the visitor can share a walk with the ones before it, see
+    # `run_passes`. Not if it has to see all of the tree they return.
+    fuses = True
+    # The classes visited after and before their children, for the default
+    # `for_program`.
+    to_visit: Sequence[type[Node]] = ()
+    to_pre_visit: Sequence[type[Node]] = ()
+
     def __init__(
         self,
         to_visit: list[type[Node]],
         pre_visit: list[type[Node]],
-        source: str,
+        source: str | mmap,
         fname: str,
+        symbols: SymbolTable | None = None,
     ) -> None:
         self.to_visit = to_visit
         self.to_pre_visit = pre_visit
         self.source = source
         self.fname = fname
+        self.symbols = symbols if symbols is not None else SymbolTable()
         self.errors = []
 
+    @classmethod
+    def for_program(cls, program: Program) -> "Visitor":
+        """The visitor of its pass over `program`."""
+        return cls(
+            to_visit=list(cls.to_visit),
+            pre_visit=list(cls.to_pre_visit),
+            source=program.source,
+            fname=program.fname,
+            symbols=program.symbols,
+        )
 
-class Walker:
-    def __init__(self, visitor: Visitor) -> None:
-        self._pre_call: dict[type[Node], Callable[[Node], Node | list[Node]]] = {
-            node_type: getattr(visitor, f"visit_{node_type.__name__.lower()}")
-            for node_type in visitor.to_pre_visit
+    def hooks(self) -> tuple[dict[type[Node], Callable], dict[type[Node], Callable]]:
+        """The callbacks before and after the children of each class visited."""
+        return (
+            {
+                node_type: getattr(self, f"visit_{node_type.__name__.lower()}")
+                for node_type in self.to_pre_visit
+            },
+            {
+                node_type: getattr(self, f"visit_{node_type.__name__.lower()}")
+                for node_type in self.to_visit
+            },
+        )
+
+    def report_errors(self) -> None:
+        if self.errors:
+            for err in self.errors:
+                print(err)
+            exit()
+
+
+class FusedVisitor(Visitor):
+    """Several visitors taking turns at each node, in the order given.
+
+    Each one gets what the ones before it returned for the node, and the
+    nodes of any list returned, but not the children of new nodes. What
+    callbacks before the children return is ignored.
+    """
+
+    def __init__(self, visitors: Sequence[Visitor]) -> None:
+        first = visitors[0]
+        super().__init__([], [], first.source, first.fname, first.symbols)
+        self.visitors = visitors
+
+    def hooks(self) -> tuple[dict[type[Node], Callable], dict[type[Node], Callable]]:
+        all_pre, all_post = zip(*(visitor.hooks() for visitor in self.visitors))
+        pre = {
+            node_type: partial(
+                _run_pre, [hooks[node_type] for hooks in all_pre if node_type in hooks]
+            )
+            for node_type in dict.fromkeys(t for hooks in all_pre for t in hooks)
         }
-        self._to_call: dict[type[Node], Callable[[Node], Node | list[Node]]] = {
-            node_type: getattr(visitor, f"visit_{node_type.__name__.lower()}")
-            for node_type in visitor.to_visit
+        post = {
+            node_type: partial(_run_post, all_post)
+            for node_type in dict.fromkeys(t for hooks in all_post for t in hooks)
         }
+        return pre, post
 
-    def traverse(self, node: Node | Sequence[Node]) -> Node | Sequence[Node]:
-        match node:
-            case list():
-                return self._traverse_nodes(node)
-            case Node():
-                return self._traverse_node(node)
-            case _:
-                return node
-
-    def _traverse_node(self, node: Node):
-        match_res = None
-        new_node = deepcopy(node)
-        if not isinstance(node, Node):
-            return node
-
-        if func := self._pre_call.get(type(node)):
-            match_res = cast(Expression, func(new_node))
-
-        for field in fields(node):
-            val = getattr(node, field.name)
-            res = self.traverse(val)
-            setattr(new_node, field.name, res)
-
-        if func := self._to_call.get(type(node)):
-            match_res = cast(Expression, func(new_node))
-
-        return match_res or new_node
-
-    def _traverse_nodes(self, nodes: Sequence[Node]) -> Sequence[Node]:
-        new_nodes = []
-        for node in nodes:
-            res = self.traverse(node)
+
+def run_passes(
+    program: Program, passes: Sequence[type[Visitor]], mode: MODE = "cow"
+) -> Program:
+    """Run the visitors of `passes` over `program`, in as few walks as they allow.
+
+    Consecutive visitors that fuse share a walk. The errors of each are
+    reported once its walk is done, in order.
+    """
+    start = 0
+    while start < len(passes):
+        end = start + 1
+        while end < len(passes) and passes[end].fuses:
+            end += 1
+        name = "+".join(cls.__name__ for cls in passes[start:end])
+        with stage(name, program) as walked:
+            visitors = [cls.for_program(program) for cls in passes[start:end]]
+            visitor = visitors[0] if len(visitors) == 1 else FusedVisitor(visitors)
+            program = cast(Program, Walker(visitor, mode).traverse(program))
+            walked.output = program
+        for visitor in visitors:
+            visitor.report_errors()
+        start = end
+    return program
+
+
+def _run_pre(hooks: list[Callable], node: Node) -> None:
+    for hook in hooks:
+        hook(node)
+
+
+def _run_post(all_hooks: Sequence[dict[type[Node], Callable]], node: Node) -> object:
+    results: list = [node]
+    spliced = False
+    for hooks in all_hooks:
+        new_results = []
+        for item in results:
+            hook = hooks.get(type(item))
+            res = hook(item) if hook else None
+            if res is None:
+                res = item
             if isinstance(res, list):
-                new_nodes.extend(res)
+                new_results.extend(res)
+                spliced = True
             else:
-                new_nodes.append(res)
-        return new_nodes
+                new_results.append(res)
+        results = new_results
+    return results if spliced else results[0]
+
+
+class Walker:
+    """Runs a `Visitor` over a tree.
+
+    In "copy" mode every node is copied before its visitor sees it. In "cow"
+    mode only nodes with a visitor are, and the ones on the path from a
+    changed node up to the root, the rest of the result shares the nodes of
+    the input. "in_place" changes the input itself, for callers that own every
+    node of it.
+    """
+
+    def __init__(self, visitor: Visitor, mode: MODE = "copy") -> None:
+        self._pre_call, self._to_call = visitor.hooks()
+        self._fields: dict[type[Node], tuple[str, ...]] = {}
+        self._mode = mode
+        # Subtrees without any of these are left alone, unless every node is copied.
+        self._relevant = (
+            None if mode == "copy" else frozenset({*self._pre_call, *self._to_call})
+        )
+
+    def traverse(self, node: Node | Sequence[Node]) -> Node | Sequence[Node]:
+        """Rebuild `node` bottom-up, calling the visitor on the way down and up.
+
+        Each class is walked by a function made for it and this walker, see
+        `_compile`, recursing until the tree gets too deep to and continuing
+        with an explicit stack from there. The depth of the tree is only
+        limited by memory. Constants shared by `Program.interner` are visited
+        once however often they occur, and stay shared, so visitors of their
+        classes can't depend on where they are.
+        """
+        interner = node.interner if isinstance(node, Program) else None
+        visited: dict[int, object] = {}
+
+        def deep(item: object) -> object:
+            return self._traverse(item, interner, visited)
+
+        walkers = _Walkers(self, interner, deep)
+        if isinstance(node, Node):
+            return walkers[type(node)](node, 0)
+        return cast(Sequence[Node], deep(node))
+
+    def _traverse(
+        self, node: object, interner: Interner | None, visited: dict[int, object]
+    ) -> object:
+        copy_all = self._mode == "copy"
+        cow = self._mode == "cow"
+        done: list = []
+        stack: list[tuple[int, object]] = [(_VISIT, node)]
+        while stack:
+            action, item = stack.pop()
+            if action == _VISIT:
+                if isinstance(item, list):
+                    stack.append((_COLLECT, item))
+                    stack.extend((_VISIT, child) for child in reversed(item))
+                elif isinstance(item, Node):
+                    shared = interner is not None and interner.is_shared(item)
+                    if shared and id(item) in visited:
+                        done.append(visited[id(item)])
+                        continue
+                    pre = self._pre_call.get(type(item))
+                    post = self._to_call.get(type(item))
+                    # The interner keys a shared node on its fields, copy it rather than
+                    # change it even in place.
+                    on_write = cow or shared
+                    if copy_all or (on_write and (pre or post)):
+                        new_node = _copier(type(item))(item)
+                    else:
+                        new_node = item
+                    match_res = None
+                    if pre:
+                        match_res = pre(new_node)
+                    names = self._field_names(type(item))
+                    stack.append(
+                        (
+                            _BUILD,
+                            (new_node, item, names, match_res, post, on_write, shared),
+                        )
+                    )
+                    stack.extend(
+                        (_VISIT, getattr(item, name)) for name in reversed(names)
+                    )
+                else:
+                    done.append(item)
+
+            elif action == _COLLECT:
+                old = cast(list, item)
+                start = len(done) - len(old)
+                results = done[start:]
+                del done[start:]
+                done.append(_collect(results, old, copy_all))
+
+            else:
+                new_node, old, names, match_res, post, on_write, shared = cast(
+                    tuple, item
+                )
+                start = len(done) - len(names)
+                for name, res in zip(names, done[start:]):
+                    if res is not getattr(new_node, name):
+                        if on_write and new_node is old:
+                            new_node = _copier(type(old))(old)
+                        setattr(new_node, name, res)
+                del done[start:]
+                if post:
+                    match_res = post(new_node)
+                res = new_node if match_res is None else match_res
+                if shared:
+                    res = visited[id(old)] = cast(Interner, interner)(res)
+                done.append(res)
+
+        return done[0]
+
+    def _field_names(self, node_type: type[Node]) -> tuple[str, ...]:
+        """The fields of `node_type` to walk, the ones that can hold a node of
+        a class with a visitor.
+        """
+        names = self._fields.get(node_type)
+        if names is None:
+            names = self._fields[node_type] = tuple(
+                f.name
+                for f in fields(node_type)
+                if _reaches(_child_type(f.type), self._relevant)
+            )
+        return names
+
+
+class _Walkers(dict):
+    """The walk function of each class for one traversal, made on first use."""
+
+    def __init__(
+        self, walker: Walker, interner: Interner | None, deep: Callable
+    ) -> None:
+        super().__init__()
+        self._walker = walker
+        self._interner = interner
+        self._deep = deep
+        copy_all = walker._mode == "copy"
+
+        def walk_list(items: list, depth: int) -> list:
+            return _collect(
+                [self[type(item)](item, depth) for item in items], items, copy_all
+            )
+
+        self._walk_list = walk_list
+
+    def __missing__(self, node_type: type) -> Callable[[object, int], object]:
+        if not issubclass(node_type, Node):
+            deep = self._deep
+            walk = self[node_type] = lambda item, depth: deep(item)
+            return walk
+        relevant = self._walker._relevant
+        if not _reaches(node_type, relevant):
+            walk = self[node_type] = lambda item, depth: item
+            return walk
+        pre = self._walker._pre_call.get(node_type)
+        post = self._walker._to_call.get(node_type)
+        make = _compile(
+            node_type,
+            self._walker._mode,
+            pre is not None,
+            post is not None,
+            self._interner is not None,
+            relevant,
+        )
+        walk = self[node_type] = make(
+            pre=pre,
+            post=post,
+            walkers=self,
+            walk_list=self._walk_list,
+            deep=self._deep,
+            is_shared=self._interner.is_shared if self._interner else None,
+            copy=_copier(node_type),
+        )
+        return walk
+
+
+@cache
+def _compile(
+    node_type: type[Node],
+    mode: MODE,
+    pre: bool,
+    post: bool,
+    shared: bool,
+    relevant: frozenset[type[Node]] | None,
+) -> Callable[..., Callable[[Node, int], object]]:
+    """Generate the walk function of `node_type`, given what it has to do.
+
+    Returns a factory binding the visitors and the walk functions of the other
+    classes. The child fields are known ahead, so they are read and written as
+    plain attributes, unchanged ones aren't written back at all. Fields that
+    can't hold any class in `relevant` aren't read either.
+    """
+    copied = mode == "copy" or (mode == "cow" and (pre or post))
+    lines = [
+        "def make(pre, post, walkers, walk_list, deep, is_shared, copy):",
+        "    def walk(node, depth):",
+        f"        if depth > {_MAX_DEPTH}:",
+        "            return deep(node)",
+    ]
+    if shared:
+        lines += ["        if is_shared(node):", "            return deep(node)"]
+    lines.append(f"        new = {'copy(node)' if copied else 'node'}")
+    if pre:
+        lines.append("        match = pre(new)")
+    lines.append("        depth += 1")
+    for f in fields(node_type):
+        if not _reaches(_child_type(f.type), relevant):
+            continue
+        if get_origin(f.type) is list:
+            walk = "walk_list(child, depth)"
+        else:
+            walk = "walkers[type(child)](child, depth)"
+        lines += [
+            f"        child = node.{f.name}",
+            f"        res = {walk}",
+            "        if res is not child:",
+        ]
+        if mode == "cow" and not copied:
+            lines += ["            if new is node:", "                new = copy(node)"]
+        lines.append(f"            new.{f.name} = res")
+    if post:
+        lines.append("        match = post(new)")
+    lines.append(
+        f"        return {'new if match is None else match' if pre or post else 'new'}"
+    )
+    lines.append("    return walk")
+    namespace: dict[str, object] = {}
+    exec("\n".join(lines), namespace)
+    return cast(Callable, namespace["make"])
+
+
+def copy_node(node: _N) -> _N:
+    """A shallow copy of `node`, quicker than `copy.copy`."""
+    return cast(_N, _copier(type(node))(node))
+
+
+@cache
+def _copier(node_type: type[Node]) -> Callable[[Node], Node]:
+    """A shallow copy of a `node_type` by its fields, quicker than `copy`."""
+    names = [f.name for f in fields(node_type)]
+    lines = [
+        "def copy(node):",
+        "    new = new_node(cls)",
+        *(f"    new.{name} = node.{name}" for name in names),
+        "    return new",
+    ]
+    namespace: dict[str, object] = {"cls": node_type, "new_node": node_type.__new__}
+    exec("\n".join(lines), namespace)
+    return cast(Callable, namespace["copy"])
+
+
+def _is_node_type(type_: object) -> bool:
+    return isinstance(type_, type) and issubclass(type_, Node)
+
+
+def _child_type(type_: object) -> type[Node] | None:
+    """The class of the nodes a field of `type_` holds, if it holds any."""
+    if get_origin(type_) is list:
+        type_ = get_args(type_)[0]
+    return type_ if _is_node_type(type_) else None
+
+
+@cache
+def reachable(node_type: type[Node]) -> frozenset[type[Node]]:
+    """Every class of node that can be in a tree under a `node_type`, going by
+    the annotated fields of the classes in `wabbit.model`.
+
+    A field can hold its class or any subclass of it, the tree itself too.
+    """
+    found: set[type[Node]] = set()
+    todo = [node_type]
+    while todo:
+        cls = todo.pop()
+        if cls in found:
+            continue
+        found.add(cls)
+        todo.extend(cls.__subclasses__())
+        for f in fields(cls):
+            child = _child_type(f.type)
+            if child is not None:
+                todo.append(child)
+    return frozenset(found)
+
+
+def _reaches(
+    node_type: type[Node] | None, relevant: frozenset[type[Node]] | None
+) -> bool:
+    """Whether a tree under a `node_type` can hold a class in `relevant`,
+    where `None` is every class.
+    """
+    if node_type is None:
+        return False
+    return relevant is None or not relevant.isdisjoint(reachable(node_type))
+
+
+def _collect(results: list, old: list, copy_all: bool) -> list:
+    """The list of `results` of visiting `old`, with returned lists spliced in."""
+    if not copy_all and all(res is child for res, child in zip(results, old)):
+        return old
+    new_nodes = []
+    for res in results:
+        if isinstance(res, list):
+            new_nodes.extend(res)
+        else:
+            new_nodes.append(res)
+    return new_nodes
+
+
+# What to do with an item on the `Walker._traverse` stack.
+_VISIT = 0
+_COLLECT = 1
+_BUILD = 2
+
+# How deep the compiled walk functions recurse before the explicit stack takes over.
+_MAX_DEPTH = 200